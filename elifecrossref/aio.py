@@ -0,0 +1,163 @@
+"""
+asyncio entry points for services which generate Crossref XML from an event loop,
+the parsing, generation and file writing is run in an executor so the loop is not
+blocked, and a Runner limits how many of them run at the same time
+requires Python 3.5 or newer
+"""
+import asyncio
+import functools
+import weakref
+
+from elifecrossref import generate, sinks, utils
+from elifecrossref.conf import cached_config
+
+
+# default number of jobs a Runner runs in its executor at the same time
+DEFAULT_CONCURRENCY = 4
+
+
+def write_crossref_xml(poa_articles, crossref_config, pub_date=None, add_comment=True,
+                       directory=None):
+    """
+    build crossref xml and write it to a batch file in directory, returns the file name,
+    directory can also be a sinks.Sink shared by the jobs, then its location is returned,
+    the batch file is compressed by the compression config as by generate.crossref_xml_to_disk
+    """
+    if directory is None:
+        directory = generate.TMP_DIR
+    sink = directory
+    if not isinstance(sink, sinks.Sink):
+        sink = sinks.DirectorySink(directory)
+    sink = generate.compressed_sink(sink, crossref_config)
+    first_articles, poa_articles = utils.peek(poa_articles, 2)
+    c_xml = generate.CrossrefXML(first_articles, crossref_config, pub_date, add_comment,
+                                 build=False)
+    name = c_xml.batch_id + '.xml'
+    with sink.open(name) as open_file:
+        c_xml.write_batch(poa_articles, open_file)
+    return sink.location(name)
+
+
+def write_crossref_xml_from_files(article_xmls, crossref_config, pub_date=None,
+                                  add_comment=True, directory=None):
+    """
+    parse the article XML files and write them to a batch file in directory,
+    returns the file name, or None if there are no files,
+    raises ValueError if any of the files could not be parsed
+    """
+    errors = {}
+    poa_articles = generate.build_articles_for_crossref(article_xmls, errors=errors)
+    for article_xml in article_xmls:
+        if article_xml in errors:
+            raise ValueError('could not parse %s: %s' % (article_xml, errors[article_xml]))
+    if not poa_articles:
+        return None
+    return write_crossref_xml(poa_articles, crossref_config, pub_date, add_comment, directory)
+
+
+class Runner(object):
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, executor=None):
+        """
+        Run at most concurrency jobs at a time in executor, by default the event loop's
+        default executor which uses threads, a concurrent.futures.ProcessPoolExecutor
+        can be used to run the CPU work in other processes
+        """
+        self.concurrency = concurrency
+        self.executor = executor
+        # a semaphore is bound to its event loop, so there is one for each loop
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self, loop):
+        if loop not in self.semaphores:
+            self.semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return self.semaphores[loop]
+
+    async def run(self, func, *args, **kwargs):
+        "call func in the executor once fewer than concurrency jobs are running"
+        loop = asyncio.get_event_loop()
+        async with self.semaphore(loop):
+            return await loop.run_in_executor(
+                self.executor, functools.partial(func, *args, **kwargs))
+
+    async def build_articles_for_crossref(self, article_xmls, workers=None, chunk_size=1,
+                                          errors=None):
+        "see generate.build_articles_for_crossref"
+        return await self.run(generate.build_articles_for_crossref, article_xmls,
+                              workers=workers, chunk_size=chunk_size, errors=errors)
+
+    async def crossref_xml(self, poa_articles, crossref_config=None, pub_date=None,
+                           add_comment=True):
+        "build crossref xml and return output as a string"
+        if not crossref_config:
+            crossref_config = cached_config(None)
+        return await self.run(generate.crossref_xml, list(poa_articles), crossref_config,
+                              pub_date, add_comment)
+
+    async def crossref_xml_to_disk(self, poa_articles, crossref_config=None, pub_date=None,
+                                   add_comment=True, directory=None):
+        "build crossref xml and write it to a file in directory, returns the file name"
+        if not crossref_config:
+            crossref_config = cached_config(None)
+        return await self.run(write_crossref_xml, list(poa_articles), crossref_config,
+                              pub_date, add_comment, directory)
+
+    async def crossref_xml_from_files(self, article_xmls, crossref_config=None, pub_date=None,
+                                      add_comment=True, directory=None):
+        """
+        parse the article XML files and write a batch file in directory in one job,
+        returns the file name, see write_crossref_xml_from_files
+        """
+        if not crossref_config:
+            crossref_config = cached_config(None)
+        return await self.run(write_crossref_xml_from_files, list(article_xmls),
+                              crossref_config, pub_date, add_comment, directory)
+
+    async def run_batches(self, batches, crossref_config=None, pub_date=None,
+                          add_comment=True, directory=None, errors=None):
+        """
+        write a batch file for each list of article XML files in batches at the same time,
+        returns the file names in the order of batches, None for a batch which failed
+        and if errors is a dict the error message is added to it using the batch index
+        """
+        results = await asyncio.gather(
+            *[self.crossref_xml_from_files(article_xmls, crossref_config, pub_date,
+                                           add_comment, directory)
+              for article_xmls in batches],
+            return_exceptions=True)
+        filenames = []
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                if errors is not None:
+                    errors[index] = '%s: %s' % (result.__class__.__name__, result)
+                result = None
+            filenames.append(result)
+        return filenames
+
+
+# the Runner used by the module functions
+DEFAULT_RUNNER = Runner()
+
+
+async def build_articles_for_crossref(article_xmls, workers=None, chunk_size=1, errors=None,
+                                      runner=None):
+    return await (runner or DEFAULT_RUNNER).build_articles_for_crossref(
+        article_xmls, workers, chunk_size, errors)
+
+
+async def crossref_xml(poa_articles, crossref_config=None, pub_date=None, add_comment=True,
+                       runner=None):
+    return await (runner or DEFAULT_RUNNER).crossref_xml(
+        poa_articles, crossref_config, pub_date, add_comment)
+
+
+async def crossref_xml_to_disk(poa_articles, crossref_config=None, pub_date=None,
+                               add_comment=True, directory=None, runner=None):
+    return await (runner or DEFAULT_RUNNER).crossref_xml_to_disk(
+        poa_articles, crossref_config, pub_date, add_comment, directory)
+
+
+async def run_batches(batches, crossref_config=None, pub_date=None, add_comment=True,
+                      directory=None, errors=None, runner=None):
+    return await (runner or DEFAULT_RUNNER).run_batches(
+        batches, crossref_config, pub_date, add_comment, directory, errors)
@@ -0,0 +1,211 @@
+"""
+Benchmark parsing, CrossrefXML generation and serialization for article XML files
+and scaled up copies of them, the results can be saved as JSON and compared to a baseline
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from io import BytesIO
+from timeit import default_timer
+
+from elifecrossref import generate, stats, synthetic, tags
+from elifecrossref.conf import CONFIG_FILE, load_config, cached_config
+
+
+DEFAULT_DATA_DIR = os.path.join('tests', 'test_data')
+
+# a fixed pub date so the output does not depend on when the benchmark is run
+PUB_DATE = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+
+STAGES = ['parse', 'build', 'output_xml', 'write_xml']
+
+# article lists which are repeated to scale up an article
+SCALED_LISTS = ['contributors', 'ref_list', 'component_list', 'datasets', 'funding_awards']
+
+
+def fixture_files(data_dir=DEFAULT_DATA_DIR):
+    "article XML files in data_dir, leaving out the Crossref XML output files"
+    return sorted([os.path.join(data_dir, file_name) for file_name in os.listdir(data_dir)
+                   if file_name.endswith('.xml') and 'crossref' not in file_name])
+
+
+def config_section(article_xml, config_file=CONFIG_FILE):
+    "the config section the file name starts with, or None for the default section"
+    file_name = os.path.basename(article_xml)
+    for section in load_config(config_file).sections():
+        if file_name.startswith(section):
+            return section
+    return None
+
+
+def scale_article(article, factor):
+    "repeat the lists of contributors, refs, components, datasets and funding factor times"
+    for name in SCALED_LISTS:
+        values = getattr(article, name, None)
+        if values:
+            setattr(article, name, values * factor)
+    return article
+
+
+def benchmark_article(article_xml, crossref_config, repeat=3, scale=1):
+    """
+    best time of each stage from repeat runs for one article XML file, and of each
+    CrossrefXML method recorded by stats.Stats including its nested calls,
+    each run starts with an empty inline element cache
+    """
+    runs = []
+    for i in range(repeat):
+        run = {}
+        start = default_timer()
+        articles = generate.build_articles_for_crossref([article_xml])
+        run['parse'] = default_timer() - start
+        articles = [scale_article(article, scale) for article in articles]
+
+        section_stats = stats.Stats()
+        tags.INLINE_ELEMENTS.clear()
+        start = default_timer()
+        c_xml = generate.CrossrefXML(articles, crossref_config, PUB_DATE, False, build=False,
+                                     stats=section_stats)
+        c_xml.build(articles)
+        run['build'] = default_timer() - start
+
+        start = default_timer()
+        c_xml.output_xml()
+        run['output_xml'] = default_timer() - start
+
+        start = default_timer()
+        run['bytes'] = c_xml.write_xml(BytesIO())
+        run['write_xml'] = default_timer() - start
+        run['sections'] = section_stats.batch
+        run['inline_cache'] = {'hits': tags.INLINE_ELEMENTS.hits,
+                               'misses': tags.INLINE_ELEMENTS.misses}
+        runs.append(run)
+
+    result = {}
+    for stage in STAGES:
+        result[stage] = min([run[stage] for run in runs])
+    result['bytes'] = runs[0]['bytes']
+    result['inline_cache'] = runs[0]['inline_cache']
+    result['sections'] = {}
+    for name in runs[0]['sections'].sections:
+        result['sections'][name] = min(
+            [run['sections'].get(name, 'seconds', 0.0) for run in runs])
+    return result
+
+
+def run_benchmarks(article_xmls, scales=(1,), repeat=3, config_file=CONFIG_FILE):
+    """
+    benchmark each file at each scale, results are keyed by the file name
+    with the scale added if it is more than 1
+    """
+    benchmarks = {}
+    for article_xml in article_xmls:
+        crossref_config = cached_config(config_section(article_xml, config_file), config_file)
+        for scale in scales:
+            key = os.path.basename(article_xml)
+            if scale > 1:
+                key += ' x' + str(scale)
+            benchmarks[key] = benchmark_article(
+                article_xml, crossref_config, repeat, scale)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'benchmarks': benchmarks,
+    }
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.001):
+    """
+    list of the stages which are slower than the baseline by more than the tolerance
+    fraction and by more than min_seconds, as tuples of key, stage, baseline and result time
+    """
+    regressions = []
+    for key in sorted(results.get('benchmarks', {})):
+        baseline_result = baseline.get('benchmarks', {}).get(key)
+        if not baseline_result:
+            continue
+        for stage in STAGES:
+            baseline_time = baseline_result.get(stage)
+            result_time = results['benchmarks'][key].get(stage)
+            if baseline_time is None or result_time is None:
+                continue
+            if (result_time > baseline_time * (1 + tolerance)
+                    and result_time - baseline_time > min_seconds):
+                regressions.append((key, stage, baseline_time, result_time))
+    return regressions
+
+
+def format_results(results):
+    "a line for each benchmark with the stage times in milliseconds"
+    lines = ['%-40s %10s %10s %10s %10s' % (
+        'benchmark', 'parse ms', 'build ms', 'output ms', 'write ms')]
+    for key in sorted(results['benchmarks']):
+        result = results['benchmarks'][key]
+        lines.append('%-40s %10.2f %10.2f %10.2f %10.2f' % (
+            key, result['parse'] * 1000, result['build'] * 1000, result['output_xml'] * 1000,
+            result['write_xml'] * 1000))
+    return '\n'.join(lines)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the generation of Crossref XML from article XML files.')
+    parser.add_argument('article_xmls', nargs='*',
+                        help='article XML files, by default the files in --data-dir')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help='directory of article XML files to benchmark')
+    parser.add_argument('--config-file', default=CONFIG_FILE, help='config file path')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1],
+                        help='also benchmark articles with their lists repeated this many times')
+    parser.add_argument('--synthetic', type=int, nargs='+', default=[],
+                        help=('also benchmark a synthetic article with the default sizes ' +
+                              'multiplied by each of these factors, named elife-9XXXX-v1.xml'))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best time is used')
+    parser.add_argument('--output', help='file to save the JSON results to')
+    parser.add_argument('--baseline', help='JSON results file to compare the results to')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction slower than the baseline which is a regression')
+    parser.add_argument('--min-seconds', type=float, default=0.001,
+                        help='smallest difference from the baseline which is a regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    article_xmls = list(args.article_xmls)
+    if not article_xmls and not args.synthetic:
+        article_xmls = fixture_files(args.data_dir)
+    synthetic_dir = tempfile.mkdtemp()
+    try:
+        for factor in args.synthetic:
+            article_xmls += synthetic.write_corpus(
+                synthetic_dir, 1, 90000 + factor, **synthetic.scaled_sizes(factor))
+        results = run_benchmarks(article_xmls, args.scale, args.repeat, args.config_file)
+    finally:
+        shutil.rmtree(synthetic_dir)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as open_file:
+            json.dump(results, open_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as open_file:
+            baseline = json.load(open_file)
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        for key, stage, baseline_time, result_time in regressions:
+            print('regression %s %s: %.2f ms, baseline %.2f ms' % (
+                key, stage, result_time * 1000, baseline_time * 1000), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+On disk cache of serialized journal fragments, content addressed by the article XML
+and the configuration used to generate them
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+from elifecrossref import __version__
+
+
+# bump to invalidate the entries written by earlier versions of the cache format
+CACHE_FORMAT = '1'
+
+ENTRY_SUFFIX = '.fragment'
+
+
+class FragmentCache(object):
+
+    def __init__(self, directory, max_bytes=None):
+        """
+        Store entries as files in directory, creating it if required,
+        if max_bytes is set the least recently used entries are removed
+        when the total size of the entries is larger
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.size = sum([os.path.getsize(path) for path in self.entry_paths()])
+
+    def key(self, article_xml, article_xml_bytes, crossref_config):
+        """
+        Hash of the article XML content and everything else the journal fragment depends on,
+        the file name is included because the article version is taken from it
+        """
+        digest = hashlib.sha256()
+        for part in [CACHE_FORMAT, __version__,
+                     str(crossref_config.get('crossref_schema_version')),
+                     json.dumps(crossref_config, sort_keys=True, default=str),
+                     os.path.basename(article_xml)]:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(article_xml_bytes)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def entry_paths(self):
+        return [os.path.join(self.directory, file_name)
+                for file_name in os.listdir(self.directory)
+                if file_name.endswith(ENTRY_SUFFIX)]
+
+    def get(self, key, run_date=None):
+        """
+        Return the metadata dict and fragment string stored for the key or None,
+        an entry generated using the run date as the article pub date is only
+        returned if it was generated with the same run_date
+        """
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as open_file:
+                metadata = json.loads(open_file.readline().decode('utf-8'))
+                fragment = open_file.read().decode('utf-8')
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        if metadata.get('run_date') is not None and metadata.get('run_date') != run_date:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # record the use for the eviction order
+            os.utime(path, None)
+        except OSError:
+            pass
+        return metadata, fragment
+
+    def set(self, key, metadata, fragment):
+        """
+        Store the metadata dict and fragment string, the file is renamed into
+        place so concurrent readers never see a partially written entry
+        """
+        path = self.entry_path(key)
+        content = (json.dumps(metadata, sort_keys=True).encode('utf-8') + b'\n' +
+                   fragment.encode('utf-8'))
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as open_file:
+            open_file.write(content)
+        if os.path.exists(path):
+            self.size -= os.path.getsize(path)
+        os.rename(temp_path, path)
+        self.size += len(content)
+        self.evict()
+
+    def evict(self):
+        "remove the least recently used entries until the cache fits in max_bytes"
+        if self.max_bytes is None or self.size <= self.max_bytes:
+            return
+        entries = []
+        for path in self.entry_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        entries.sort()
+        self.size = sum([entry_size for mtime, path, entry_size in entries])
+        for mtime, path, entry_size in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= entry_size
+            self.evictions += 1
+
+    def clear(self):
+        for path in self.entry_paths():
+            os.remove(path)
+        self.size = 0
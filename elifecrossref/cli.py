@@ -0,0 +1,288 @@
+"""
+Command line tool to generate Crossref deposit files from JATS article XML files
+"""
+from __future__ import print_function
+import argparse
+import glob
+import os
+import sys
+import time
+from io import BytesIO
+from multiprocessing import Pool
+
+from elifecrossref import generate, sinks, utils, validate
+from elifecrossref.conf import CONFIG_FILE, cached_config
+
+
+GLOB_CHARACTERS = '*?['
+
+
+def find_article_xmls(inputs, file_list=None):
+    """
+    article XML file paths in order from a list of directories, glob patterns and
+    file paths, and from file_list which is a file with one path on each line
+    """
+    article_xmls = []
+    for path in inputs:
+        if os.path.isdir(path):
+            article_xmls += sorted(glob.glob(os.path.join(path, '*.xml')))
+        elif any(character in path for character in GLOB_CHARACTERS):
+            article_xmls += sorted(glob.glob(path))
+        else:
+            article_xmls.append(path)
+    if file_list:
+        with open(file_list) as open_file:
+            article_xmls += [line.strip() for line in open_file if line.strip()]
+    return article_xmls
+
+
+class Progress(object):
+
+    def __init__(self, total, every=100, stream=None):
+        "count the articles written and report the rate to stream after every number"
+        self.total = total
+        self.every = every
+        self.stream = stream
+        self.count = 0
+        self.start = time.time()
+
+    def rate(self):
+        elapsed = time.time() - self.start
+        if elapsed <= 0:
+            return 0.0
+        return self.count / elapsed
+
+    def message(self):
+        return '%s/%s articles, %.1f articles/s' % (self.count, self.total, self.rate())
+
+    def update(self, count=1):
+        self.count += count
+        if self.stream and self.every and self.count % self.every == 0:
+            print(self.message(), file=self.stream)
+
+    def counted(self, items):
+        "iterate items updating the count as each one is used"
+        for item in items:
+            yield item
+            self.update()
+
+
+def article_batch(args):
+    """
+    parse one article XML file and generate a batch file of its own, returns the
+    article XML file name, the batch file name, its bytes and any error message
+    """
+    article_xml, crossref_config, pub_date, add_comment = args
+    article, error = generate.build_article((article_xml, 'full', generate.BUILD_PARTS))
+    if error is not None:
+        return article_xml, None, None, error
+    articles = [article]
+    try:
+        c_xml = generate.CrossrefXML(articles, crossref_config, pub_date, add_comment,
+                                     build=False)
+        output = BytesIO()
+        c_xml.write_batch(articles, output)
+    except Exception as exception:
+        return article_xml, None, None, '%s: %s' % (exception.__class__.__name__, exception)
+    return article_xml, c_xml.batch_id + '.xml', output.getvalue(), None
+
+
+def write_article_batches(article_xmls, crossref_config, pub_date, add_comment, sink,
+                          workers=None, chunk_size=1, progress=None):
+    """
+    write one batch file for each article to the sinks.Sink, the workers only generate
+    the batch files so the sink can be an archive, returns the output files and any errors
+    """
+    args = [(article_xml, crossref_config, pub_date, add_comment)
+            for article_xml in article_xmls]
+    pool = None
+    if workers and workers > 1:
+        pool = Pool(workers)
+        results = pool.imap(article_batch, args, chunk_size)
+    else:
+        results = (article_batch(arg) for arg in args)
+    filenames = []
+    errors = {}
+    try:
+        for article_xml, name, data, error in results:
+            if error is None:
+                filenames.append(sink.write(name, data))
+                if progress:
+                    progress.update()
+            else:
+                errors[article_xml] = error
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return filenames, errors
+
+
+def write_batches(article_xmls, crossref_config, pub_date, add_comment, sink,
+                  workers=None, chunk_size=1, max_articles=None, max_bytes=None,
+                  progress=None):
+    """
+    write the articles to one batch file in the sinks.Sink, or split into more than
+    one batch by max_articles or max_bytes, returns the output files and any errors
+    """
+    errors = {}
+    # only parse a limited number of files ahead of the batch being written
+    window_size = max(workers or 1, 1) * chunk_size * 4
+    articles = generate.parsed_articles(article_xmls, 'full', generate.BUILD_PARTS, workers,
+                                        chunk_size, errors, window_size)
+    if progress:
+        articles = progress.counted(articles)
+    first_articles, articles = utils.peek(articles, 2)
+    c_xml = generate.CrossrefXML(first_articles, crossref_config, pub_date, add_comment,
+                                 build=False)
+    if max_articles or max_bytes:
+        manifest = c_xml.write_split_batches(
+            articles, sink, max_articles, max_bytes, workers, chunk_size=chunk_size)
+        return [part['file'] for part in manifest], errors
+    name = c_xml.batch_id + '.xml'
+    with sink.open(name) as open_file:
+        c_xml.write_batch(articles, open_file, workers, chunk_size=chunk_size)
+    return [sink.location(name)], errors
+
+
+def validate_files(filenames, version=None, schema_dir=None):
+    "validate each output file, returns the error messages of the invalid files by file name"
+    invalid = {}
+    for filename in filenames:
+        messages = validate.validate_file(filename, version, schema_dir)
+        if messages:
+            invalid[filename] = messages
+    return invalid
+
+
+def parse_pub_date(value):
+    "time struct from a YYYY-MM-DD or YYYY-MM-DD HH:MM:SS value"
+    if not value:
+        return None
+    try:
+        return time.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return time.strptime(value, '%Y-%m-%d')
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate Crossref deposit files from JATS article XML files.')
+    parser.add_argument(
+        'inputs', nargs='*',
+        help='article XML files, directories of XML files or glob patterns')
+    parser.add_argument('--file-list', help='file containing one article XML path per line')
+    parser.add_argument('-c', '--config-section', help='section of the config file to use')
+    parser.add_argument('--config-file', default=CONFIG_FILE, help='config file path')
+    parser.add_argument('-o', '--output-dir', default=generate.TMP_DIR,
+                        help='directory to write the output files to')
+    parser.add_argument('--archive',
+                        help=('tar or zip archive to write the output files to instead of ' +
+                              'the output directory, by its .tar, .tar.gz, .tgz, .tar.bz2 ' +
+                              'or .zip extension'))
+    parser.add_argument('--compression', choices=sorted(sinks.COMPRESSION_SUFFIXES),
+                        help=('compress each output file, zstd needs zstandard, ' +
+                              'by default the compression config'))
+    parser.add_argument('--compression-level', type=int,
+                        help='compression level, by default the compression_level config')
+    parser.add_argument('--per-article', action='store_true',
+                        help='write a separate batch file for each article')
+    parser.add_argument('--max-articles', type=int,
+                        help='split the batch into files of at most this many articles')
+    parser.add_argument('--max-bytes', type=int,
+                        help='split the batch into files of at most this many bytes')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=1,
+                        help='number of articles given to a worker at a time')
+    parser.add_argument('--pub-date',
+                        help=('date to use when an article has no pub date and in the ' +
+                              'batch id, as YYYY-MM-DD or YYYY-MM-DD HH:MM:SS'))
+    parser.add_argument('--no-comment', action='store_true',
+                        help='do not add the generated by comment')
+    parser.add_argument('--progress', type=int, default=100,
+                        help='report progress after this many articles, 0 for none')
+    parser.add_argument('--validate', action='store_true',
+                        help='validate the output files against the Crossref XSD, needs lxml')
+    parser.add_argument('--schema-dir',
+                        help='directory of Crossref XSD files, by default the schema_dir config')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    article_xmls = find_article_xmls(args.inputs, args.file_list)
+    if not article_xmls:
+        print('no article XML files found', file=sys.stderr)
+        return 1
+    crossref_config = cached_config(args.config_section, args.config_file)
+    pub_date = parse_pub_date(args.pub_date)
+    if args.archive:
+        if args.validate:
+            print('--validate needs the output files in a directory', file=sys.stderr)
+            return 1
+        sink = sinks.archive_sink(args.archive)
+        if sink is None:
+            print('unknown archive type: %s' % args.archive, file=sys.stderr)
+            return 1
+    else:
+        sink = sinks.DirectorySink(args.output_dir)
+    compression = args.compression or crossref_config.get('compression')
+    if compression:
+        if args.validate:
+            print('--validate needs uncompressed output files', file=sys.stderr)
+            return 1
+        level = args.compression_level
+        if level is None:
+            level = crossref_config.get('compression_level')
+        try:
+            sink = sinks.CompressedSink(sink, compression, level)
+        except (ImportError, ValueError) as exception:
+            print('could not compress: %s' % exception, file=sys.stderr)
+            sink.close()
+            return 1
+    schema_dir = args.schema_dir or validate.schema_dir(crossref_config)
+    if args.validate:
+        # check the XSD can be read before any output is written
+        try:
+            validate.schema(crossref_config.get('crossref_schema_version'), schema_dir)
+        except (IOError, ImportError) as exception:
+            print('could not validate: %s' % exception, file=sys.stderr)
+            sink.close()
+            return 1
+    progress = Progress(len(article_xmls), args.progress, sys.stderr)
+
+    with sink:
+        if args.per_article:
+            filenames, errors = write_article_batches(
+                article_xmls, crossref_config, pub_date, not args.no_comment, sink,
+                args.workers, args.chunk_size, progress)
+        else:
+            filenames, errors = write_batches(
+                article_xmls, crossref_config, pub_date, not args.no_comment, sink,
+                args.workers, args.chunk_size, args.max_articles, args.max_bytes, progress)
+
+    for article_xml in sorted(errors):
+        print('error %s: %s' % (article_xml, errors[article_xml]), file=sys.stderr)
+    print('wrote %s of %s articles to %s files in %.2fs, %.1f articles/s' % (
+        progress.count, len(article_xmls), len(filenames), time.time() - progress.start,
+        progress.rate()), file=sys.stderr)
+    if progress.count < len(article_xmls):
+        return 1
+    if args.validate:
+        try:
+            invalid = validate_files(
+                filenames, crossref_config.get('crossref_schema_version'), schema_dir)
+        except (IOError, ImportError) as exception:
+            print('could not validate: %s' % exception, file=sys.stderr)
+            return 1
+        for filename in sorted(invalid):
+            for message in invalid[filename]:
+                print('invalid %s: %s' % (filename, message), file=sys.stderr)
+        if invalid:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -1,8 +1,44 @@
+import os
+import threading
 import configparser as configparser
 import json
 
 CONFIG_FILE = 'crossref.cfg'
 
+# parsed config sections by config file path and section name, with the file mtime
+CONFIG_CACHE = {}
+CONFIG_CACHE_LOCK = threading.Lock()
+
+
+class CrossrefConfig(dict):
+    """
+    Parsed config section, a dict which also holds the decisions the generator
+    makes for every article so they are only worked out when a value changes
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.set_flags()
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.set_flags()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.set_flags()
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.set_flags()
+
+    def set_flags(self):
+        self.text_mining_xml = bool(
+            self.get("text_mining_xml_pattern") and self.get("text_mining_pdf_pattern") != '')
+        self.text_mining_pdf = bool(self.get("text_mining_pdf_pattern"))
+        self.reference_distribution_opts = bool(self.get("reference_distribution_opts"))
+        self.component_license = self.get('component_license_ref') != ''
+
 
 def load_config(config_file=None):
     if not config_file:
@@ -23,7 +59,7 @@ def raw_config(config_section, config_file=None):
 
 def parse_raw_config(raw_config_object):
     "parse the raw config to something good"
-    crossref_config = {}
+    crossref_config = CrossrefConfig()
     boolean_values = []
     int_values = []
     list_values = []
@@ -34,6 +70,7 @@ def parse_raw_config(raw_config_object):
     boolean_values.append("elocation_id")
     boolean_values.append("elife_style_component_doi")
     int_values.append("year_of_first_volume")
+    int_values.append("compression_level")
     list_values.append("contrib_types")
     list_values.append("archive_locations")
     list_values.append("access_indicators_applies_to")
@@ -43,10 +80,33 @@ def parse_raw_config(raw_config_object):
         if value_name in boolean_values:
             crossref_config[value_name] = raw_config_object.getboolean(value_name)
         elif value_name in int_values:
-            crossref_config[value_name] = raw_config_object.getint(value_name)
+            if raw_config_object.get(value_name) == '':
+                crossref_config[value_name] = None
+            else:
+                crossref_config[value_name] = raw_config_object.getint(value_name)
         elif value_name in list_values:
             crossref_config[value_name] = json.loads(raw_config_object.get(value_name))
         else:
             # default
             crossref_config[value_name] = raw_config_object.get(value_name)
     return crossref_config
+
+def cached_config(config_section, config_file=None):
+    """
+    parsed config section which is only read again when the config file is modified,
+    the same object is returned to every caller so it should not be changed
+    """
+    if not config_file:
+        config_file = CONFIG_FILE
+    key = (os.path.abspath(config_file), config_section)
+    try:
+        mtime = os.path.getmtime(config_file)
+    except OSError:
+        mtime = None
+    with CONFIG_CACHE_LOCK:
+        cached = CONFIG_CACHE.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        crossref_config = parse_raw_config(raw_config(config_section, config_file))
+        CONFIG_CACHE[key] = (mtime, crossref_config)
+        return crossref_config
@@ -1,31 +1,53 @@
 import time
 import os
-from xml.etree import ElementTree
+import itertools
+import functools
+import collections
+from io import BytesIO
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from xml.etree.ElementTree import Element, SubElement, Comment
-from xml.dom import minidom
 
 from elifearticle import utils as eautils
 from elifearticle.article import Article, Component
 from elifearticle import parse
 from elifetools import utils as etoolsutils
-from elifetools import xmlio
 
-from elifecrossref import utils
-from elifecrossref.conf import raw_config, parse_raw_config
+from elifecrossref import plan, serialize, sinks, tags, utils
+from elifecrossref.conf import CrossrefConfig, cached_config
 
 
 TMP_DIR = 'tmp'
 
+# environment variable to set the version in the generated comment instead of the git commit
+GENERATOR_VERSION_VARIABLE = 'ELIFECROSSREF_GENERATOR_VERSION'
+
+# last git commit by working directory, looked up once per process
+LAST_COMMITS = {}
+
+# the parts of the article XML parsed for crossref output
+BUILD_PARTS = [
+    'abstract', 'basic', 'components', 'contributors', 'funding', 'datasets',
+    'license', 'pub_dates', 'references', 'volume']
+
 class CrossrefXML(object):
 
-    def __init__(self, poa_articles, crossref_config, pub_date=None, add_comment=True):
+    def __init__(self, poa_articles, crossref_config, pub_date=None, add_comment=True,
+                 build=True, clock=None, stats=None):
         """
         Initialise the configuration, set the root node
         set default values for dates and batch id
         then build out the XML using the article objects
+        if build is False the head and body are not built, for use with write_batch
+        clock returns the local time for the generated comment, time.localtime by default
+        stats is an optional stats.Stats object to record the time taken by each method
         """
         # Set the config
+        if not isinstance(crossref_config, CrossrefConfig):
+            crossref_config = CrossrefConfig(crossref_config)
         self.crossref_config = crossref_config
+        if stats is not None:
+            stats.instrument(self)
         # Create the root XML node
         self.set_root(self.crossref_config.get('crossref_schema_version'))
 
@@ -35,30 +57,36 @@ class CrossrefXML(object):
         else:
             self.pub_date = pub_date
 
+        # the articles are read twice when building, so an iterator is made into a list
+        if build:
+            poa_articles = list(poa_articles)
+
         # Generate batch id
-        batch_doi = ''
-        if len(poa_articles) == 1:
-            # If only one article is supplied, then add the doi to the batch file name
-            batch_doi = str(utils.clean_string(poa_articles[0].manuscript)) + '-'
-        self.batch_id = (str(self.crossref_config.get('batch_file_prefix')) + batch_doi +
-                         time.strftime("%Y%m%d%H%M%S", self.pub_date))
+        self.set_batch_id([poa_article.manuscript for poa_article in poa_articles])
 
         # set comment
         if add_comment:
-            self.generated = time.strftime("%Y-%m-%d %H:%M:%S")
-            self.last_commit = eautils.get_last_commit_to_master()
+            if clock is None:
+                clock = time.localtime
+            self.generated = time.strftime("%Y-%m-%d %H:%M:%S", clock())
+            self.last_commit = generator_version(crossref_config)
             self.comment = Comment('generated by ' + str(crossref_config.get('generator')) +
                                    ' at ' + self.generated +
                                    ' from version ' + self.last_commit)
             self.root.append(self.comment)
 
-        # namespaces for when reparsing XML strings
-        self.reparsing_namespaces = (''' xmlns:jats="http://www.ncbi.nlm.nih.gov/JATS1"
-                                     xmlns:mml="http://www.w3.org/1998/Math/MathML"
-                                     xmlns:xlink="http://www.w3.org/1999/xlink" ''')
-
         # Build out the Crossref XML
-        self.build(poa_articles)
+        if build:
+            self.build(poa_articles)
+
+    def set_batch_id(self, manuscripts):
+        "batch id from the config prefix and pub date, manuscripts is a list of manuscript ids"
+        batch_doi = ''
+        if len(manuscripts) == 1:
+            # If only one article is supplied, then add the doi to the batch file name
+            batch_doi = str(utils.clean_string(manuscripts[0])) + '-'
+        self.batch_id = (str(self.crossref_config.get('batch_file_prefix')) + batch_doi +
+                         time.strftime("%Y%m%d%H%M%S", self.pub_date))
 
     def set_root(self, schema_version):
         self.root = Element('doi_batch')
@@ -105,22 +133,245 @@ class CrossrefXML(object):
         self.set_head(self.root)
         self.set_body(self.root, poa_articles)
 
+    def write_batch(self, poa_articles, fp, workers=None, use_threads=False, chunk_size=1,
+                    pretty=False, indent=""):
+        """
+        Build the head and then each journal one article at a time, writing the
+        UTF-8 encoded output to the binary file object fp as it goes, each journal
+        is serialized on its own and never added to the tree, so only a few are held at
+        a time and poa_articles can be any iterable
+        workers, use_threads and chunk_size are passed to journal_fragments,
+        pretty and indent format the output the same as output_xml
+        """
+        self.write_fragments(
+            self.journal_fragments(poa_articles, workers, use_threads, chunk_size,
+                                   pretty, indent),
+            fp, pretty, indent)
+
+    def write_fragments(self, fragments, fp, pretty=False, indent=""):
+        """
+        build the head and write the batch to fp using the serialized journal fragments,
+        pretty fragments must have been serialized with the same indent
+        """
+        encoding = 'utf-8'
+        fp.write(self.batch_start(pretty, indent).encode(encoding))
+        journal_count = 0
+        for fragment in fragments:
+            if journal_count == 0:
+                fp.write(self.body_start(pretty, indent).encode(encoding))
+            fp.write(fragment.encode(encoding))
+            journal_count += 1
+        fp.write(self.batch_end(journal_count, pretty, indent).encode(encoding))
+
+    def batch_start(self, pretty=False, indent=""):
+        "build the head for the current batch id and return the output before the body"
+        for element in self.root.findall('head') + self.root.findall('body'):
+            self.root.remove(element)
+        self.set_head(self.root)
+        self.body = Element('body')
+        newl = '\n' if pretty else ''
+        output = [serialize.XML_DECLARATION.format(encoding='utf-8'), newl,
+                  serialize.start_tag(self.root), newl]
+        for element in self.root:
+            if pretty:
+                output.append(serialize.element_to_string(element, indent, indent, newl))
+            else:
+                output.append(serialize.element_to_string(element))
+        self.root.append(self.body)
+        return ''.join(output)
+
+    def body_start(self, pretty=False, indent=""):
+        "output of the body tag before the first journal"
+        body = Element('body')
+        if pretty:
+            return indent + serialize.start_tag(body) + '\n'
+        return serialize.start_tag(body)
+
+    def batch_end(self, journal_count, pretty=False, indent=""):
+        "output after the last journal"
+        body = Element('body')
+        if journal_count == 0:
+            closing = '<body/>'
+        else:
+            closing = serialize.end_tag(body)
+        if pretty:
+            return indent + closing + '\n' + serialize.end_tag(self.root) + '\n'
+        return closing + serialize.end_tag(self.root)
+
+    def write_split_batches(self, poa_articles, sink, max_articles=None, max_bytes=None,
+                            workers=None, use_threads=False, chunk_size=1,
+                            pretty=False, indent=""):
+        """
+        Write the articles to as many batch files in the sink as required to keep
+        each under max_articles journals and max_bytes bytes, cutting between journals,
+        a journal larger than max_bytes is written to a batch by itself
+        sink is a sinks.Sink or a directory path
+        the batch id of each part has the part number added and a manifest is returned
+        which is a list with a dict of batch_id, file, bytes and dois for each part
+        where file is the location in the sink
+        """
+        sink = sinks.sink_for(sink)
+        encoding = 'utf-8'
+        base_batch_id = self.batch_id
+        # record the DOI of each article as the fragments are built
+        dois = collections.deque()
+
+        def recorded_articles():
+            for poa_article in poa_articles:
+                dois.append(poa_article.doi)
+                yield poa_article
+
+        manifest = []
+        body_start = self.body_start(pretty, indent).encode(encoding)
+        closing_bytes = len(self.batch_end(1, pretty, indent).encode(encoding))
+        fp = None
+        part = None
+        try:
+            for fragment in self.journal_fragments(
+                    recorded_articles(), workers, use_threads, chunk_size, pretty, indent):
+                fragment = fragment.encode(encoding)
+                if part is not None and (
+                        (max_articles and len(part['dois']) >= max_articles) or
+                        (max_bytes and part['bytes'] + len(fragment) + closing_bytes > max_bytes)):
+                    self.close_split_batch(fp, part, pretty, indent)
+                    fp, part = None, None
+                if part is None:
+                    fp, part = self.open_split_batch(
+                        sink, base_batch_id, len(manifest) + 1, body_start, pretty, indent)
+                    manifest.append(part)
+                fp.write(fragment)
+                part['bytes'] += len(fragment)
+                part['dois'].append(dois.popleft())
+            if part is None:
+                # no articles, write one batch with an empty body
+                fp, part = self.open_split_batch(
+                    sink, base_batch_id, 1, b'', pretty, indent)
+                manifest.append(part)
+            self.close_split_batch(fp, part, pretty, indent)
+            fp = None
+        finally:
+            if fp is not None:
+                # the part is not saved to the sink
+                fp.abort()
+            self.batch_id = base_batch_id
+        return manifest
+
+    def open_split_batch(self, sink, base_batch_id, number, body_start=b'',
+                         pretty=False, indent=""):
+        "open the file for a part of a split batch and write everything before the journals"
+        self.batch_id = base_batch_id + '-' + str(number)
+        name = self.batch_id + '.xml'
+        fp = sink.open(name)
+        start = self.batch_start(pretty, indent).encode('utf-8') + body_start
+        fp.write(start)
+        part = {'batch_id': self.batch_id, 'file': sink.location(name), 'bytes': len(start),
+                'dois': []}
+        return fp, part
+
+    def close_split_batch(self, fp, part, pretty=False, indent=""):
+        end = self.batch_end(len(part['dois']), pretty, indent).encode('utf-8')
+        fp.write(end)
+        fp.close()
+        part['bytes'] += len(end)
+
+    def journal_fragments(self, poa_articles, workers=None, use_threads=False, chunk_size=1,
+                          pretty=False, indent=""):
+        """
+        Serialized journal tag of each article in order, if workers is more than one
+        they are built by a pool of worker processes, or threads if use_threads is True
+        which share this object
+        """
+        if not workers or workers <= 1:
+            for poa_article in poa_articles:
+                yield self.journal_fragment(poa_article, pretty, indent)
+            return
+        if use_threads:
+            pool = ThreadPool(workers)
+        else:
+            pool = Pool(workers)
+        # only hand a limited number of articles to the pool at a time
+        window_size = workers * chunk_size * 4
+        poa_articles = iter(poa_articles)
+        try:
+            while True:
+                window = list(itertools.islice(poa_articles, window_size))
+                if not window:
+                    break
+                if use_threads:
+                    fragments = pool.imap(
+                        functools.partial(self.journal_fragment, pretty=pretty, indent=indent),
+                        window, chunk_size)
+                else:
+                    fragments = pool.imap(
+                        build_journal_fragment,
+                        [(poa_article, self.crossref_config, self.pub_date, pretty, indent)
+                         for poa_article in window],
+                        chunk_size)
+                for fragment in fragments:
+                    yield fragment
+        finally:
+            pool.close()
+            pool.join()
+
+    def journal_fragment(self, poa_article, pretty=False, indent=""):
+        """
+        build the journal tag for the article and return it serialized,
+        pretty output is indented for its place inside the body tag,
+        nothing is stored on the object so it can be called from several threads at once
+        """
+        journal = self.set_journal(Element('body'), poa_article)
+        if pretty:
+            return serialize.element_to_string(journal, indent * 2, indent, '\n')
+        return serialize.element_to_string(journal)
+
+    def file_fragments(self, article_xmls, fragment_cache=None):
+        """
+        Manuscript id and serialized journal tag for each article XML file in order,
+        fragments found in the fragment_cache are used without parsing the file,
+        files which fail to parse are left out
+        """
+        run_date = time.strftime('%Y-%m-%d', self.pub_date)
+        for article_xml in article_xmls:
+            key = None
+            if fragment_cache is not None:
+                with open(article_xml, 'rb') as open_file:
+                    key = fragment_cache.key(article_xml, open_file.read(), self.crossref_config)
+                entry = fragment_cache.get(key, run_date)
+                if entry is not None:
+                    metadata, fragment = entry
+                    yield metadata.get('manuscript'), fragment
+                    continue
+            articles = build_articles_for_crossref([article_xml])
+            if not articles:
+                continue
+            poa_article = articles[0]
+            fragment = self.journal_fragment(poa_article)
+            if key is not None:
+                metadata = {'manuscript': poa_article.manuscript, 'doi': poa_article.doi}
+                # the fragment is only reusable on the same day if it has the run date in it
+                metadata['run_date'] = None
+                if self.get_pub_date(poa_article) is self.pub_date:
+                    metadata['run_date'] = run_date
+                fragment_cache.set(key, metadata, fragment)
+            yield poa_article.manuscript, fragment
+
     def set_head(self, parent):
-        self.head = SubElement(parent, 'head')
-        self.doi_batch_id = SubElement(self.head, 'doi_batch_id')
-        self.doi_batch_id.text = self.batch_id
-        self.timestamp = SubElement(self.head, 'timestamp')
-        self.timestamp.text = time.strftime("%Y%m%d%H%M%S", self.pub_date)
-        self.set_depositor(self.head)
-        self.registrant = SubElement(self.head, 'registrant')
-        self.registrant.text = self.crossref_config.get("registrant")
+        head = SubElement(parent, 'head')
+        doi_batch_id = SubElement(head, 'doi_batch_id')
+        doi_batch_id.text = self.batch_id
+        timestamp = SubElement(head, 'timestamp')
+        timestamp.text = time.strftime("%Y%m%d%H%M%S", self.pub_date)
+        self.set_depositor(head)
+        registrant = SubElement(head, 'registrant')
+        registrant.text = self.crossref_config.get("registrant")
+        return head
 
     def set_depositor(self, parent):
-        self.depositor = SubElement(parent, 'depositor')
-        self.name = SubElement(self.depositor, 'depositor_name')
-        self.name.text = self.crossref_config.get("depositor_name")
-        self.email_address = SubElement(self.depositor, 'email_address')
-        self.email_address.text = self.crossref_config.get("email_address")
+        depositor = SubElement(parent, 'depositor')
+        name = SubElement(depositor, 'depositor_name')
+        name.text = self.crossref_config.get("depositor_name")
+        email_address = SubElement(depositor, 'email_address')
+        email_address.text = self.crossref_config.get("email_address")
 
     def set_body(self, parent, poa_articles):
         self.body = SubElement(parent, 'body')
@@ -128,6 +379,7 @@ class CrossrefXML(object):
         for poa_article in poa_articles:
             # Create a new journal record for each article
             self.set_journal(self.body, poa_article)
+        return self.body
 
     def get_pub_date(self, poa_article):
         """
@@ -148,91 +400,120 @@ class CrossrefXML(object):
             pub_date = self.pub_date
         return pub_date
 
+    def article_plan(self, poa_article):
+        "make the decisions for building the article once, returns a plan.ArticlePlan"
+        article_plan = plan.ArticlePlan()
+        article_plan.pub_date = self.get_pub_date(poa_article)
+        article_plan.has_license = self.has_license(poa_article)
+        if self.do_set_collection(poa_article, "text-mining"):
+            items = []
+            if self.do_set_collection_text_mining_pdf(poa_article) is True:
+                items.append(("application/pdf", "text_mining_pdf_pattern"))
+            if self.do_set_collection_text_mining_xml(poa_article) is True:
+                items.append(("application/xml", "text_mining_xml_pattern"))
+            article_plan.collections["text-mining"] = items
+        if poa_article.datasets:
+            article_plan.datasets = [dataset for dataset in poa_article.datasets
+                                     if self.do_dataset_related_item(dataset)]
+        for ref_index, ref in enumerate(poa_article.ref_list, 1):
+            authors = self.filter_citation_authors(ref)
+            article_plan.citations.append(plan.CitationPlan(
+                ref,
+                ref.id if ref.id else str(ref_index),
+                authors[0] if authors else None,
+                bool(self.do_citation_related_item(ref)),
+                self.do_unstructured_citation(ref) is True))
+        article_plan.relations_program = self.do_relations_program(poa_article) is True
+        return article_plan
+
     def set_journal(self, parent, poa_article):
         # Add journal for each article
-        self.journal = SubElement(parent, 'journal')
-        self.set_journal_metadata(self.journal, poa_article)
+        article_plan = self.article_plan(poa_article)
+        journal = SubElement(parent, 'journal')
+        self.set_journal_metadata(journal, poa_article)
 
-        self.journal_issue = SubElement(self.journal, 'journal_issue')
+        journal_issue = SubElement(journal, 'journal_issue')
 
-        pub_date = self.get_pub_date(poa_article)
-        self.set_publication_date(self.journal_issue, pub_date)
+        pub_date = article_plan.pub_date
+        self.set_publication_date(journal_issue, pub_date)
 
-        self.journal_volume = SubElement(self.journal_issue, 'journal_volume')
-        self.volume = SubElement(self.journal_volume, 'volume')
+        journal_volume = SubElement(journal_issue, 'journal_volume')
+        volume = SubElement(journal_volume, 'volume')
         # Use volume from the article unless not present then use the default
         if poa_article.volume:
-            self.volume.text = poa_article.volume
+            volume.text = poa_article.volume
         else:
             if self.crossref_config.get("year_of_first_volume"):
-                self.volume.text = eautils.calculate_journal_volume(
+                volume.text = eautils.calculate_journal_volume(
                     pub_date, self.crossref_config.get("year_of_first_volume"))
 
         # Add journal article
-        self.set_journal_article(self.journal, poa_article)
+        self.set_journal_article(journal, poa_article, article_plan)
+        return journal
 
     def set_journal_metadata(self, parent, poa_article):
         # journal_metadata
         journal_metadata = SubElement(parent, 'journal_metadata')
         journal_metadata.set("language", "en")
-        self.full_title = SubElement(journal_metadata, 'full_title')
-        self.full_title.text = poa_article.journal_title
-        self.issn = SubElement(journal_metadata, 'issn')
-        self.issn.set("media_type", "electronic")
-        self.issn.text = poa_article.journal_issn
-
-    def set_journal_article(self, parent, poa_article):
-        self.journal_article = SubElement(parent, 'journal_article')
-        self.journal_article.set("publication_type", "full_text")
-        if (self.crossref_config.get("reference_distribution_opts")
-                and self.crossref_config.get("reference_distribution_opts") != ''):
-            self.journal_article.set(
+        full_title = SubElement(journal_metadata, 'full_title')
+        full_title.text = poa_article.journal_title
+        issn = SubElement(journal_metadata, 'issn')
+        issn.set("media_type", "electronic")
+        issn.text = poa_article.journal_issn
+
+    def set_journal_article(self, parent, poa_article, article_plan=None):
+        if article_plan is None:
+            article_plan = self.article_plan(poa_article)
+        journal_article = SubElement(parent, 'journal_article')
+        journal_article.set("publication_type", "full_text")
+        if self.crossref_config.reference_distribution_opts:
+            journal_article.set(
                 "reference_distribution_opts",
                 self.crossref_config.get("reference_distribution_opts"))
 
         # Set the title with italic tag support
-        self.set_titles(self.journal_article, poa_article)
+        self.set_titles(journal_article, poa_article)
 
-        self.set_contributors(self.journal_article, poa_article,
+        self.set_contributors(journal_article, poa_article,
                               self.crossref_config.get("contrib_types"))
 
-        self.set_abstract(self.journal_article, poa_article)
-        self.set_digest(self.journal_article, poa_article)
+        self.set_abstract(journal_article, poa_article)
+        self.set_digest(journal_article, poa_article)
 
         # Journal publication date
-        pub_date = self.get_pub_date(poa_article)
-        self.set_publication_date(self.journal_article, pub_date)
+        self.set_publication_date(journal_article, article_plan.pub_date)
 
-        self.publisher_item = SubElement(self.journal_article, 'publisher_item')
+        publisher_item = SubElement(journal_article, 'publisher_item')
         if self.crossref_config.get("elocation_id") and poa_article.elocation_id:
-            self.item_number = SubElement(self.publisher_item, 'item_number')
-            self.item_number.set("item_number_type", "article_number")
-            self.item_number.text = poa_article.elocation_id
-        self.identifier = SubElement(self.publisher_item, 'identifier')
-        self.identifier.set("id_type", "doi")
-        self.identifier.text = poa_article.doi
+            item_number = SubElement(publisher_item, 'item_number')
+            item_number.set("item_number_type", "article_number")
+            item_number.text = poa_article.elocation_id
+        identifier = SubElement(publisher_item, 'identifier')
+        identifier.set("id_type", "doi")
+        identifier.text = poa_article.doi
 
         # Disable crossmark for now
-        #self.set_crossmark(self.journal_article, poa_article)
+        #self.set_crossmark(journal_article, poa_article)
 
-        self.set_fundref(self.journal_article, poa_article)
+        self.set_fundref(journal_article, poa_article)
 
-        self.set_access_indicators(self.journal_article, poa_article)
+        self.set_access_indicators(journal_article, poa_article, article_plan)
 
         # this is the spot to add the relations program tag if it is required
-        if self.do_relations_program(poa_article) is True:
-            self.set_relations_program(self.journal_article)
+        if article_plan.relations_program:
+            self.set_relations_program(journal_article)
 
-        self.set_datasets(self.journal_article, poa_article)
+        self.set_datasets(journal_article, poa_article, article_plan)
 
-        self.set_archive_locations(self.journal_article, poa_article,
+        self.set_archive_locations(journal_article, poa_article,
                                    self.crossref_config.get("archive_locations"))
 
-        self.set_doi_data(self.journal_article, poa_article)
+        self.set_doi_data(journal_article, poa_article, article_plan)
 
-        self.set_citation_list(self.journal_article, poa_article)
+        self.set_citation_list(journal_article, poa_article, article_plan)
 
-        self.set_component_list(self.journal_article, poa_article)
+        self.set_component_list(journal_article, poa_article)
+        return journal_article
 
     def set_titles(self, parent, poa_article):
         """
@@ -249,51 +530,43 @@ class CrossrefXML(object):
             self.add_clean_tag(root_xml_element, tag_name, tag_converted_title)
         parent.append(root_xml_element)
 
-    def set_doi_data(self, parent, poa_article):
-        self.doi_data = SubElement(parent, 'doi_data')
+    def set_doi_data(self, parent, poa_article, article_plan=None):
+        doi_data = SubElement(parent, 'doi_data')
 
-        self.doi = SubElement(self.doi_data, 'doi')
-        self.doi.text = poa_article.doi
+        doi = SubElement(doi_data, 'doi')
+        doi.text = poa_article.doi
 
-        self.resource = SubElement(self.doi_data, 'resource')
+        resource = SubElement(doi_data, 'resource')
+        resource.text = self.generate_resource_url(poa_article, poa_article)
 
-        resource = self.generate_resource_url(poa_article, poa_article)
-        self.resource.text = resource
+        self.set_collection(doi_data, poa_article, "text-mining", article_plan)
 
-        self.set_collection(self.doi_data, poa_article, "text-mining")
 
-
-    def set_collection(self, parent, poa_article, collection_property):
-        if self.do_set_collection(poa_article, collection_property):
-            if collection_property == "text-mining":
-                self.collection = SubElement(parent, 'collection')
-                self.collection.set("property", collection_property)
-                if self.do_set_collection_text_mining_pdf(poa_article) is True:
-                    self.item = SubElement(self.collection, 'item')
-                    self.resource = SubElement(self.item, 'resource')
-                    self.resource.set("mime_type", "application/pdf")
-                    self.resource.text = self.generate_resource_url(
-                        poa_article, poa_article, "text_mining_pdf_pattern")
-                if self.do_set_collection_text_mining_xml(poa_article) is True:
-                    self.item = SubElement(self.collection, 'item')
-                    self.resource = SubElement(self.item, 'resource')
-                    self.resource.set("mime_type", "application/xml")
-                    self.resource.text = self.generate_resource_url(
-                        poa_article, poa_article, "text_mining_xml_pattern")
+    def set_collection(self, parent, poa_article, collection_property, article_plan=None):
+        if article_plan is None:
+            article_plan = self.article_plan(poa_article)
+        items = article_plan.collections.get(collection_property)
+        if items is not None:
+            collection = SubElement(parent, 'collection')
+            collection.set("property", collection_property)
+            for mime_type, pattern_type in items:
+                item = SubElement(collection, 'item')
+                resource = SubElement(item, 'resource')
+                resource.set("mime_type", mime_type)
+                resource.text = self.generate_resource_url(
+                    poa_article, poa_article, pattern_type)
 
 
     def do_set_collection_text_mining_xml(self, poa_article):
         "decide whether to text mining xml resource"
-        if (self.crossref_config.get("text_mining_xml_pattern")
-                and self.crossref_config.get("text_mining_pdf_pattern") != ''):
+        if self.crossref_config.text_mining_xml:
             return True
         return False
 
 
     def do_set_collection_text_mining_pdf(self, poa_article):
         "decide whether to text mining pdf resource"
-        if (self.crossref_config.get("text_mining_pdf_pattern")
-                and self.crossref_config.get("text_mining_pdf_pattern") != ''
+        if (self.crossref_config.text_mining_pdf
                 and poa_article.get_self_uri("pdf") is not None):
             return True
         return False
@@ -382,7 +655,7 @@ class CrossrefXML(object):
         if len(poa_article.contributors) < 1:
             return
         # If contrib_type is None, all contributors will be added regardless of their type
-        self.contributors = SubElement(parent, "contributors")
+        contributors = SubElement(parent, "contributors")
 
         # Ready to add to XML
         # Use the natural list order of contributors when setting the first author
@@ -402,40 +675,40 @@ class CrossrefXML(object):
             if contributor.surname == "" or contributor.surname is None:
                 # Most likely a group author
                 if contributor.collab:
-                    self.organization = SubElement(self.contributors, "organization")
-                    self.organization.text = contributor.collab
-                    self.organization.set("contributor_role", contributor_role)
-                    self.organization.set("sequence", sequence)
+                    organization = SubElement(contributors, "organization")
+                    organization.text = contributor.collab
+                    organization.set("contributor_role", contributor_role)
+                    organization.set("sequence", sequence)
 
             else:
-                self.person_name = SubElement(self.contributors, "person_name")
+                person_name = SubElement(contributors, "person_name")
 
-                self.person_name.set("contributor_role", contributor_role)
+                person_name.set("contributor_role", contributor_role)
 
-                self.person_name.set("sequence", sequence)
+                person_name.set("sequence", sequence)
 
-                self.given_name = SubElement(self.person_name, "given_name")
-                self.given_name.text = contributor.given_name
+                given_name = SubElement(person_name, "given_name")
+                given_name.text = contributor.given_name
 
-                self.surname = SubElement(self.person_name, "surname")
-                self.surname.text = contributor.surname
+                surname = SubElement(person_name, "surname")
+                surname.text = contributor.surname
 
                 if contributor.suffix:
-                    self.suffix = SubElement(self.person_name, "suffix")
-                    self.suffix.text = contributor.suffix
+                    suffix = SubElement(person_name, "suffix")
+                    suffix.text = contributor.suffix
 
                 if contributor.affiliations:
                     # Crossref schema limits the number of affilations an author can have
                     max_affiliations = 5
                     for aff in contributor.affiliations[0:max_affiliations]:
                         if aff.text and aff.text != '':
-                            self.affiliation = SubElement(self.person_name, "affiliation")
-                            self.affiliation.text = aff.text
+                            affiliation = SubElement(person_name, "affiliation")
+                            affiliation.text = aff.text
 
                 if contributor.orcid:
-                    self.orcid = SubElement(self.person_name, "ORCID")
-                    self.orcid.set("authenticated", "true")
-                    self.orcid.text = contributor.orcid
+                    orcid = SubElement(person_name, "ORCID")
+                    orcid.set("authenticated", "true")
+                    orcid.text = contributor.orcid
 
             # Reset sequence value after the first sucessful loop
             sequence = "additional"
@@ -454,64 +727,28 @@ class CrossrefXML(object):
         tag_name = 'jats:abstract'
 
         attributes = []
-        attributes_text = ''
         if abstract_type == 'executive-summary':
-            attributes = ['abstract-type']
-            attributes_text = ' abstract-type="executive-summary" '
+            attributes = [('abstract-type', 'executive-summary')]
 
         # Convert the abstract to jats abstract tags, or strip all the inline tags
         if self.crossref_config.get('jats_abstract') is True:
-            tag_converted_abstract = abstract
-            tag_converted_abstract = etoolsutils.escape_ampersand(tag_converted_abstract)
-            tag_converted_abstract = etoolsutils.escape_unmatched_angle_brackets(
-                tag_converted_abstract, utils.allowed_tags())
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'p', 'jats:p')
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'italic', 'jats:italic')
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'bold', 'jats:bold')
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'underline', 'jats:underline')
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'sub', 'jats:sub')
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'sup', 'jats:sup')
-            tag_converted_abstract = eautils.replace_tags(
-                tag_converted_abstract, 'sc', 'jats:sc')
-            tag_converted_abstract = eautils.remove_tag('inline-formula', tag_converted_abstract)
-            tag_converted_abstract = eautils.remove_tag('ext-link', tag_converted_abstract)
+            tag_converted_abstract = tags.rewriter('jats_abstract').rewrite(abstract)
         else:
             # Strip inline tags, keep the p tags
-            tag_converted_abstract = abstract
-            tag_converted_abstract = etoolsutils.escape_ampersand(tag_converted_abstract)
-            tag_converted_abstract = etoolsutils.escape_unmatched_angle_brackets(
-                tag_converted_abstract, utils.allowed_tags())
-            tag_converted_abstract = self.clean_tags(
-                tag_converted_abstract, do_not_clean=['<p>', '</p>', '<mml:', '</mml:'])
-            tag_converted_abstract = eautils.replace_tags(tag_converted_abstract, 'p', 'jats:p')
-            tag_converted_abstract = tag_converted_abstract
-
-        tagged_string = '<' + tag_name + self.reparsing_namespaces + attributes_text + '>'
-        tagged_string += tag_converted_abstract
-        tagged_string += '</' + tag_name + '>'
-        reparsed = minidom.parseString(tagged_string.encode('utf-8'))
-
-        recursive = False
-        root_xml_element = xmlio.append_minidom_xml_to_elementtree_xml(
-            parent, reparsed, recursive, attributes
-        )
+            tag_converted_abstract = tags.rewriter('abstract').rewrite(abstract)
+
+        tags.append_inline_xml(parent, tag_name, tag_converted_abstract, attributes)
 
     def set_publication_date(self, parent, pub_date):
         # pub_date is a python time object
         if pub_date:
-            self.publication_date = SubElement(parent, 'publication_date')
-            self.publication_date.set("media_type", "online")
-            month = SubElement(self.publication_date, "month")
+            publication_date = SubElement(parent, 'publication_date')
+            publication_date.set("media_type", "online")
+            month = SubElement(publication_date, "month")
             month.text = str(pub_date.tm_mon).zfill(2)
-            day = SubElement(self.publication_date, "day")
+            day = SubElement(publication_date, "day")
             day.text = str(pub_date.tm_mday).zfill(2)
-            year = SubElement(self.publication_date, "year")
+            year = SubElement(publication_date, "year")
             year.text = str(pub_date.tm_year)
 
     def set_fundref(self, parent, poa_article):
@@ -519,134 +756,134 @@ class CrossrefXML(object):
         Set the fundref data from the article funding_awards list
         """
         if len(poa_article.funding_awards) > 0:
-            self.fr_program = SubElement(parent, 'fr:program')
-            self.fr_program.set("name", "fundref")
+            fr_program = SubElement(parent, 'fr:program')
+            fr_program.set("name", "fundref")
             for award in poa_article.funding_awards:
-                self.fr_fundgroup = SubElement(self.fr_program, 'fr:assertion')
-                self.fr_fundgroup.set("name", "fundgroup")
+                fr_fundgroup = SubElement(fr_program, 'fr:assertion')
+                fr_fundgroup.set("name", "fundgroup")
 
                 if award.get_funder_name():
-                    self.fr_funder_name = SubElement(self.fr_fundgroup, 'fr:assertion')
-                    self.fr_funder_name.set("name", "funder_name")
-                    self.fr_funder_name.text = award.get_funder_name()
+                    fr_funder_name = SubElement(fr_fundgroup, 'fr:assertion')
+                    fr_funder_name.set("name", "funder_name")
+                    fr_funder_name.text = award.get_funder_name()
 
                 if award.get_funder_name() and award.institution_id:
-                    self.fr_funder_identifier = SubElement(self.fr_funder_name, 'fr:assertion')
-                    self.fr_funder_identifier.set("name", "funder_identifier")
-                    self.fr_funder_identifier.text = award.institution_id
+                    fr_funder_identifier = SubElement(fr_funder_name, 'fr:assertion')
+                    fr_funder_identifier.set("name", "funder_identifier")
+                    fr_funder_identifier.text = award.institution_id
 
                 if len(award.award_ids) > 0:
                     for award_id in award.award_ids:
-                        self.fr_award_number = SubElement(self.fr_fundgroup, 'fr:assertion')
-                        self.fr_award_number.set("name", "award_number")
-                        self.fr_award_number.text = award_id
+                        fr_award_number = SubElement(fr_fundgroup, 'fr:assertion')
+                        fr_award_number.set("name", "award_number")
+                        fr_award_number.text = award_id
 
-    def set_access_indicators(self, parent, poa_article):
+    def set_access_indicators(self, parent, poa_article, article_plan=None):
         """
         Set the AccessIndicators
         """
 
         applies_to = self.crossref_config.get("access_indicators_applies_to")
+        if article_plan is None:
+            has_license = self.has_license(poa_article)
+        else:
+            has_license = article_plan.has_license
 
-        if (len(applies_to) > 0 and self.has_license(poa_article) is True):
+        if (len(applies_to) > 0 and has_license is True):
 
-            self.ai_program = SubElement(parent, 'ai:program')
-            self.ai_program.set('name', 'AccessIndicators')
+            ai_program = SubElement(parent, 'ai:program')
+            ai_program.set('name', 'AccessIndicators')
 
             for applies_to in applies_to:
-                self.ai_program_ref = SubElement(self.ai_program, 'ai:license_ref')
-                self.ai_program_ref.set('applies_to', applies_to)
-                self.ai_program_ref.text = poa_article.license.href
+                ai_program_ref = SubElement(ai_program, 'ai:license_ref')
+                ai_program_ref.set('applies_to', applies_to)
+                ai_program_ref.text = poa_article.license.href
 
     def set_archive_locations(self, parent, poa_article, archive_locations):
         if archive_locations and len(archive_locations) > 0:
-            self.archive_locations = SubElement(parent, 'archive_locations')
+            archive_locations_tag = SubElement(parent, 'archive_locations')
             for archive_location in archive_locations:
-                self.archive = SubElement(self.archive_locations, 'archive')
-                self.archive.set('name', archive_location)
+                archive = SubElement(archive_locations_tag, 'archive')
+                archive.set('name', archive_location)
 
-    def set_citation_list(self, parent, poa_article):
+    def set_citation_list(self, parent, poa_article, article_plan=None):
         """
         Set the citation_list from the article object ref_list objects
         """
-        if len(poa_article.ref_list) > 0:
-            self.citation_list = SubElement(parent, 'citation_list')
-            ref_index = 0
-            for ref in poa_article.ref_list:
-                # Increment
-                ref_index = ref_index + 1
-                # decide whether to create a related_item for the citation
-                if self.do_citation_related_item(ref):
-                    self.set_citation_related_item(ref)
+        if article_plan is None:
+            article_plan = self.article_plan(poa_article)
+        if len(article_plan.citations) > 0:
+            citation_list = SubElement(parent, 'citation_list')
+            relations_program = None
+            for ref, key, first_author, related_item, unstructured in article_plan.citations:
+                # create a related_item for the citation
+                if related_item:
+                    if relations_program is None:
+                        relations_program = self.set_relations_program(parent)
+                    self.set_citation_related_item(relations_program, ref)
 
                 # continue with creating a citation tag
-                self.citation = SubElement(self.citation_list, 'citation')
-
-                if ref.id:
-                    self.citation.set("key", ref.id)
-                else:
-                    self.citation.set("key", str(ref_index))
+                citation = SubElement(citation_list, 'citation')
+                citation.set("key", key)
 
                 if ref.source:
                     if ref.publication_type == "journal":
-                        self.journal_title = SubElement(self.citation, 'journal_title')
-                        self.journal_title.text = ref.source
+                        journal_title = SubElement(citation, 'journal_title')
+                        journal_title.text = ref.source
                     else:
-                        self.volume_title = SubElement(self.citation, 'volume_title')
-                        self.volume_title.text = ref.source
+                        volume_title = SubElement(citation, 'volume_title')
+                        volume_title.text = ref.source
 
-                authors = self.filter_citation_authors(ref)
-                if len(authors) > 0:
+                if first_author:
                     # Only set the first author surname
-                    first_author = authors[0]
                     if first_author.get("surname"):
-                        self.author = SubElement(self.citation, 'author')
-                        self.author.text = first_author.get("surname")
+                        author = SubElement(citation, 'author')
+                        author.text = first_author.get("surname")
                     elif first_author.get("collab"):
-                        self.add_clean_tag(self.citation, 'author', first_author.get("collab"))
+                        self.add_clean_tag(citation, 'author', first_author.get("collab"))
 
                 if ref.volume:
-                    self.volume = SubElement(self.citation, 'volume')
-                    self.volume.text = ref.volume[0:31]
+                    volume = SubElement(citation, 'volume')
+                    volume.text = ref.volume[0:31]
 
                 if ref.issue:
-                    self.issue = SubElement(self.citation, 'issue')
-                    self.issue.text = ref.issue
+                    issue = SubElement(citation, 'issue')
+                    issue.text = ref.issue
 
                 if ref.fpage:
-                    self.first_page = SubElement(self.citation, 'first_page')
-                    self.first_page.text = ref.fpage
+                    first_page = SubElement(citation, 'first_page')
+                    first_page.text = ref.fpage
 
                 if ref.year or ref.year_numeric:
-                    self.cyear = SubElement(self.citation, 'cYear')
+                    cyear = SubElement(citation, 'cYear')
                     # Prefer the numeric year value if available
                     if ref.year_numeric:
-                        self.cyear.text = str(ref.year_numeric)
+                        cyear.text = str(ref.year_numeric)
                     else:
-                        self.cyear.text = ref.year
+                        cyear.text = ref.year
 
                 if ref.article_title or ref.data_title:
                     if ref.article_title:
-                        self.add_clean_tag(self.citation, 'article_title', ref.article_title)
+                        self.add_clean_tag(citation, 'article_title', ref.article_title)
                     elif ref.data_title:
-                        self.add_clean_tag(self.citation, 'article_title', ref.data_title)
+                        self.add_clean_tag(citation, 'article_title', ref.data_title)
 
                 if ref.doi:
-                    self.doi = SubElement(self.citation, 'doi')
-                    self.doi.text = ref.doi
+                    doi = SubElement(citation, 'doi')
+                    doi.text = ref.doi
 
                 if ref.isbn:
-                    self.isbn = SubElement(self.citation, 'isbn')
-                    self.isbn.text = ref.isbn
+                    isbn = SubElement(citation, 'isbn')
+                    isbn.text = ref.isbn
 
                 if ref.elocation_id:
                     # Until an alternate tag is available, elocation-id goes into the first_page tag
-                    self.first_page = SubElement(self.citation, 'first_page')
-                    self.first_page.text = ref.elocation_id
+                    first_page = SubElement(citation, 'first_page')
+                    first_page.text = ref.elocation_id
 
                 # unstructured-citation
-                if self.do_unstructured_citation(ref) is True:
-                    self.set_unstructured_citation(self.citation, ref)
+                if unstructured:
+                    self.set_unstructured_citation(citation, ref)
 
     def filter_citation_authors(self, ref):
         "logic for which authors to select for citation records"
@@ -732,11 +969,11 @@ class CrossrefXML(object):
         else:
             return False
 
-    def set_citation_related_item(self, ref):
-        "depends on the relations_program tag existing already"
-        self.related_item = SubElement(self.relations_program, 'rel:related_item')
+    def set_citation_related_item(self, parent, ref):
+        "add a related_item for the citation to the relations program tag parent"
+        related_item = SubElement(parent, 'rel:related_item')
         if ref.data_title:
-            self.set_related_item_description(self.related_item, ref.data_title)
+            self.set_related_item_description(related_item, ref.data_title)
         identifier_type = None
         related_item_text = None
         related_item_type = "inter_work_relation"
@@ -755,7 +992,7 @@ class CrossrefXML(object):
             related_item_text = ref.uri
         if identifier_type and related_item_text:
             self.set_related_item_work_relation(
-                self.related_item, related_item_type, relationship_type,
+                related_item, related_item_type, relationship_type,
                 identifier_type, related_item_text)
 
     def do_relations_program(self, poa_article):
@@ -774,9 +1011,11 @@ class CrossrefXML(object):
         return do_relations
 
     def set_relations_program(self, parent):
-        "set the relations program parent tag only once"
-        if not hasattr(self, "relations_program"):
-            self.relations_program = SubElement(parent, 'rel:program')
+        "return the relations program tag of the parent, adding it if it does not exist yet"
+        for child in parent:
+            if child.tag == 'rel:program':
+                return child
+        return SubElement(parent, 'rel:program')
 
     def do_dataset_related_item(self, dataset):
         "decide whether to create a related_item for a dataset"
@@ -785,19 +1024,19 @@ class CrossrefXML(object):
         else:
             return False
 
-    def set_datasets(self, parent, poa_article):
+    def set_datasets(self, parent, poa_article, article_plan=None):
         """
         Add related_item tags for each dataset
         """
-        if poa_article.datasets and len(poa_article.datasets) > 0:
-            for dataset in poa_article.datasets:
-                # Check for at least one identifier before adding the related_item
-                if not self.do_dataset_related_item(dataset):
-                    continue
-                # first set the parent tag if it does not yet exist
-                self.set_relations_program(parent)
+        if article_plan is None:
+            article_plan = self.article_plan(poa_article)
+        if len(article_plan.datasets) > 0:
+            # first set the parent tag if it does not yet exist
+            relations_program = self.set_relations_program(parent)
+            # the plan only has datasets with at least one identifier
+            for dataset in article_plan.datasets:
                 # add related_item tag
-                self.related_item = SubElement(self.relations_program, 'rel:related_item')
+                related_item = SubElement(relations_program, 'rel:related_item')
                 related_item_type = "inter_work_relation"
                 description = None
                 relationship_type = self.dataset_relationship_type(dataset)
@@ -805,25 +1044,25 @@ class CrossrefXML(object):
                 if dataset.title:
                     description = dataset.title
                 if description:
-                    self.set_related_item_description(self.related_item, description)
+                    self.set_related_item_description(related_item, description)
                 # Now add one inter_work_relation tag in order ot priority
                 if dataset.doi:
                     identifier_type = "doi"
                     related_item_text = dataset.doi
                     self.set_related_item_work_relation(
-                        self.related_item, related_item_type, relationship_type,
+                        related_item, related_item_type, relationship_type,
                         identifier_type, related_item_text)
                 elif dataset.accession_id:
                     identifier_type = "accession"
                     related_item_text = dataset.accession_id
                     self.set_related_item_work_relation(
-                        self.related_item, related_item_type, relationship_type,
+                        related_item, related_item_type, relationship_type,
                         identifier_type, related_item_text)
                 elif dataset.uri:
                     identifier_type = "uri"
                     related_item_text = dataset.uri
                     self.set_related_item_work_relation(
-                        self.related_item, related_item_type, relationship_type,
+                        related_item, related_item_type, relationship_type,
                         identifier_type, related_item_text)
 
     def dataset_relationship_type(self, dataset):
@@ -842,17 +1081,17 @@ class CrossrefXML(object):
 
     def set_related_item_description(self, parent, description):
         if description:
-            self.description = SubElement(parent, 'rel:description')
-            self.description.text = description
+            description_tag = SubElement(parent, 'rel:description')
+            description_tag.text = description
 
     def set_related_item_work_relation(self, parent, related_item_type, relationship_type,
                                        identifier_type, related_item_text):
         # only supporting inter_work_relation for now
         if related_item_type == "inter_work_relation":
-            self.work_relation = SubElement(parent, 'rel:inter_work_relation')
-        self.work_relation.set("relationship-type", relationship_type)
-        self.work_relation.set("identifier-type", identifier_type)
-        self.work_relation.text = related_item_text
+            work_relation = SubElement(parent, 'rel:inter_work_relation')
+        work_relation.set("relationship-type", relationship_type)
+        work_relation.set("identifier-type", identifier_type)
+        work_relation.text = related_item_text
 
     def set_component_list(self, parent, poa_article):
         """
@@ -861,42 +1100,42 @@ class CrossrefXML(object):
         if len(poa_article.component_list) <= 0:
             return
 
-        self.component_list = SubElement(parent, 'component_list')
+        component_list = SubElement(parent, 'component_list')
         for comp in poa_article.component_list:
-            self.component = SubElement(self.component_list, 'component')
-            self.component.set("parent_relation", "isPartOf")
+            component = SubElement(component_list, 'component')
+            component.set("parent_relation", "isPartOf")
 
-            self.titles = SubElement(self.component, 'titles')
+            titles = SubElement(component, 'titles')
 
-            self.title = SubElement(self.titles, 'title')
-            self.title.text = comp.title
+            title = SubElement(titles, 'title')
+            title.text = comp.title
 
             if comp.subtitle:
-                self.set_subtitle(self.titles, comp)
+                self.set_subtitle(titles, comp)
 
             if comp.mime_type:
                 # Convert to allowed mime types for Crossref, if found
                 if self.crossref_mime_type(comp.mime_type):
-                    self.format = SubElement(self.component, 'format')
-                    self.format.set("mime_type", self.crossref_mime_type(comp.mime_type))
+                    format = SubElement(component, 'format')
+                    format.set("mime_type", self.crossref_mime_type(comp.mime_type))
 
             if comp.permissions:
-                self.set_component_permissions(self.component, comp.permissions)
+                self.set_component_permissions(component, comp.permissions)
 
             if comp.doi:
                 # Try generating a resource value then continue
                 resource_url = self.generate_resource_url(comp, poa_article)
                 if resource_url and resource_url != '':
-                    self.doi_data = SubElement(self.component, 'doi_data')
-                    self.doi_tag = SubElement(self.doi_data, 'doi')
-                    self.doi_tag.text = comp.doi
-                    self.resource = SubElement(self.doi_data, 'resource')
-                    self.resource.text = resource_url
+                    doi_data = SubElement(component, 'doi_data')
+                    doi_tag = SubElement(doi_data, 'doi')
+                    doi_tag.text = comp.doi
+                    resource = SubElement(doi_data, 'resource')
+                    resource.text = resource_url
 
     def set_component_permissions(self, parent, permissions):
         "Specific license for the component"
         # First check if a license ref is in the config
-        if self.crossref_config.get('component_license_ref') != '':
+        if self.crossref_config.component_license:
             # set the component permissions if it has any copyright statement or license value
             set_permissions = False
             for permission in permissions:
@@ -919,52 +1158,31 @@ class CrossrefXML(object):
 
     def clean_tags(self, original_string, do_not_clean=[]):
         "remove all unwanted inline tags from the string"
-        tag_converted_string = original_string
-        for tag in utils.allowed_tags():
-            if tag not in do_not_clean:
-                # first do exact tag replacements
-                if tag.startswith('<') and tag.endswith('>'):
-                    tag_converted_string = tag_converted_string.replace(tag, '')
-                # then replace by fragments for mml tags if present
-                if tag.startswith('<') and not tag.endswith('>'):
-                    tag_fragment = tag.lstrip('</')
-                    tag_converted_string = eautils.remove_tag(tag_fragment, tag_converted_string)
-        remove_tags = ['inline-formula']
-        for tag in remove_tags:
-            if tag not in do_not_clean:
-                tag_converted_string = eautils.remove_tag(tag, tag_converted_string)
-        return tag_converted_string
+        return tags.clean_tags(original_string, do_not_clean)
 
     def add_clean_tag(self, parent, tag_name, original_string):
-        "remove allowed tags and then add a tag the parent"
+        """
+        remove allowed tags and then add a tag the parent,
+        the tag for a string is made once and copied from tags.INLINE_ELEMENTS after that
+        """
+        return tags.INLINE_ELEMENTS.append(
+            parent, tag_name, original_string, (self.__class__, 'clean'),
+            self.clean_string)
+
+    def clean_string(self, original_string):
+        "remove allowed tags and escape the rest of the string for add_clean_tag"
         tag_converted_string = self.clean_tags(original_string)
         tag_converted_string = etoolsutils.escape_ampersand(tag_converted_string)
-        tag_converted_string = etoolsutils.escape_unmatched_angle_brackets(
-            tag_converted_string)
-        tagged_string = ('<' + tag_name + self.reparsing_namespaces + '>' +
-                         tag_converted_string + '</' + tag_name + '>')
-        reparsed = minidom.parseString(tagged_string.encode('utf-8'))
-        root_xml_element = xmlio.append_minidom_xml_to_elementtree_xml(
-            parent, reparsed
-        )
+        return etoolsutils.escape_unmatched_angle_brackets(tag_converted_string)
 
     def add_inline_tag(self, parent, tag_name, original_string):
         "replace inline tags found in the original_string and then add a tag the parent"
-        tag_converted_string = self.convert_inline_tags(original_string)
-        tagged_string = '<' + tag_name + self.reparsing_namespaces + '>' + tag_converted_string + '</' + tag_name + '>'
-        reparsed = minidom.parseString(tagged_string.encode('utf-8'))
-        root_xml_element = xmlio.append_minidom_xml_to_elementtree_xml(
-            parent, reparsed
-        )
+        return tags.INLINE_ELEMENTS.append(
+            parent, tag_name, original_string, (self.__class__, 'inline'),
+            self.convert_inline_tags)
 
     def convert_inline_tags(self, original_string):
-        tag_converted_string = etoolsutils.escape_ampersand(original_string)
-        tag_converted_string = etoolsutils.escape_unmatched_angle_brackets(
-            tag_converted_string, utils.allowed_tags())
-        tag_converted_string = eautils.replace_tags(tag_converted_string, 'italic', 'i')
-        tag_converted_string = eautils.replace_tags(tag_converted_string, 'bold', 'b')
-        tag_converted_string = eautils.replace_tags(tag_converted_string, 'underline', 'u')
-        return tag_converted_string
+        return tags.rewriter('face_markup').rewrite(original_string)
 
     def crossref_mime_type(self, jats_mime_type):
         """
@@ -1013,55 +1231,232 @@ class CrossrefXML(object):
 
     def output_xml(self, pretty=False, indent=""):
         encoding = 'utf-8'
+        return serialize.tostring(self.root, pretty is True, indent, encoding)
 
-        rough_string = ElementTree.tostring(self.root, encoding)
-        reparsed = minidom.parseString(rough_string)
-
-        if pretty is True:
-            return reparsed.toprettyxml(indent, encoding=encoding).decode(encoding)
-        else:
-            return reparsed.toxml(encoding=encoding).decode(encoding)
+    def write_xml(self, fp, pretty=False, indent=""):
+        """
+        write the output_xml output UTF-8 encoded to the binary file object fp
+        without making the whole string first, returns the number of bytes written
+        """
+        encoding = 'utf-8'
+        return serialize.write(self.root, fp, pretty is True, indent, encoding)
 
 
-def build_crossref_xml(poa_articles, crossref_config=None, pub_date=None, add_comment=True):
+def generator_version(crossref_config=None):
+    """
+    version for the generated comment, the generator_version config value, or the
+    environment variable, or otherwise the last git commit which is only looked up once
+    """
+    if crossref_config and crossref_config.get('generator_version'):
+        return crossref_config.get('generator_version')
+    if os.environ.get(GENERATOR_VERSION_VARIABLE):
+        return os.environ.get(GENERATOR_VERSION_VARIABLE)
+    repo_path = os.getcwd()
+    if repo_path not in LAST_COMMITS:
+        LAST_COMMITS[repo_path] = eautils.get_last_commit_to_master()
+    return LAST_COMMITS[repo_path]
+
+
+def build_crossref_xml(poa_articles, crossref_config=None, pub_date=None, add_comment=True,
+                       stats=None):
     """
     Given a list of article article objects
     generate crossref XML from them
     """
     if not crossref_config:
-        crossref_config = parse_raw_config(raw_config(None))
-    return CrossrefXML(poa_articles, crossref_config, pub_date, add_comment)
+        crossref_config = cached_config(None)
+    return CrossrefXML(poa_articles, crossref_config, pub_date, add_comment, stats=stats)
 
 
-def crossref_xml(poa_articles, crossref_config=None, pub_date=None, add_comment=True):
-    "build crossref xml and return output as a string"
+def crossref_xml(poa_articles, crossref_config=None, pub_date=None, add_comment=True,
+                 workers=None, use_threads=False, chunk_size=1):
+    """
+    build crossref xml and return output as a string
+    if workers is more than one, journals are built in parallel, see CrossrefXML.write_batch
+    """
     if not crossref_config:
-        crossref_config = parse_raw_config(raw_config(None))
+        crossref_config = cached_config(None)
+    if workers and workers > 1:
+        output = BytesIO()
+        crossref_xml_to_stream(poa_articles, output, crossref_config, pub_date, add_comment,
+                               workers, use_threads, chunk_size)
+        return output.getvalue().decode('utf-8')
     c_xml = build_crossref_xml(poa_articles, crossref_config, pub_date, add_comment)
     return c_xml.output_xml()
 
 
-def crossref_xml_to_disk(poa_articles, crossref_config=None, pub_date=None, add_comment=True):
-    "build crossref xml and write the output to disk"
+def crossref_xml_to_stream(poa_articles, fp, crossref_config=None, pub_date=None,
+                           add_comment=True, workers=None, use_threads=False, chunk_size=1,
+                           pretty=False, indent=""):
+    """
+    build crossref xml one journal at a time and write it to the binary file object fp
+    poa_articles can be an iterator, the CrossrefXML object is returned
+    pretty and indent format the output the same as output_xml
+    """
+    if not crossref_config:
+        crossref_config = cached_config(None)
+    # the batch id depends on whether there is only one article
+    first_articles, poa_articles = utils.peek(poa_articles, 2)
+    c_xml = CrossrefXML(first_articles, crossref_config, pub_date, add_comment, build=False)
+    c_xml.write_batch(poa_articles, fp, workers, use_threads, chunk_size, pretty, indent)
+    return c_xml
+
+
+def crossref_xml_to_disk(poa_articles, crossref_config=None, pub_date=None, add_comment=True,
+                         stream=False, workers=None, use_threads=False, chunk_size=1,
+                         max_articles=None, max_bytes=None, pretty=False, indent="",
+                         sink=None, compression=None, compression_level=None):
+    """
+    build crossref xml and write the output to disk
+    if stream is True, poa_articles can be an iterator and each journal is written
+    as soon as it is built, workers more than one builds the journals in parallel
+    if max_articles or max_bytes is set the output is split into more than one batch
+    as it is streamed and the manifest from write_split_batches is returned
+    pretty and indent format the output the same as output_xml
+    sink is a sinks.Sink or a target for sinks.sink_for, by default the TMP_DIR directory,
+    a sink made here from a target is closed before returning
+    compression is gzip or zstd to compress each batch file as it is written, and
+    compression_level its level, by default the compression and compression_level config,
+    max_bytes and the bytes in a manifest are the size before compression
+    """
     if not crossref_config:
-        crossref_config = parse_raw_config(raw_config(None))
+        crossref_config = cached_config(None)
+    if sink is None:
+        sink = TMP_DIR
+    base_sink = sinks.sink_for(sink)
+    output = compressed_sink(base_sink, crossref_config, compression, compression_level)
+    try:
+        return write_crossref_xml_to_sink(
+            poa_articles, crossref_config, pub_date, add_comment, stream, workers,
+            use_threads, chunk_size, max_articles, max_bytes, pretty, indent, output)
+    finally:
+        if base_sink is not sink:
+            base_sink.close()
+
+
+def compressed_sink(sink, crossref_config, compression=None, compression_level=None):
+    """
+    the sinks.Sink wrapped in a sinks.CompressedSink if there is a compression, by default
+    the compression and compression_level config, otherwise the sink itself
+    """
+    if compression is None:
+        compression = crossref_config.get('compression')
+    if compression_level is None:
+        compression_level = crossref_config.get('compression_level')
+    if compression:
+        return sinks.CompressedSink(sink, compression, compression_level)
+    return sink
+
+
+def write_crossref_xml_to_sink(poa_articles, crossref_config, pub_date, add_comment, stream,
+                               workers, use_threads, chunk_size, max_articles, max_bytes,
+                               pretty, indent, sink):
+    "write the batch files for crossref_xml_to_disk to the sink"
+    if max_articles or max_bytes:
+        first_articles, poa_articles = utils.peek(poa_articles, 2)
+        c_xml = CrossrefXML(first_articles, crossref_config, pub_date, add_comment, build=False)
+        return c_xml.write_split_batches(
+            poa_articles, sink, max_articles, max_bytes, workers, use_threads, chunk_size,
+            pretty, indent)
+    if stream or (workers and workers > 1):
+        first_articles, poa_articles = utils.peek(poa_articles, 2)
+        c_xml = CrossrefXML(first_articles, crossref_config, pub_date, add_comment, build=False)
+        with sink.open(c_xml.batch_id + '.xml') as fp:
+            c_xml.write_batch(poa_articles, fp, workers, use_threads, chunk_size,
+                              pretty, indent)
+        return
     c_xml = build_crossref_xml(poa_articles, crossref_config, pub_date, add_comment)
-    xml_string = c_xml.output_xml()
-    # Write to file
-    filename = TMP_DIR + os.sep + c_xml.batch_id + '.xml'
-    with open(filename, "wb") as fp:
-        try:
-            fp.write(xml_string.encode('utf-8'))
-        except UnicodeDecodeError:  # pragma: no cover
-            fp.write(xml_string)
+    # Write to the sink
+    with sink.open(c_xml.batch_id + '.xml') as fp:
+        c_xml.write_xml(fp, pretty, indent)
 
 
-def build_articles_for_crossref(article_xmls, detail='full', build_parts=[]):
-    "specify some detail and build_parts specific to generating crossref output"
-    build_parts = [
-        'abstract', 'basic', 'components', 'contributors', 'funding', 'datasets',
-        'license', 'pub_dates', 'references', 'volume']
-    return build_articles(article_xmls, detail, build_parts)
+def crossref_xml_from_files(article_xmls, fp, crossref_config=None, pub_date=None,
+                            add_comment=True, fragment_cache=None):
+    """
+    build crossref xml from article XML files and write it to the binary file object fp,
+    if fragment_cache is a cache.FragmentCache unchanged articles are not parsed again
+    """
+    if not crossref_config:
+        crossref_config = cached_config(None)
+    c_xml = CrossrefXML([], crossref_config, pub_date, add_comment, build=False)
+    entries = c_xml.file_fragments(article_xmls, fragment_cache)
+    first_entries, entries = utils.peek(entries, 2)
+    c_xml.set_batch_id([manuscript for manuscript, fragment in first_entries])
+    c_xml.write_fragments((fragment for manuscript, fragment in entries), fp)
+    return c_xml
+
+
+def build_journal_fragment(args):
+    "build the serialized journal tag of one article, for use by a worker"
+    poa_article, crossref_config, pub_date, pretty, indent = args
+    c_xml = CrossrefXML([], crossref_config, pub_date, add_comment=False, build=False)
+    return c_xml.journal_fragment(poa_article, pretty, indent)
+
+
+def build_articles_for_crossref(article_xmls, detail='full', build_parts=[], workers=None,
+                                chunk_size=1, errors=None):
+    """
+    specify some detail and build_parts specific to generating crossref output
+    if workers is more than one, the files are parsed in parallel, see parsed_articles
+    """
+    build_parts = BUILD_PARTS
+    return list(parsed_articles(article_xmls, detail, build_parts, workers, chunk_size, errors))
 
 def build_articles(article_xmls, detail='full', build_parts=[]):
     return parse.build_articles_from_article_xmls(article_xmls, detail, build_parts)
+
+
+def build_articles_parallel(article_xmls, detail='full', build_parts=[], workers=2,
+                            chunk_size=1, errors=None):
+    """
+    parse the article XML files using a pool of worker processes, chunk_size files
+    at a time, and return the article objects in the order of article_xmls
+    """
+    return list(parsed_articles(article_xmls, detail, build_parts, workers, chunk_size, errors))
+
+
+def parsed_articles(article_xmls, detail='full', build_parts=[], workers=None, chunk_size=1,
+                    errors=None, window_size=None):
+    """
+    parse the article XML files and yield the article objects in the order of article_xmls,
+    if workers is more than one by one pool of worker processes, chunk_size files at a time,
+    window_size limits how many files are parsed ahead of the articles used, by default all,
+    files which fail to parse are left out and if errors is a dict the error
+    message is added to it using the file name as the key
+    """
+    article_xmls = iter(article_xmls)
+    pool = None
+    if workers and workers > 1:
+        pool = Pool(workers)
+    try:
+        while True:
+            window = list(itertools.islice(article_xmls, window_size))
+            if not window:
+                break
+            args = [(article_xml, detail, build_parts) for article_xml in window]
+            if pool:
+                results = pool.imap(build_article, args, chunk_size)
+            else:
+                results = (build_article(arg) for arg in args)
+            for article_xml, (article, error) in zip(window, results):
+                if error is None:
+                    yield article
+                elif errors is not None:
+                    errors[article_xml] = error
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+
+def build_article(args):
+    "parse one article XML file, in a worker process or not, returns the article and any error"
+    article_xml, detail, build_parts = args
+    try:
+        article, error_count = parse.build_article_from_xml(article_xml, detail, build_parts)
+    except Exception as exception:
+        return None, '%s: %s' % (exception.__class__.__name__, exception)
+    if error_count > 0:
+        return None, '%s errors parsing the article' % error_count
+    return article, None
@@ -0,0 +1,28 @@
+"""
+The decisions CrossrefXML makes about an article, worked out in one pass before the
+article is built so the set_ methods do not repeat them
+"""
+from collections import namedtuple
+
+
+# a ref_list citation with its key, the author to output, and whether to add a
+# related item for it and an unstructured_citation tag
+CitationPlan = namedtuple(
+    'CitationPlan', ['ref', 'key', 'first_author', 'related_item', 'unstructured'])
+
+
+class ArticlePlan(object):
+
+    def __init__(self):
+        "values are set by CrossrefXML.article_plan"
+        # the resolved publication date
+        self.pub_date = None
+        self.has_license = False
+        # collection property to a list of mime type and pattern config name pairs
+        self.collections = {}
+        # datasets which have an identifier for a related item
+        self.datasets = []
+        # a CitationPlan for each ref in order
+        self.citations = []
+        # whether to add the rel:program tag, from CrossrefXML.do_relations_program
+        self.relations_program = False
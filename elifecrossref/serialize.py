@@ -0,0 +1,201 @@
+"""
+Serialize ElementTree elements to XML strings in the same format the minidom
+reparsing of ElementTree output produced, without building a DOM
+"""
+import sys
+from xml.etree.ElementTree import Comment
+
+
+XML_DECLARATION = '<?xml version="1.0" encoding="{encoding}"?>'
+
+# before Python 3.8 both ElementTree and minidom sorted attributes by name,
+# from 3.8 minidom keeps their order but writes the namespace declarations first
+SORT_ATTRIBUTES = sys.version_info < (3, 8)
+
+# Python 2 ElementTree only escapes new lines in attribute values
+ESCAPES_ATTRIBUTE_WHITESPACE = sys.version_info >= (3,)
+
+# levels below the root element write opens up, so each journal is written by itself
+WRITE_DEPTH = 2
+
+
+def escape_text(text):
+    "escape character data as it is output after a reparse by minidom"
+    if '\r' in text:
+        # the XML parser normalises line endings
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return (text.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('"', '&quot;').replace('>', '&gt;'))
+
+
+def escape_attribute(value):
+    "escape an attribute value as it is output after a reparse by minidom"
+    if '\r' in value:
+        value = value.replace('\r\n', '\n').replace('\r', '\n')
+        if not ESCAPES_ATTRIBUTE_WHITESPACE:
+            value = value.replace('\n', ' ')
+    if '\t' in value and not ESCAPES_ATTRIBUTE_WHITESPACE:
+        # unescaped whitespace is normalised by the XML parser
+        value = value.replace('\t', ' ')
+    return (value.replace('&', '&amp;').replace('<', '&lt;')
+            .replace('"', '&quot;').replace('>', '&gt;'))
+
+
+def escape_comment(text):
+    "comment text is not escaped, the parser only normalises line endings"
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def attribute_items(element):
+    "attribute name and value pairs in output order"
+    items = element.items()
+    if SORT_ATTRIBUTES:
+        return sorted(items)
+    if len(items) > 1:
+        namespace_items = [item for item in items if is_namespace_declaration(item[0])]
+        if namespace_items:
+            return namespace_items + [item for item in items
+                                      if not is_namespace_declaration(item[0])]
+    return items
+
+
+def is_namespace_declaration(name):
+    return name == 'xmlns' or name.startswith('xmlns:')
+
+
+def start_tag(element):
+    "opening tag of the element including its attributes"
+    return '<' + element.tag + _attributes(element) + '>'
+
+
+def end_tag(element):
+    return '</' + element.tag + '>'
+
+
+def element_to_string(element, indent='', addindent='', newl=''):
+    """
+    serialize the element and its children, not including the element tail,
+    indent, addindent and newl have the same meaning as in minidom writexml
+    """
+    output = []
+    if addindent or newl:
+        _serialize_pretty(output.append, element, indent, addindent, newl)
+    else:
+        _serialize(output.append, element)
+    return ''.join(output)
+
+
+def tostring(element, pretty=False, indent='', encoding='utf-8'):
+    """
+    XML declaration and element as a string, equal to the minidom toxml output
+    or to toprettyxml output with the indent if pretty is True
+    """
+    newl = ''
+    if pretty:
+        newl = '\n'
+    else:
+        indent = ''
+    declaration = XML_DECLARATION.format(encoding=encoding) + newl
+    return declaration + element_to_string(element, '', indent, newl)
+
+
+def write(element, fp, pretty=False, indent='', encoding='utf-8'):
+    """
+    write the same output as tostring encoded to the binary file object fp, the element
+    and its children are written a part at a time down to WRITE_DEPTH levels, so the
+    whole text is never held in memory, returns the number of bytes written
+    """
+    byte_counts = []
+
+    def flush(pieces):
+        data = ''.join(pieces).encode(encoding)
+        fp.write(data)
+        byte_counts.append(len(data))
+
+    newl = ''
+    if pretty:
+        newl = '\n'
+    else:
+        indent = ''
+    flush([XML_DECLARATION.format(encoding=encoding) + newl])
+    _write_element(flush, element, WRITE_DEPTH, '', indent, newl)
+    return sum(byte_counts)
+
+
+def _attributes(element):
+    return ''.join([' %s="%s"' % (name, escape_attribute(value))
+                    for name, value in attribute_items(element)])
+
+
+def _serialize(append, element):
+    tag = element.tag
+    if tag is Comment:
+        append('<!--' + escape_comment(element.text or '') + '-->')
+        return
+    if element.attrib:
+        append('<' + tag + _attributes(element))
+    else:
+        append('<' + tag)
+    text = element.text
+    if text or len(element):
+        append('>')
+        if text:
+            append(escape_text(text))
+        for child in element:
+            _serialize(append, child)
+            if child.tail:
+                append(escape_text(child.tail))
+        append('</' + tag + '>')
+    else:
+        append('/>')
+
+
+def _serialize_pretty(append, element, indent, addindent, newl):
+    "follows the minidom writexml logic for formatting the output"
+    tag = element.tag
+    if tag is Comment:
+        append(indent + '<!--' + escape_comment(element.text or '') + '-->' + newl)
+        return
+    append(indent + '<' + tag + _attributes(element))
+    text = element.text
+    if len(element):
+        append('>' + newl)
+        child_indent = indent + addindent
+        if text:
+            append(escape_text(child_indent + text + newl))
+        for child in element:
+            _serialize_pretty(append, child, child_indent, addindent, newl)
+            if child.tail:
+                append(escape_text(child_indent + child.tail + newl))
+        append(indent + '</' + tag + '>' + newl)
+    elif text:
+        # a single text node is written inline
+        append('>' + escape_text(text) + '</' + tag + '>' + newl)
+    else:
+        append('/>' + newl)
+
+
+def _write_element(flush, element, depth, indent, addindent, newl):
+    "serialize the element, its children are flushed one at a time down to depth levels"
+    tag = element.tag
+    if depth == 0 or not len(element) or tag is Comment:
+        pieces = []
+        if addindent or newl:
+            _serialize_pretty(pieces.append, element, indent, addindent, newl)
+        else:
+            _serialize(pieces.append, element)
+        flush(pieces)
+        return
+    text = element.text
+    child_indent = indent + addindent
+    pieces = [indent + '<' + tag + _attributes(element) + '>' + newl]
+    if text:
+        pieces.append(escape_text(child_indent + text + newl))
+    flush(pieces)
+    for child in element:
+        _write_element(flush, child, depth - 1, child_indent, addindent, newl)
+        if child.tail:
+            flush([escape_text(child_indent + child.tail + newl)])
+    flush([indent + '</' + tag + '>' + newl])
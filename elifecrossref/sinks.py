@@ -0,0 +1,373 @@
+"""
+Output sinks the batch files are written to, a directory, a tar or zip archive,
+a stream such as stdout, or a dict in memory, a batch file is only saved to the
+sink when the file returned by open is closed, and is discarded if it is aborted,
+CompressedSink compresses the batch files written to any of them, zstd compression
+requires zstandard
+"""
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from io import BytesIO
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+# buffer size of the files written to a directory
+BUFFER_SIZE = 64 * 1024
+
+# batch files up to this size are held in memory before they are added to an archive
+SPOOL_SIZE = 8 * 1024 * 1024
+
+# archive file name endings and their tarfile compression
+TAR_SUFFIXES = [('.tar', ''), ('.tar.gz', 'gz'), ('.tgz', 'gz'), ('.tar.bz2', 'bz2')]
+
+# os.rename does not replace an existing file on Windows
+rename = getattr(os, 'replace', os.rename)
+
+# ZipFile.open can write a member from Python 3.6
+ZIP_OPEN_WRITE = sys.version_info >= (3, 6)
+
+# file name endings added to compressed batch files
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+# compression levels when none is given
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+
+class SinkFile(object):
+
+    def __init__(self, fp):
+        "binary file object of a batch file, saved by close or thrown away by abort"
+        self.fp = fp
+        self.closed = False
+
+    def write(self, data):
+        self.fp.write(data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.save()
+
+    def abort(self):
+        if not self.closed:
+            self.closed = True
+            self.discard()
+
+    def save(self):
+        self.fp.close()
+
+    def discard(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class Sink(object):
+
+    def open(self, name):
+        "a SinkFile to write the batch file called name to"
+        raise NotImplementedError
+
+    def write(self, name, data):
+        "save the bytes as the batch file called name and return its location"
+        with self.open(name) as open_file:
+            open_file.write(data)
+        return self.location(name)
+
+    def location(self, name):
+        "where the batch file called name is saved, as listed in a manifest"
+        return name
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class DirectoryFile(SinkFile):
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE):
+        "write to a temporary file next to path which is renamed to path when it is saved"
+        self.path = path
+        self.temp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        handle = os.open(self.temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                         getattr(os, 'O_BINARY', 0), 0o666)
+        SinkFile.__init__(self, os.fdopen(handle, 'wb', buffer_size))
+
+    def save(self):
+        self.fp.close()
+        rename(self.temp_path, self.path)
+
+    def discard(self):
+        self.fp.close()
+        os.remove(self.temp_path)
+
+
+class DirectorySink(Sink):
+
+    def __init__(self, directory, buffer_size=BUFFER_SIZE):
+        """
+        Write each batch file to directory, creating it if required, so readers
+        never see a partly written file they are written to a temporary file first
+        """
+        self.directory = directory
+        self.buffer_size = buffer_size
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # made by another job at the same time
+                if not os.path.isdir(directory):
+                    raise
+
+    def location(self, name):
+        return os.path.join(self.directory, name)
+
+    def open(self, name):
+        return DirectoryFile(self.location(name), self.buffer_size)
+
+
+class SpooledFile(SinkFile):
+
+    def __init__(self, name, add):
+        "held in memory, or a temporary file if it is large, until add is called with it"
+        SinkFile.__init__(self, tempfile.SpooledTemporaryFile(SPOOL_SIZE))
+        self.name = name
+        self.add = add
+
+    def save(self):
+        try:
+            size = self.fp.tell()
+            self.fp.seek(0)
+            self.add(self.name, self.fp, size)
+        finally:
+            self.fp.close()
+
+
+class TarSink(Sink):
+
+    def __init__(self, target, compression=''):
+        """
+        Write the batch files as members of one tar archive streamed to target, a file
+        path or a binary file object which is not closed, compression is '', gz or bz2
+        """
+        mode = 'w|' + compression
+        if hasattr(target, 'write'):
+            self.tar = tarfile.open(fileobj=target, mode=mode)
+        else:
+            self.tar = tarfile.open(target, mode)
+        self.lock = threading.Lock()
+
+    def open(self, name):
+        return SpooledFile(name, self.add)
+
+    def add(self, name, fp, size):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = time.time()
+        info.mode = 0o644
+        with self.lock:
+            self.tar.addfile(info, fp)
+
+    def close(self):
+        with self.lock:
+            self.tar.close()
+
+
+class ZipSink(Sink):
+
+    def __init__(self, target, compression=zipfile.ZIP_DEFLATED):
+        """
+        Write the batch files as members of one zip archive, target is a file path or
+        a binary file object which is not closed
+        """
+        self.zip = zipfile.ZipFile(target, 'w', compression, allowZip64=True)
+        self.compression = compression
+        self.lock = threading.Lock()
+
+    def open(self, name):
+        return SpooledFile(name, self.add)
+
+    def add(self, name, fp, size):
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0o644 << 16
+        info.file_size = size
+        with self.lock:
+            if ZIP_OPEN_WRITE:
+                with self.zip.open(info, 'w') as member:
+                    shutil.copyfileobj(fp, member)
+            else:
+                self.zip.writestr(info, fp.read())
+
+    def close(self):
+        with self.lock:
+            self.zip.close()
+
+
+class StreamFile(SinkFile):
+
+    def __init__(self, fp, lock):
+        "write straight to the stream, the lock is held until it is closed"
+        lock.acquire()
+        SinkFile.__init__(self, fp)
+        self.lock = lock
+
+    def save(self):
+        try:
+            self.fp.flush()
+        finally:
+            self.lock.release()
+
+    def discard(self):
+        # what was written cannot be taken back
+        self.lock.release()
+
+
+class StreamSink(Sink):
+
+    def __init__(self, fp=None):
+        """
+        Write the batch files one after another to the binary file object fp, which is
+        not closed, by default stdout, for output of a single batch file
+        """
+        if fp is None:
+            fp = getattr(sys.stdout, 'buffer', sys.stdout)
+        self.fp = fp
+        self.lock = threading.Lock()
+
+    def open(self, name):
+        return StreamFile(self.fp, self.lock)
+
+
+class MemoryFile(SinkFile):
+
+    def __init__(self, name, files):
+        SinkFile.__init__(self, BytesIO())
+        self.name = name
+        self.files = files
+
+    def save(self):
+        self.files[self.name] = self.fp.getvalue()
+        self.fp.close()
+
+
+class MemorySink(Sink):
+
+    def __init__(self):
+        "keep the bytes of each batch file in the files dict by name"
+        self.files = {}
+
+    def open(self, name):
+        return MemoryFile(name, self.files)
+
+
+def compressor(compression, level=None):
+    """
+    object with the compress and flush methods of a zlib compressobj which makes
+    a gzip or zstd stream, level is the compression level
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError('unknown compression: %s' % compression)
+    if level is None:
+        level = DEFAULT_LEVELS.get(compression)
+    if compression == 'gzip':
+        # the gzip header is written by zlib with no file name and a zero time
+        try:
+            return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        except zlib.error:
+            raise ValueError('invalid gzip compression level: %s' % level)
+    if zstandard is None:
+        raise ImportError('zstandard is required for zstd compression')
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+class CompressedFile(SinkFile):
+
+    def __init__(self, sink_file, compressor_object):
+        "compress what is written to the SinkFile of the sink being compressed"
+        SinkFile.__init__(self, sink_file)
+        self.compressor = compressor_object
+
+    def write(self, data):
+        compressed = self.compressor.compress(data)
+        if compressed:
+            self.fp.write(compressed)
+
+    def save(self):
+        self.fp.write(self.compressor.flush())
+        self.fp.close()
+
+    def discard(self):
+        self.fp.abort()
+
+
+class CompressedSink(Sink):
+
+    def __init__(self, sink, compression='gzip', level=None):
+        """
+        Compress each batch file as it is written to sink, a .gz or .zst ending is
+        added to the name, closing this sink closes sink
+        """
+        # fail now if the compression is unknown or zstandard is not installed
+        compressor(compression, level)
+        self.sink = sink
+        self.compression = compression
+        self.level = level
+        self.suffix = COMPRESSION_SUFFIXES[compression]
+
+    def open(self, name):
+        return CompressedFile(self.sink.open(name + self.suffix),
+                              compressor(self.compression, self.level))
+
+    def location(self, name):
+        return self.sink.location(name + self.suffix)
+
+    def close(self):
+        self.sink.close()
+
+
+def sink_for(target):
+    """
+    the sink for target, which is a Sink, - for stdout, a path ending .zip, .tar,
+    .tar.gz, .tgz or .tar.bz2 for an archive, or otherwise a directory path
+    """
+    if isinstance(target, Sink):
+        return target
+    if target == '-':
+        return StreamSink()
+    return archive_sink(target) or DirectorySink(target)
+
+
+def archive_sink(path):
+    "a tar or zip archive sink by the extension of path, or None if it is not an archive"
+    lower_path = path.lower()
+    if lower_path.endswith('.zip'):
+        return ZipSink(path)
+    for suffix, compression in TAR_SUFFIXES:
+        if lower_path.endswith(suffix):
+            return TarSink(path, compression)
+    return None
@@ -0,0 +1,107 @@
+"""
+Opt-in instrumentation of CrossrefXML, recording the wall time, number of calls and
+number of elements produced by each set_ method for each article and for the batch
+"""
+import threading
+from timeit import default_timer
+from xml.etree.ElementTree import iselement
+
+
+# the method called once for each article, its calls mark the article boundaries
+ARTICLE_METHOD = 'set_journal'
+
+# instrumented methods which do not start with set_
+OTHER_METHODS = ['output_xml']
+
+
+def count_elements(parent, child_count, result):
+    """
+    number of elements added to parent after its first child_count children,
+    or if there is no parent the size of the returned element
+    """
+    if parent is not None:
+        return sum([len(list(child.iter())) for child in list(parent)[child_count:]])
+    if iselement(result):
+        return len(list(result.iter()))
+    return 0
+
+
+class SectionStats(object):
+
+    def __init__(self):
+        "totals for each method name, times include the nested calls to other methods"
+        self.sections = {}
+
+    def record(self, name, seconds, elements):
+        section = self.sections.get(name)
+        if section is None:
+            section = {'calls': 0, 'seconds': 0.0, 'elements': 0}
+            self.sections[name] = section
+        section['calls'] += 1
+        section['seconds'] += seconds
+        section['elements'] += elements
+
+    def get(self, name, key, default=0):
+        return self.sections.get(name, {}).get(key, default)
+
+    def to_dict(self):
+        return dict([(name, dict(section)) for name, section in self.sections.items()])
+
+
+class Stats(object):
+
+    def __init__(self, callback=None):
+        """
+        Collect the stats of the CrossrefXML objects it is passed to, callback is
+        called with the DOI and the SectionStats of each article when it is finished
+        """
+        self.callback = callback
+        self.batch = SectionStats()
+        self.articles = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def instrument(self, c_xml):
+        "replace the methods of the CrossrefXML object with ones which record stats"
+        for name in dir(c_xml):
+            if not name.startswith('set_') and name not in OTHER_METHODS:
+                continue
+            method = getattr(c_xml, name)
+            if callable(method):
+                setattr(c_xml, name, self.wrap(name, method))
+
+    def wrap(self, name, method):
+        def instrumented(*args, **kwargs):
+            parent = None
+            child_count = 0
+            if args and iselement(args[0]):
+                parent = args[0]
+                child_count = len(parent)
+            if name == ARTICLE_METHOD:
+                self.local.article = SectionStats()
+            try:
+                start = default_timer()
+                result = method(*args, **kwargs)
+                seconds = default_timer() - start
+                self.record(name, seconds, count_elements(parent, child_count, result))
+            finally:
+                if name == ARTICLE_METHOD:
+                    article_stats = self.local.article
+                    self.local.article = None
+            if name == ARTICLE_METHOD:
+                self.end_article(args[1].doi, article_stats)
+            return result
+        return instrumented
+
+    def record(self, name, seconds, elements):
+        article_stats = getattr(self.local, 'article', None)
+        if article_stats is not None:
+            article_stats.record(name, seconds, elements)
+        with self.lock:
+            self.batch.record(name, seconds, elements)
+
+    def end_article(self, doi, article_stats):
+        with self.lock:
+            self.articles.append((doi, article_stats))
+        if self.callback:
+            self.callback(doi, article_stats)
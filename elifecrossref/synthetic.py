@@ -0,0 +1,461 @@
+"""
+Generate synthetic JATS article XML with configurable numbers of contributors, references,
+datasets, funding awards and components, for benchmarks and scaling tests
+"""
+from __future__ import print_function
+import argparse
+import os
+import sys
+from xml.etree.ElementTree import Element, SubElement
+
+from elifecrossref import serialize
+
+
+DOI_PREFIX = '10.7554/eLife.'
+
+REF_TYPES = [
+    'journal', 'book', 'data', 'software', 'preprint', 'web', 'report', 'thesis',
+    'confproc', 'patent', 'periodical', 'clinicaltrial']
+
+# element-citation child tags added for each publication type after the authors and year
+REF_FIELDS = {
+    'journal': ['article-title', 'source', 'volume', 'fpage', 'lpage', 'doi'],
+    'book': ['chapter-title', 'source', 'edition', 'publisher-loc', 'publisher-name',
+             'fpage', 'lpage'],
+    'data': ['data-title', 'source', 'accession'],
+    'software': ['data-title', 'source', 'ext-link', 'version'],
+    'preprint': ['article-title', 'source', 'doi'],
+    'web': ['article-title', 'source', 'ext-link', 'date-in-citation'],
+    'report': ['source', 'publisher-loc', 'publisher-name'],
+    'thesis': ['article-title', 'publisher-loc', 'publisher-name'],
+    'confproc': ['article-title', 'conf-name', 'fpage', 'lpage'],
+    'patent': ['article-title', 'source', 'patent'],
+    'periodical': ['article-title', 'source', 'volume', 'fpage'],
+    'clinicaltrial': ['article-title', 'source', 'ext-link'],
+}
+
+# counts of each part in a default article, similar to a typical research article
+DEFAULT_SIZES = {
+    'contributors': 8,
+    'affiliations': 4,
+    'group_authors': 0,
+    'refs': 40,
+    'ref_authors': 4,
+    'datasets': 2,
+    'funding_awards': 3,
+    'figures': 6,
+    'figure_supplements': 1,
+    'source_data': 1,
+    'supplementary_files': 2,
+    'math': 1,
+}
+
+NAMESPACES = [
+    ('xmlns:ali', 'http://www.niso.org/schemas/ali/1.0/'),
+    ('xmlns:mml', 'http://www.w3.org/1998/Math/MathML'),
+    ('xmlns:xlink', 'http://www.w3.org/1999/xlink'),
+]
+
+LICENSE_HREF = 'http://creativecommons.org/licenses/by/4.0/'
+
+
+def scaled_sizes(factor, **sizes):
+    "default sizes multiplied by factor, with any sizes given as keyword arguments"
+    scaled = {}
+    for name, value in DEFAULT_SIZES.items():
+        if name in ['ref_authors', 'figure_supplements', 'source_data']:
+            # counts per parent item are not scaled
+            scaled[name] = value
+        else:
+            scaled[name] = value * factor
+    scaled.update(sizes)
+    return scaled
+
+
+def ref_type_counts(refs):
+    "dict of the number of refs of each publication type, refs can be a count or a dict"
+    if isinstance(refs, dict):
+        return refs
+    counts = dict([(ref_type, 0) for ref_type in REF_TYPES])
+    for index in range(refs):
+        counts[REF_TYPES[index % len(REF_TYPES)]] += 1
+    return counts
+
+
+def text_element(parent, tag_name, text, attributes=None):
+    element = SubElement(parent, tag_name)
+    for name, value in attributes or []:
+        element.set(name, value)
+    element.text = text
+    return element
+
+
+def set_name(parent, surname, given_names):
+    name = SubElement(parent, 'name')
+    text_element(name, 'surname', surname)
+    text_element(name, 'given-names', given_names)
+
+
+def set_date(parent, tag_name, attributes, year, month=None, day=None):
+    date = SubElement(parent, tag_name)
+    for name, value in attributes:
+        date.set(name, value)
+    if day:
+        text_element(date, 'day', '%02d' % day)
+    if month:
+        text_element(date, 'month', '%02d' % month)
+    text_element(date, 'year', str(year))
+
+
+def set_math(parent, index):
+    "inline MathML formula"
+    formula = SubElement(parent, 'inline-formula')
+    math = SubElement(formula, 'mml:math')
+    math.set('id', 'inf%s' % index)
+    mrow = SubElement(math, 'mml:mrow')
+    msub = SubElement(mrow, 'mml:msub')
+    text_element(msub, 'mml:mi', 'x')
+    text_element(msub, 'mml:mn', str(index))
+    text_element(mrow, 'mml:mo', '=')
+    mfrac = SubElement(mrow, 'mml:mfrac')
+    text_element(mfrac, 'mml:mi', 'a')
+    text_element(mfrac, 'mml:mi', 'b')
+    formula.tail = ' '
+
+
+class SyntheticArticle(object):
+
+    def __init__(self, manuscript=12345, **sizes):
+        "sizes are keyword arguments with the names in DEFAULT_SIZES"
+        self.manuscript = manuscript
+        self.sizes = dict(DEFAULT_SIZES)
+        self.sizes.update(sizes)
+        self.doi = DOI_PREFIX + self.manuscript_id()
+        self.component_count = 0
+
+    def manuscript_id(self):
+        return '%05d' % self.manuscript
+
+    def file_name(self, version=1):
+        return 'elife-%s-v%s.xml' % (self.manuscript_id(), version)
+
+    def component_doi(self):
+        "next component DOI in the sequence"
+        self.component_count += 1
+        return '%s.%03d' % (self.doi, self.component_count)
+
+    def build(self):
+        "the article as an ElementTree Element"
+        self.component_count = 0
+        root = Element('article')
+        root.set('article-type', 'research-article')
+        root.set('dtd-version', '1.1')
+        for name, value in NAMESPACES:
+            root.set(name, value)
+        front = SubElement(root, 'front')
+        self.set_journal_meta(front)
+        self.set_article_meta(front)
+        self.set_body(root)
+        self.set_back(root)
+        return root
+
+    def tostring(self):
+        return serialize.tostring(self.build())
+
+    def set_journal_meta(self, parent):
+        journal_meta = SubElement(parent, 'journal-meta')
+        text_element(journal_meta, 'journal-id', 'eLife', [('journal-id-type', 'publisher-id')])
+        journal_title_group = SubElement(journal_meta, 'journal-title-group')
+        text_element(journal_title_group, 'journal-title', 'eLife')
+        text_element(journal_meta, 'issn', '2050-084X', [('publication-format', 'electronic')])
+        publisher = SubElement(journal_meta, 'publisher')
+        text_element(publisher, 'publisher-name', 'eLife Sciences Publications, Ltd')
+
+    def set_article_meta(self, parent):
+        article_meta = SubElement(parent, 'article-meta')
+        text_element(article_meta, 'article-id', self.manuscript_id(),
+                     [('pub-id-type', 'publisher-id')])
+        text_element(article_meta, 'article-id', self.doi, [('pub-id-type', 'doi')])
+        categories = SubElement(article_meta, 'article-categories')
+        subj_group = SubElement(categories, 'subj-group')
+        subj_group.set('subj-group-type', 'display-channel')
+        text_element(subj_group, 'subject', 'Research Article')
+        title_group = SubElement(article_meta, 'title-group')
+        title = text_element(title_group, 'article-title', 'Synthetic article ')
+        text_element(title, 'italic', self.manuscript_id()).tail = ' for scaling tests'
+        self.set_contrib_group(article_meta)
+        set_date(article_meta, 'pub-date',
+                 [('publication-format', 'electronic'), ('date-type', 'publication')],
+                 2016, 4, 25)
+        set_date(article_meta, 'pub-date', [('pub-type', 'collection')], 2016)
+        text_element(article_meta, 'volume', '5')
+        text_element(article_meta, 'elocation-id', 'e' + self.manuscript_id())
+        self.set_permissions(article_meta, 'Synthetic et al')
+        self_uri = SubElement(article_meta, 'self-uri')
+        self_uri.set('content-type', 'pdf')
+        self_uri.set('xlink:href', 'elife-%s.pdf' % self.manuscript_id())
+        self.set_abstract(article_meta)
+        self.set_funding_group(article_meta)
+
+    def set_contrib_group(self, parent):
+        contrib_group = SubElement(parent, 'contrib-group')
+        affiliations = max(self.sizes['affiliations'], 1)
+        funding_awards = self.sizes['funding_awards']
+        for index in range(1, self.sizes['contributors'] + 1):
+            contrib = SubElement(contrib_group, 'contrib')
+            contrib.set('contrib-type', 'author')
+            contrib.set('id', 'author-%s' % index)
+            if index == 1:
+                contrib.set('corresp', 'yes')
+            set_name(contrib, 'Surname%s' % index, 'Given %s' % chr(65 + index % 26))
+            if index == 1:
+                text_element(contrib, 'contrib-id', 'http://orcid.org/0000-0002-1825-%04d' % index,
+                             [('contrib-id-type', 'orcid'), ('authenticated', 'true')])
+                text_element(contrib, 'email', 'author%s@example.org' % index)
+            aff_index = (index - 1) % affiliations + 1
+            text_element(contrib, 'xref', str(aff_index),
+                         [('ref-type', 'aff'), ('rid', 'aff%s' % aff_index)])
+            if funding_awards:
+                xref = SubElement(contrib, 'xref')
+                xref.set('ref-type', 'other')
+                xref.set('rid', 'fund%s' % ((index - 1) % funding_awards + 1))
+        for index in range(1, self.sizes['group_authors'] + 1):
+            contrib = SubElement(contrib_group, 'contrib')
+            contrib.set('contrib-type', 'author')
+            text_element(contrib, 'collab', 'Synthetic Consortium %s' % index)
+        for index in range(1, self.sizes['affiliations'] + 1):
+            aff = SubElement(contrib_group, 'aff')
+            aff.set('id', 'aff%s' % index)
+            text_element(aff, 'label', str(index))
+            text_element(aff, 'institution', 'Department %s' % index, [('content-type', 'dept')])
+            text_element(aff, 'institution', 'University %s' % index)
+            addr_line = SubElement(aff, 'addr-line')
+            text_element(addr_line, 'named-content', 'City %s' % index,
+                         [('content-type', 'city')])
+            text_element(aff, 'country', 'United Kingdom')
+
+    def set_permissions(self, parent, holder):
+        permissions = SubElement(parent, 'permissions')
+        text_element(permissions, 'copyright-statement', u'\u00a9 2016, ' + holder)
+        text_element(permissions, 'copyright-year', '2016')
+        text_element(permissions, 'copyright-holder', holder)
+        SubElement(permissions, 'ali:free_to_read')
+        license_tag = SubElement(permissions, 'license')
+        license_tag.set('xlink:href', LICENSE_HREF)
+        text_element(license_tag, 'ali:license_ref', LICENSE_HREF)
+        text_element(license_tag, 'license-p', 'This article is distributed under the terms ' +
+                     'of the Creative Commons Attribution License.')
+
+    def set_abstract(self, parent):
+        abstract = SubElement(parent, 'abstract')
+        text_element(abstract, 'object-id', self.component_doi(), [('pub-id-type', 'doi')])
+        paragraph = text_element(abstract, 'p', 'An abstract with ')
+        text_element(paragraph, 'italic', 'italic').tail = ' text & MathML: '
+        for index in range(1, self.sizes['math'] + 1):
+            set_math(paragraph, index)
+        digest = SubElement(parent, 'abstract')
+        digest.set('abstract-type', 'executive-summary')
+        text_element(digest, 'object-id', self.component_doi(), [('pub-id-type', 'doi')])
+        text_element(digest, 'title', 'eLife digest')
+        text_element(digest, 'p', 'A digest of the synthetic article.')
+
+    def set_funding_group(self, parent):
+        if not self.sizes['funding_awards']:
+            return
+        funding_group = SubElement(parent, 'funding-group')
+        for index in range(1, self.sizes['funding_awards'] + 1):
+            award_group = SubElement(funding_group, 'award-group')
+            award_group.set('id', 'fund%s' % index)
+            funding_source = SubElement(award_group, 'funding-source')
+            institution_wrap = SubElement(funding_source, 'institution-wrap')
+            text_element(institution_wrap, 'institution-id',
+                         'http://dx.doi.org/10.13039/%09d' % (100000000 + index),
+                         [('institution-id-type', 'FundRef')])
+            text_element(institution_wrap, 'institution', 'Funder %s' % index)
+            text_element(award_group, 'award-id', 'AWARD-%s' % index)
+            recipient = SubElement(award_group, 'principal-award-recipient')
+            set_name(recipient, 'Surname1', 'Given B')
+        text_element(funding_group, 'funding-statement', 'The funders had no role in the study.')
+
+    def set_body(self, parent):
+        body = SubElement(parent, 'body')
+        sec = SubElement(body, 'sec')
+        sec.set('id', 's1')
+        text_element(sec, 'title', 'Results')
+        text_element(sec, 'p', 'Results of the synthetic article.')
+        for index in range(1, self.sizes['figures'] + 1):
+            self.set_figure_group(sec, index)
+
+    def set_figure_group(self, parent, index):
+        fig_group = SubElement(parent, 'fig-group')
+        self.set_figure(fig_group, 'fig%s' % index, 'Figure %s.' % index,
+                        'elife-%s-fig%s.tif' % (self.manuscript_id(), index))
+        for supplement in range(1, self.sizes['figure_supplements'] + 1):
+            fig = self.set_figure(
+                fig_group, 'fig%ss%s' % (index, supplement),
+                u'Figure %s\u2014figure supplement %s.' % (index, supplement),
+                'elife-%s-fig%s-figsupp%s.tif' % (self.manuscript_id(), index, supplement))
+            fig.set('specific-use', 'child-fig')
+        if self.sizes['source_data']:
+            paragraph = SubElement(fig_group[0], 'p')
+            for source_data in range(1, self.sizes['source_data'] + 1):
+                self.set_supplementary_material(
+                    paragraph, 'fig%ssdata%s' % (index, source_data),
+                    u'Figure %s\u2014source data %s.' % (index, source_data),
+                    'elife-%s-fig%s-data%s.xlsx' % (self.manuscript_id(), index, source_data))
+
+    def set_figure(self, parent, fig_id, label, href):
+        fig = SubElement(parent, 'fig')
+        fig.set('id', fig_id)
+        fig.set('position', 'float')
+        text_element(fig, 'object-id', self.component_doi(), [('pub-id-type', 'doi')])
+        text_element(fig, 'label', label)
+        caption = SubElement(fig, 'caption')
+        text_element(caption, 'title', 'Title of ' + label)
+        text_element(caption, 'p', 'Legend of the figure.')
+        graphic = SubElement(fig, 'graphic')
+        graphic.set('mimetype', 'image')
+        graphic.set('mime-subtype', 'tiff')
+        graphic.set('xlink:href', href)
+        return fig
+
+    def set_supplementary_material(self, parent, supplementary_id, label, href):
+        supplementary = SubElement(parent, 'supplementary-material')
+        supplementary.set('id', supplementary_id)
+        text_element(supplementary, 'object-id', self.component_doi(), [('pub-id-type', 'doi')])
+        text_element(supplementary, 'label', label)
+        caption = SubElement(supplementary, 'caption')
+        text_element(caption, 'title', 'Title of ' + label)
+        self.set_permissions(caption, 'Supplementary holder')
+        media = SubElement(supplementary, 'media')
+        media.set('mimetype', 'application')
+        media.set('mime-subtype', 'xlsx')
+        media.set('xlink:href', href)
+
+    def set_back(self, parent):
+        back = SubElement(parent, 'back')
+        sec = SubElement(back, 'sec')
+        sec.set('sec-type', 'supplementary-material')
+        sec.set('id', 's2')
+        text_element(sec, 'title', 'Additional files')
+        for index in range(1, self.sizes['supplementary_files'] + 1):
+            self.set_supplementary_material(
+                sec, 'supp%s' % index, 'Supplementary file %s.' % index,
+                'elife-%s-supp%s.xlsx' % (self.manuscript_id(), index))
+        self.set_datasets(back)
+        self.set_ref_list(back)
+
+    def set_datasets(self, parent):
+        "datasets section with half of the datasets generated and the rest previously published"
+        if not self.sizes['datasets']:
+            return
+        sec = SubElement(parent, 'sec')
+        sec.set('sec-type', 'datasets')
+        sec.set('id', 's3')
+        text_element(sec, 'title', 'Major datasets')
+        generated_count = (self.sizes['datasets'] + 1) // 2
+        for index in range(1, self.sizes['datasets'] + 1):
+            if index == 1:
+                text_element(sec, 'p', 'The following datasets were generated:')
+            if index == generated_count + 1:
+                text_element(sec, 'p', 'The following previously published datasets were used:')
+            paragraph = SubElement(sec, 'p')
+            related_object = SubElement(paragraph, 'related-object')
+            if index <= generated_count:
+                related_object.set('content-type', 'generated-dataset')
+            else:
+                related_object.set('content-type', 'existing-dataset')
+            related_object.set('id', 'dataset%s' % index)
+            related_object.set('source-id', 'https://example.org/datasets/%s' % index)
+            related_object.set('source-id-type', 'uri')
+            set_name(related_object, 'Surname%s' % index, 'D')
+            text_element(related_object, 'year', '2016', [('iso-8601-date', '2016')])
+            text_element(related_object, 'data-title', 'Dataset %s' % index)
+            text_element(related_object, 'source', 'Dryad Digital Repository')
+            text_element(related_object, 'pub-id', '10.5061/dryad.%s' % index,
+                         [('pub-id-type', 'doi'),
+                          ('xlink:href', 'https://doi.org/10.5061/dryad.%s' % index)])
+
+    def set_ref_list(self, parent):
+        counts = ref_type_counts(self.sizes['refs'])
+        if not sum(counts.values()):
+            return
+        ref_list = SubElement(parent, 'ref-list')
+        text_element(ref_list, 'title', 'References')
+        index = 0
+        for ref_type in REF_TYPES:
+            for count in range(counts.get(ref_type, 0)):
+                index += 1
+                self.set_ref(ref_list, index, ref_type)
+
+    def set_ref(self, parent, index, ref_type):
+        ref = SubElement(parent, 'ref')
+        ref.set('id', 'bib%s' % index)
+        citation = SubElement(ref, 'element-citation')
+        citation.set('publication-type', ref_type)
+        person_group = SubElement(citation, 'person-group')
+        person_group.set('person-group-type', 'author')
+        for author in range(1, self.sizes['ref_authors'] + 1):
+            set_name(person_group, 'Author%s' % author, 'R')
+        text_element(citation, 'year', str(1990 + index % 30),
+                     [('iso-8601-date', str(1990 + index % 30))])
+        for field in REF_FIELDS[ref_type]:
+            if field == 'doi':
+                text_element(citation, 'pub-id', '10.5555/ref.%s' % index,
+                             [('pub-id-type', 'doi')])
+            elif field == 'accession':
+                text_element(citation, 'pub-id', 'GSE%s' % index,
+                             [('pub-id-type', 'accession'),
+                              ('xlink:href', 'https://example.org/accession/GSE%s' % index)])
+            elif field == 'ext-link':
+                text_element(citation, 'ext-link', 'https://example.org/refs/%s' % index,
+                             [('ext-link-type', 'uri'),
+                              ('xlink:href', 'https://example.org/refs/%s' % index)])
+            elif field == 'date-in-citation':
+                text_element(citation, 'date-in-citation', 'January 1, 2017',
+                             [('iso-8601-date', '2017-01-01')])
+            elif field == 'patent':
+                text_element(citation, 'patent', 'US%s' % index, [('country', 'United States')])
+            elif field in ['fpage', 'lpage', 'volume', 'edition', 'version']:
+                text_element(citation, field, str(index))
+            else:
+                text_element(citation, field, '%s %s %s' % (ref_type, field, index))
+
+
+def write_corpus(directory, count, first_manuscript=90001, **sizes):
+    "write count synthetic article XML files to directory and return the file paths"
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    article_xmls = []
+    for manuscript in range(first_manuscript, first_manuscript + count):
+        article = SyntheticArticle(manuscript, **sizes)
+        article_xml = os.path.join(directory, article.file_name())
+        with open(article_xml, 'wb') as open_file:
+            open_file.write(article.tostring().encode('utf-8'))
+        article_xmls.append(article_xml)
+    return article_xmls
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic JATS article XML files.')
+    parser.add_argument('directory', help='directory to write the files to')
+    parser.add_argument('--count', type=int, default=1, help='number of articles')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiply the default sizes by this factor')
+    for name in sorted(DEFAULT_SIZES):
+        parser.add_argument('--' + name.replace('_', '-'), type=int, dest=name,
+                            help='number of %s, overrides the scaled size' % name.replace('_', ' '))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    sizes = dict([(name, getattr(args, name)) for name in DEFAULT_SIZES
+                  if getattr(args, name) is not None])
+    for article_xml in write_corpus(args.directory, args.count, **scaled_sizes(args.scale, **sizes)):
+        print(article_xml)
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
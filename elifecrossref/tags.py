@@ -0,0 +1,398 @@
+"""
+Convert strings of escaped inline markup, as prepared by the generator,
+directly into ElementTree elements
+"""
+import copy
+import re
+from xml.etree.ElementTree import Element, SubElement
+from xml.parsers.expat import ExpatError
+
+from elifearticle import utils as eautils
+from elifetools import utils as etoolsutils
+
+from elifecrossref import utils
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+
+# namespace prefixes which may be used in the inline markup
+NAMESPACES = {
+    'jats': 'http://www.ncbi.nlm.nih.gov/JATS1',
+    'mml': 'http://www.w3.org/1998/Math/MathML',
+    'xlink': 'http://www.w3.org/1999/xlink',
+    'xml': 'http://www.w3.org/XML/1998/namespace',
+}
+
+MARKUP_PATTERN = re.compile(r'(<[^<>]*>)')
+NAME = r'[^\W\d][\w.\-]*(?::[^\W\d][\w.\-]*)?'
+TAG_PATTERN = re.compile(
+    r'^<(/?)(' + NAME + r')((?:\s+' + NAME + r'''\s*=\s*(?:"[^"]*"|'[^']*'))*)\s*(/?)>$''',
+    re.UNICODE)
+ATTRIBUTE_PATTERN = re.compile(
+    r'''(''' + NAME + r''')\s*=\s*(?:"([^"]*)"|'([^']*)')''', re.UNICODE)
+ENTITY_PATTERN = re.compile(r'&(?:#x([0-9a-fA-F]+)|#([0-9]+)|(amp|lt|gt|quot|apos));')
+ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+INVALID_CHARACTER_PATTERN = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# the same split as etoolsutils.escape_unmatched_angle_brackets
+SPLIT_PATTERN = re.compile('(<.*?>)')
+TOKEN_PATTERN = re.compile(r'<[^<>\n]*>')
+# an angle bracket which does not start a whole tag on one line
+STRAY_BRACKET_PATTERN = re.compile(r'<(?![^<>\n]*>)')
+
+# number of cleaned strings remembered by each TagCleaner
+CLEAN_CACHE_SIZE = 4096
+
+# number of elements remembered by the InlineElementCache
+INLINE_CACHE_SIZE = 4096
+
+# tags renamed to the JATS namespace in jats abstracts
+JATS_ABSTRACT_TAGS = ['p', 'italic', 'bold', 'underline', 'sub', 'sup', 'sc']
+# tags and the face markup tags they are renamed to
+FACE_MARKUP_TAGS = [('italic', 'i'), ('bold', 'b'), ('underline', 'u')]
+# tags always removed by clean_tags
+REMOVE_TAGS = ['inline-formula']
+
+
+class TagRewriter(object):
+    """
+    Escape ampersands and unmatched angle brackets, then rename or remove the
+    allowed tags, in a single scan of the string
+    tag_map maps exact tags to their replacement, an empty string to remove them,
+    tags starting with one of the removal_prefixes are removed
+    """
+
+    def __init__(self, tag_map=None, removal_prefixes=(), allowed_tags=None):
+        self.tag_map = tag_map or {}
+        self.removal_prefixes = tuple(removal_prefixes)
+        if allowed_tags is None:
+            allowed_tags = utils.allowed_tags()
+        self.allowed_tags = tuple(allowed_tags)
+
+    def rewrite(self, string):
+        if not string:
+            return string
+        string = etoolsutils.escape_ampersand(string)
+        output = []
+        for index, part in enumerate(SPLIT_PATTERN.split(string)):
+            if index % 2 == 1 and part.count('<') == 1:
+                # a tag
+                if part.startswith(self.allowed_tags):
+                    output.append(self.convert_tag(part))
+                else:
+                    output.append(part.replace('<', '&lt;').replace('>', '&gt;'))
+            elif index % 2 == 0 and '<' not in part:
+                # text
+                output.append(part.replace('>', '&gt;'))
+            else:
+                # unmatched angle brackets are escaped in the same way as before
+                part = etoolsutils.escape_unmatched_angle_brackets(part, self.allowed_tags)
+                output.append(TOKEN_PATTERN.sub(self.convert_tag_match, part))
+        return ''.join(output)
+
+    def convert_tag(self, tag):
+        replacement = self.tag_map.get(tag)
+        if replacement is not None:
+            return replacement
+        if tag.startswith(self.removal_prefixes):
+            return ''
+        return tag
+
+    def convert_tag_match(self, match):
+        return self.convert_tag(match.group(0))
+
+
+def clean_rules(do_not_clean=()):
+    """
+    exact tags and tag prefixes removed by clean_tags, the tag fragments
+    in utils.allowed_tags() remove both the open and close tags
+    """
+    exact_tags = []
+    tag_names = []
+    for tag in utils.allowed_tags():
+        if tag in do_not_clean:
+            continue
+        if tag.startswith('<') and tag.endswith('>'):
+            exact_tags.append(tag)
+        elif tag.startswith('<'):
+            tag_names.append(tag.lstrip('</'))
+    tag_names += [tag for tag in REMOVE_TAGS if tag not in do_not_clean]
+    prefixes = []
+    for tag_name in tag_names:
+        prefixes += ['<' + tag_name, '</' + tag_name]
+    return exact_tags, prefixes
+
+
+class TagCleaner(object):
+    """
+    Remove the allowed tags not in do_not_clean using one compiled pattern,
+    cleaned strings are kept in a bounded LRU cache
+    """
+
+    def __init__(self, do_not_clean=(), cache_size=CLEAN_CACHE_SIZE):
+        self.do_not_clean = list(do_not_clean)
+        exact_tags, prefixes = clean_rules(self.do_not_clean)
+        alternatives = [re.escape(tag) for tag in exact_tags]
+        alternatives += [re.escape(prefix) + r'[^<>\n]*>' for prefix in prefixes]
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+        self.cache = utils.LRUCache(cache_size)
+
+    def clean(self, string):
+        cleaned_string = self.cache.get(string)
+        if cleaned_string is None:
+            if self.pattern is None:
+                cleaned_string = string
+            elif STRAY_BRACKET_PATTERN.search(string):
+                # removing tags one kind at a time can join up new tags
+                cleaned_string = clean_tags_by_tag(string, self.do_not_clean)
+            else:
+                cleaned_string = self.pattern.sub('', string)
+            self.cache.set(string, cleaned_string)
+        return cleaned_string
+
+
+def clean_tags_by_tag(string, do_not_clean=()):
+    "remove each kind of tag in turn, for strings with unmatched angle brackets"
+    for tag in utils.allowed_tags():
+        if tag not in do_not_clean:
+            # first do exact tag replacements
+            if tag.startswith('<') and tag.endswith('>'):
+                string = string.replace(tag, '')
+            # then replace by fragments for mml tags if present
+            if tag.startswith('<') and not tag.endswith('>'):
+                string = eautils.remove_tag(tag.lstrip('</'), string)
+    for tag in REMOVE_TAGS:
+        if tag not in do_not_clean:
+            string = eautils.remove_tag(tag, string)
+    return string
+
+
+CLEANERS = {}
+
+
+def cleaner(do_not_clean=()):
+    "the TagCleaner for the set of do_not_clean tags, compiled once"
+    key = frozenset(do_not_clean)
+    if key not in CLEANERS:
+        CLEANERS[key] = TagCleaner(do_not_clean)
+    return CLEANERS[key]
+
+
+def clean_tags(string, do_not_clean=()):
+    "remove all unwanted inline tags from the string"
+    return cleaner(do_not_clean).clean(string)
+
+
+def jats_abstract_rewriter():
+    tag_map = {}
+    for tag_name in JATS_ABSTRACT_TAGS:
+        tag_map['<%s>' % tag_name] = '<jats:%s>' % tag_name
+        tag_map['</%s>' % tag_name] = '</jats:%s>' % tag_name
+    removal_prefixes = []
+    for tag_name in ['inline-formula', 'ext-link']:
+        removal_prefixes += ['<' + tag_name, '</' + tag_name]
+    return TagRewriter(tag_map, removal_prefixes)
+
+
+def abstract_rewriter():
+    "strip inline tags, keep the p tags and MathML"
+    exact_tags, removal_prefixes = clean_rules(['<p>', '</p>', '<mml:', '</mml:'])
+    tag_map = dict((tag, '') for tag in exact_tags)
+    tag_map['<p>'] = '<jats:p>'
+    tag_map['</p>'] = '</jats:p>'
+    return TagRewriter(tag_map, removal_prefixes)
+
+
+def face_markup_rewriter():
+    tag_map = {}
+    for from_tag, to_tag in FACE_MARKUP_TAGS:
+        tag_map['<%s>' % from_tag] = '<%s>' % to_tag
+        tag_map['</%s>' % from_tag] = '</%s>' % to_tag
+    return TagRewriter(tag_map)
+
+
+REWRITER_FACTORIES = {
+    'jats_abstract': jats_abstract_rewriter,
+    'abstract': abstract_rewriter,
+    'face_markup': face_markup_rewriter,
+}
+
+REWRITERS = {}
+
+
+def rewriter(mode):
+    "the TagRewriter for the mode, jats_abstract, abstract or face_markup, compiled once"
+    if mode not in REWRITERS:
+        REWRITERS[mode] = REWRITER_FACTORIES[mode]()
+    return REWRITERS[mode]
+
+
+class InlineMarkupError(ExpatError):
+    "the markup is not well-formed, raised where minidom would raise an ExpatError"
+    pass
+
+
+def append_inline_xml(parent, tag_name, xml_string, attributes=None):
+    """
+    Add a tag_name SubElement to parent with the text and child tags of the xml_string
+    attributes is a list of name and value pairs set on the new tag only,
+    attributes of tags in the xml_string are not copied,
+    nothing is added to parent if the xml_string is not well-formed
+    """
+    element = Element(tag_name)
+    if attributes:
+        for name, value in attributes:
+            element.set(name, value)
+    if xml_string:
+        append_markup(element, xml_string)
+    parent.append(element)
+    return element
+
+
+class InlineElementCache(object):
+    """
+    Bounded LRU cache of the elements made from strings of inline markup, keyed by the
+    tag name, the conversion mode and the string, a copy of the cached
+    element is added each time so repeated strings are only converted and parsed once
+    """
+
+    def __init__(self, maxsize=INLINE_CACHE_SIZE):
+        self.cache = utils.LRUCache(maxsize)
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+    def __len__(self):
+        return len(self.cache)
+
+    def clear(self):
+        self.cache.clear()
+
+    def append(self, parent, tag_name, string, mode, convert):
+        """
+        add a tag_name SubElement to parent with the inline markup of the string,
+        convert is called with the string to get the xml string the first time it is seen,
+        mode is anything hashable which distinguishes the different convert functions
+        """
+        key = (tag_name, mode, string)
+        element = self.cache.get(key)
+        if element is None:
+            element = Element(tag_name)
+            xml_string = convert(string)
+            if xml_string:
+                append_markup(element, xml_string)
+            self.cache.set(key, element)
+        if len(element):
+            child = copy.deepcopy(element)
+            parent.append(child)
+            return child
+        # no child tags, so it is quicker to make a new element
+        child = SubElement(parent, tag_name)
+        child.text = element.text
+        return child
+
+
+INLINE_ELEMENTS = InlineElementCache()
+
+
+def append_markup(element, xml_string):
+    "parse the xml_string and add its text and tags to the element"
+    stack = [(element, None)]
+    prefixes = set(NAMESPACES)
+    current = element
+    last_child = None
+    for index, part in enumerate(MARKUP_PATTERN.split(xml_string)):
+        if index % 2 == 0:
+            if part:
+                text = unescape(part)
+                if last_child is None:
+                    current.text = text
+                else:
+                    last_child.tail = text
+            continue
+        match = TAG_PATTERN.match(part)
+        if not match:
+            raise InlineMarkupError('not well-formed (invalid token): %s' % part)
+        closing, name, attributes_string, empty = match.groups()
+        if closing:
+            if attributes_string or empty:
+                raise InlineMarkupError('not well-formed (invalid token): %s' % part)
+            if len(stack) <= 1 or current.tag != name:
+                raise InlineMarkupError('mismatched tag: %s' % part)
+            last_child, prefixes = current, stack.pop()[1]
+            current = stack[-1][0]
+            continue
+        declared = declared_prefixes(attributes_string, prefixes)
+        if declared:
+            parent_prefixes, prefixes = prefixes, prefixes.union(declared)
+        else:
+            parent_prefixes = prefixes
+        check_prefix(name, prefixes)
+        child = SubElement(current, name)
+        if empty:
+            prefixes = parent_prefixes
+            last_child = child
+        else:
+            stack.append((child, parent_prefixes))
+            current = child
+            last_child = None
+    if len(stack) > 1:
+        raise InlineMarkupError('unclosed token: <%s>' % current.tag)
+
+
+def declared_prefixes(attributes_string, prefixes):
+    "check the attributes and return any namespace prefixes they declare"
+    if not attributes_string:
+        return None
+    declared = set()
+    names = set()
+    for name, double_quoted, single_quoted in ATTRIBUTE_PATTERN.findall(attributes_string):
+        if name in names:
+            raise InlineMarkupError('duplicate attribute: %s' % name)
+        names.add(name)
+        unescape(double_quoted or single_quoted)
+        if name.startswith('xmlns:'):
+            declared.add(name.split(':', 1)[1])
+    for name in names:
+        if ':' in name and not name.startswith('xmlns:'):
+            check_prefix(name, declared.union(prefixes))
+    return declared
+
+
+def check_prefix(name, prefixes):
+    if ':' in name and name.split(':', 1)[0] not in prefixes:
+        raise InlineMarkupError('unbound prefix: %s' % name)
+
+
+def unescape(string):
+    "replace character and entity references in text, checking it is well-formed"
+    if INVALID_CHARACTER_PATTERN.search(string) or ']]>' in string:
+        raise InlineMarkupError('not well-formed (invalid token): %s' % string)
+    if '\r' in string:
+        string = string.replace('\r\n', '\n').replace('\r', '\n')
+    if '&' not in string:
+        return string
+    if string.count('&') != len(ENTITY_PATTERN.findall(string)):
+        raise InlineMarkupError('undefined entity: %s' % string)
+    return ENTITY_PATTERN.sub(entity_to_character, string)
+
+
+def entity_to_character(match):
+    hexadecimal, decimal, name = match.groups()
+    if name:
+        return ENTITIES[name]
+    try:
+        character = unichr(int(hexadecimal, 16) if hexadecimal else int(decimal))
+    except (ValueError, OverflowError):
+        raise InlineMarkupError('reference to invalid character number: %s' % match.group(0))
+    if u'\ud800' <= character <= u'\udfff' or INVALID_CHARACTER_PATTERN.match(character):
+        raise InlineMarkupError('reference to invalid character number: %s' % match.group(0))
+    return character
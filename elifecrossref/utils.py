@@ -1,4 +1,7 @@
 import re
+import itertools
+import threading
+from collections import OrderedDict
 
 def allowed_tags():
     "tuple of whitelisted tags"
@@ -20,3 +23,48 @@ def clean_string(string):
     if string:
         return re.sub(r'[^a-zA-Z0-9_\-]', '', str(string))
     return None
+
+def peek(iterable, count):
+    "return a list of up to count first items and an iterator over all the items"
+    iterator = iter(iterable)
+    first_items = list(itertools.islice(iterator, count))
+    return first_items, itertools.chain(first_items, iterator)
+
+
+class LRUCache(object):
+    "bounded least recently used cache which counts hits and misses"
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            # reinsert it as the most recently used
+            self.data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
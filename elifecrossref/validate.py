@@ -0,0 +1,158 @@
+"""
+Validate Crossref deposit XML against the Crossref XSD for its schema version,
+the XSD files are read from a schema directory and compiled once for each version,
+the XML is validated as it is streamed so large batches are not held in memory
+requires lxml
+"""
+import os
+import threading
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover
+    etree = None
+
+
+# directory of the bundled XSD files
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schemas')
+
+SCHEMA_FILE_NAME = 'crossref{version}.xsd'
+
+# where the XSD files can be downloaded from, the package does not include them
+SCHEMA_URL = 'https://www.crossref.org/schemas/'
+
+# compiled schemas by XSD file path
+SCHEMAS = {}
+
+SCHEMAS_LOCK = threading.Lock()
+
+READ_SIZE = 65536
+
+
+def schema_dir(crossref_config=None):
+    "the schema_dir config value or else the bundled schema directory"
+    if crossref_config and crossref_config.get('schema_dir'):
+        return crossref_config.get('schema_dir')
+    return SCHEMA_DIR
+
+
+def schema(version, directory=None):
+    "the compiled XSD for the Crossref schema version, read from directory only once"
+    if etree is None:  # pragma: no cover
+        raise ImportError('lxml is required to validate Crossref XML')
+    if not directory:
+        directory = SCHEMA_DIR
+    path = os.path.abspath(os.path.join(directory, SCHEMA_FILE_NAME.format(version=version)))
+    with SCHEMAS_LOCK:
+        if path not in SCHEMAS:
+            if not os.path.exists(path):
+                raise IOError(
+                    ('no XSD for Crossref schema version %s: %s, download %s and the XSD ' +
+                     'files it imports from %s to %s or set the schema_dir config value ' +
+                     'to the directory they are in') % (
+                         version, path, os.path.basename(path), SCHEMA_URL,
+                         os.path.dirname(path)))
+            SCHEMAS[path] = etree.XMLSchema(etree.parse(path))
+        return SCHEMAS[path]
+
+
+def schema_version(filename):
+    "the version attribute of the root tag of the XML file"
+    for event, element in etree.iterparse(filename, events=('start',)):
+        return element.get('version')
+
+
+class Validator(object):
+
+    def __init__(self, version, directory=None):
+        """
+        Validate XML fed to it in pieces against the XSD of the schema version,
+        each journal is removed from the tree once it has been validated
+        """
+        self.parser = etree.XMLPullParser(
+            events=('end',), tag='{*}journal', schema=schema(version, directory))
+        # the errors are read from the lxml error log of the thread, drop older messages
+        etree.clear_error_log()
+        self.errors = []
+        self.closed = False
+
+    def feed(self, data):
+        if self.errors:
+            # the parser stops at the first error
+            return
+        try:
+            self.parser.feed(data)
+        except etree.XMLSyntaxError as exception:
+            self.add_errors(exception)
+            return
+        for event, element in self.parser.read_events():
+            element.clear()
+            parent = element.getparent()
+            while element.getprevious() is not None:
+                del parent[0]
+
+    # so the validator can be passed as a file object to CrossrefXML.write_xml
+    write = feed
+
+    def close(self):
+        "finish validating and return the list of error messages, empty if the XML is valid"
+        if not self.closed and not self.errors:
+            try:
+                self.parser.close()
+            except etree.XMLSyntaxError as exception:
+                self.add_errors(exception)
+        self.closed = True
+        return self.errors
+
+    def add_errors(self, exception):
+        # other XML parsed in the thread meanwhile, such as the article files, also logs
+        # messages, so only schema errors are taken from the log, and otherwise the
+        # syntax error the parser stopped at
+        messages = [error.message for error in exception.error_log
+                    if error.domain_name == 'SCHEMASV' and
+                    error.level_name in ['ERROR', 'FATAL']]
+        self.errors += messages or [str(exception)]
+
+
+class ValidatingWriter(object):
+
+    def __init__(self, fp, version, directory=None):
+        """
+        Binary file object which writes to fp and validates what is written,
+        call close to get the error messages, fp is not closed
+        """
+        self.fp = fp
+        self.validator = Validator(version, directory)
+
+    def write(self, data):
+        self.fp.write(data)
+        self.validator.feed(data)
+
+    def close(self):
+        return self.validator.close()
+
+
+def validate_file(filename, version=None, directory=None):
+    """
+    validate the XML file, by default against the schema version in its root tag,
+    returns a list of error messages which is empty if it is valid
+    """
+    if version is None:
+        version = schema_version(filename)
+    validator = Validator(version, directory)
+    with open(filename, 'rb') as open_file:
+        while True:
+            data = open_file.read(READ_SIZE)
+            if not data:
+                break
+            validator.feed(data)
+    return validator.close()
+
+
+def validate_crossref_xml(c_xml, directory=None):
+    "validate the output of a CrossrefXML object, returns a list of error messages"
+    if not directory:
+        directory = schema_dir(c_xml.crossref_config)
+    validator = Validator(c_xml.crossref_config.get('crossref_schema_version'), directory)
+    c_xml.write_xml(validator)
+    return validator.close()
@@ -10,6 +10,7 @@ setup(name='elifecrossref',
     description='eLife Crossref deposit of journal articles.',
     long_description=readme,
     packages=['elifecrossref'],
+    package_data={'elifecrossref': ['schemas/*.xsd']},
     license = 'MIT',
     install_requires=[
         "elifetools",
@@ -17,6 +18,11 @@ setup(name='elifecrossref',
         "GitPython",
         "configparser"
     ],
+    entry_points={
+        'console_scripts': [
+            'elifecrossref = elifecrossref.cli:main',
+        ],
+    },
     url='https://github.com/elifesciences/elife-crossref-xml-generation',
     maintainer='eLife Sciences Publications Ltd.',
     maintainer_email='py@elifesciences.org',
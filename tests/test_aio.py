@@ -0,0 +1,118 @@
+import unittest
+import os
+import gzip
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+from elifecrossref import generate, sinks
+from elifecrossref.conf import cached_config, parse_raw_config, raw_config
+from tests.test_generate import TEST_DATA_PATH, sorted_attributes
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from elifecrossref import aio
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio coroutines need Python 3.5')
+class TestAio(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.crossref_config = cached_config('elife')
+        self.pub_date = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+        self.passes = []
+        self.passes.append(('elife-00666.xml', 'elife-crossref-00666-20170717071707.xml'))
+        self.passes.append(('elife-15743-v1.xml', 'elife-crossref-15743-20170717071707.xml'))
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        shutil.rmtree(self.directory)
+
+    def read_file_content(self, file_name):
+        with open(file_name, 'rb') as open_file:
+            return open_file.read()
+
+    def test_crossref_xml(self):
+        article_xml, crossref_xml = self.passes[0]
+        articles = self.loop.run_until_complete(
+            aio.build_articles_for_crossref([TEST_DATA_PATH + article_xml]))
+        output = self.loop.run_until_complete(
+            aio.crossref_xml(articles, self.crossref_config, self.pub_date, False))
+        self.assertEqual(output, generate.crossref_xml(
+            articles, self.crossref_config, self.pub_date, False))
+
+    def test_crossref_xml_to_disk(self):
+        article_xml, crossref_xml = self.passes[0]
+        articles = generate.build_articles_for_crossref([TEST_DATA_PATH + article_xml])
+        filename = self.loop.run_until_complete(aio.crossref_xml_to_disk(
+            articles, self.crossref_config, self.pub_date, False, self.directory))
+        self.assertEqual(filename, os.path.join(self.directory, crossref_xml))
+        self.assertEqual(sorted_attributes(self.read_file_content(filename)),
+                         self.read_file_content(TEST_DATA_PATH + crossref_xml))
+
+    def test_crossref_xml_to_disk_compressed(self):
+        "compressed by the compression config the same as generate.crossref_xml_to_disk"
+        article_xml, crossref_xml = self.passes[0]
+        articles = generate.build_articles_for_crossref([TEST_DATA_PATH + article_xml])
+        crossref_config = parse_raw_config(raw_config('elife'))
+        crossref_config['compression'] = 'gzip'
+        filename = self.loop.run_until_complete(aio.crossref_xml_to_disk(
+            articles, crossref_config, self.pub_date, False, self.directory))
+        self.assertEqual(filename, os.path.join(self.directory, crossref_xml + '.gz'))
+        memory_sink = sinks.MemorySink()
+        generate.crossref_xml_to_disk(articles, crossref_config, self.pub_date, False,
+                                      sink=memory_sink)
+        self.assertEqual(list(memory_sink.files), [crossref_xml + '.gz'])
+        expected = memory_sink.files[crossref_xml + '.gz']
+        with gzip.open(filename) as open_file:
+            self.assertEqual(open_file.read(), gzip.GzipFile(fileobj=BytesIO(expected)).read())
+
+    def test_run_batches(self):
+        "a batch file for each event in order, a failed batch is None with an error"
+        batches = [[TEST_DATA_PATH + article_xml] for article_xml, _ in self.passes]
+        batches.append([TEST_DATA_PATH + 'not_a_file.xml'])
+        errors = {}
+        runner = aio.Runner(concurrency=2)
+        filenames = self.loop.run_until_complete(runner.run_batches(
+            batches, self.crossref_config, self.pub_date, False, self.directory, errors))
+        self.assertEqual(filenames[0:2], [os.path.join(self.directory, crossref_xml)
+                                          for _, crossref_xml in self.passes])
+        for filename, (_, crossref_xml) in zip(filenames, self.passes):
+            self.assertEqual(sorted_attributes(self.read_file_content(filename)),
+                             self.read_file_content(TEST_DATA_PATH + crossref_xml))
+        self.assertIsNone(filenames[2])
+        self.assertEqual(list(errors.keys()), [2])
+
+    def test_runner_concurrency(self):
+        "no more than concurrency jobs run in the executor at the same time"
+        lock = threading.Lock()
+        running = [0]
+        most_running = [0]
+
+        def job():
+            with lock:
+                running[0] += 1
+                most_running[0] = max(most_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        executor = ThreadPoolExecutor(6)
+        try:
+            runner = aio.Runner(concurrency=2, executor=executor)
+            self.loop.run_until_complete(
+                asyncio.gather(*[runner.run(job) for i in range(8)]))
+        finally:
+            executor.shutdown()
+        self.assertEqual(most_running[0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
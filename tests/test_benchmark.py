@@ -0,0 +1,70 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from elifearticle.article import Article, Contributor
+from elifecrossref import benchmark
+from tests.test_generate import TEST_DATA_PATH
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_fixture_files(self):
+        article_xmls = benchmark.fixture_files(TEST_DATA_PATH)
+        self.assertTrue(TEST_DATA_PATH + 'elife-00666.xml' in article_xmls)
+        self.assertFalse(TEST_DATA_PATH + 'elife-crossref-00666-20170717071707.xml'
+                         in article_xmls)
+
+    def test_config_section(self):
+        self.assertEqual(benchmark.config_section('elife-00666.xml'), 'elife')
+        self.assertEqual(benchmark.config_section('cstp77-jats.xml'), 'cstp')
+        self.assertIsNone(benchmark.config_section('up-sta-example.xml'))
+
+    def test_scale_article(self):
+        article = Article('10.7554/eLife.00666', 'Title')
+        article.contributors = [Contributor('author', 'Surname', 'Given')]
+        benchmark.scale_article(article, 3)
+        self.assertEqual(len(article.contributors), 3)
+        self.assertEqual(article.ref_list, [])
+
+    def test_run_benchmarks(self):
+        results = benchmark.run_benchmarks(
+            [TEST_DATA_PATH + 'elife-15743-v1.xml'], scales=[1, 2], repeat=1)
+        self.assertEqual(sorted(results['benchmarks']),
+                         ['elife-15743-v1.xml', 'elife-15743-v1.xml x2'])
+        result = results['benchmarks']['elife-15743-v1.xml']
+        self.assertTrue('set_citation_list' in result['sections'])
+        self.assertTrue(result['sections']['set_contributors'] > 0)
+        self.assertTrue(result['bytes'] < results['benchmarks']['elife-15743-v1.xml x2']['bytes'])
+        # the results can be saved as JSON
+        self.assertEqual(json.loads(json.dumps(results)), results)
+
+    def test_compare(self):
+        baseline = {'benchmarks': {'a.xml': {'parse': 0.1, 'build': 0.1, 'output_xml': 0.1}}}
+        results = {'benchmarks': {
+            'a.xml': {'parse': 0.1001, 'build': 0.2, 'output_xml': 0.05},
+            'b.xml': {'parse': 1.0, 'build': 1.0, 'output_xml': 1.0}}}
+        self.assertEqual(benchmark.compare(results, baseline),
+                         [('a.xml', 'build', 0.1, 0.2)])
+        self.assertEqual(benchmark.compare(results, baseline, tolerance=1.5), [])
+
+    def test_main_regression(self):
+        "a regression against the baseline returns 1"
+        directory = tempfile.mkdtemp()
+        try:
+            output = os.path.join(directory, 'results.json')
+            article_xml = TEST_DATA_PATH + 'elife_poa_e02725.xml'
+            self.assertEqual(benchmark.main([article_xml, '--repeat', '1', '--output', output]), 0)
+            with open(output) as open_file:
+                baseline = json.load(open_file)
+            baseline['benchmarks']['elife_poa_e02725.xml']['build'] = 0.0
+            with open(output, 'w') as open_file:
+                json.dump(baseline, open_file)
+            self.assertEqual(benchmark.main(
+                [article_xml, '--repeat', '1', '--baseline', output, '--min-seconds', '0']), 1)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
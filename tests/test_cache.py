@@ -0,0 +1,104 @@
+import unittest
+import time
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from elifecrossref import generate
+from elifecrossref.cache import FragmentCache
+from elifecrossref.conf import raw_config, parse_raw_config
+from tests.test_generate import TEST_DATA_PATH, sorted_attributes
+
+class TestFragmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.crossref_config = parse_raw_config(raw_config('elife'))
+        self.pub_date = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_file_content(self, file_name):
+        with open(file_name, 'rb') as open_file:
+            return open_file.read()
+
+    def test_key(self):
+        cache = FragmentCache(self.directory)
+        key = cache.key('elife-00666.xml', b'<article/>', self.crossref_config)
+        self.assertEqual(key, cache.key('elife-00666.xml', b'<article/>', self.crossref_config))
+        self.assertNotEqual(key, cache.key('elife-00666.xml', b'<article />',
+                                           self.crossref_config))
+        # the article version is taken from the file name
+        self.assertNotEqual(key, cache.key('elife-00666-v2.xml', b'<article/>',
+                                           self.crossref_config))
+        other_config = parse_raw_config(raw_config('elife'))
+        other_config['crossref_schema_version'] = '4.3.5'
+        self.assertNotEqual(key, cache.key('elife-00666.xml', b'<article/>', other_config))
+
+    def test_get_set(self):
+        cache = FragmentCache(self.directory)
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', {'manuscript': 666, 'run_date': None}, u'<journal>\u00e9</journal>')
+        self.assertEqual(cache.get('key'),
+                         ({'manuscript': 666, 'run_date': None}, u'<journal>\u00e9</journal>'))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        # the entries are found by a new cache object
+        self.assertEqual(FragmentCache(self.directory).size, cache.size)
+
+    def test_get_run_date(self):
+        cache = FragmentCache(self.directory)
+        cache.set('key', {'run_date': '2017-07-17'}, '<journal/>')
+        self.assertIsNotNone(cache.get('key', '2017-07-17'))
+        self.assertIsNone(cache.get('key', '2017-07-18'))
+
+    def test_evict(self):
+        cache = FragmentCache(self.directory, max_bytes=120)
+        fragment = '<journal>' + 'a' * 30 + '</journal>'
+        cache.set('first', {}, fragment)
+        cache.set('second', {}, fragment)
+        # make first the most recently used
+        os.utime(cache.entry_path('second'), (0, 0))
+        self.assertIsNotNone(cache.get('first'))
+        cache.set('third', {}, fragment)
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNotNone(cache.get('third'))
+        self.assertEqual(cache.evictions, 1)
+        self.assertTrue(cache.size <= 120)
+
+    def test_crossref_xml_from_files(self):
+        "output from the cache matches the fixtures and does not parse the files again"
+        cache = FragmentCache(self.directory)
+        article_xmls = [TEST_DATA_PATH + 'elife-00666.xml']
+        expected = self.read_file_content(
+            TEST_DATA_PATH + 'elife-crossref-00666-20170717071707.xml')
+        for expected_hits in [0, 1]:
+            output = BytesIO()
+            generate.crossref_xml_from_files(article_xmls, output, self.crossref_config,
+                                             self.pub_date, False, cache)
+            self.assertEqual(sorted_attributes(output.getvalue()), expected)
+            self.assertEqual(cache.hits, expected_hits)
+        self.assertEqual(cache.misses, 1)
+
+    def test_crossref_xml_from_files_multiple(self):
+        "the batch id does not use the manuscript when there is more than one article"
+        cache = FragmentCache(self.directory)
+        article_xmls = [TEST_DATA_PATH + 'elife-00666.xml', TEST_DATA_PATH + 'elife-02020-v1.xml']
+        outputs = []
+        for i in range(2):
+            output = BytesIO()
+            c_xml = generate.crossref_xml_from_files(
+                article_xmls, output, self.crossref_config, self.pub_date, False, cache)
+            outputs.append(output.getvalue())
+        self.assertEqual(c_xml.batch_id, 'elife-crossref-20170717071707')
+        self.assertEqual(outputs[0], outputs[1])
+        articles = generate.build_articles_for_crossref(article_xmls)
+        c_xml = generate.build_crossref_xml(articles, self.crossref_config, self.pub_date, False)
+        self.assertEqual(outputs[0].decode('utf-8'), c_xml.output_xml())
+        self.assertEqual(cache.hits, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
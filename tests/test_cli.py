@@ -0,0 +1,129 @@
+import unittest
+import os
+import gzip
+import shutil
+import tempfile
+import zipfile
+from elifecrossref import cli, validate
+from tests.test_generate import TEST_DATA_PATH, sorted_attributes
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.pub_date = '2017-07-17 07:17:07'
+        self.passes = []
+        self.passes.append(('elife-00666.xml', 'elife-crossref-00666-20170717071707.xml'))
+        self.passes.append(('elife-02020-v1.xml', 'elife-crossref-02020-20170717071707.xml'))
+        self.passes.append(('elife-15743-v1.xml', 'elife-crossref-15743-20170717071707.xml'))
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def read_file_content(self, file_name):
+        with open(file_name, 'rb') as open_file:
+            return open_file.read()
+
+    def article_xmls(self):
+        return [TEST_DATA_PATH + article_xml_file for article_xml_file, _ in self.passes]
+
+    def test_find_article_xmls(self):
+        file_list = os.path.join(self.output_dir, 'files.txt')
+        with open(file_list, 'w') as open_file:
+            open_file.write('one.xml\n\ntwo.xml\n')
+        article_xmls = cli.find_article_xmls(
+            [TEST_DATA_PATH, TEST_DATA_PATH + 'elife-0*-v1.xml', 'three.xml'], file_list)
+        self.assertEqual(len([path for path in article_xmls if path.startswith(TEST_DATA_PATH)]),
+                         len([name for name in os.listdir(TEST_DATA_PATH)
+                              if name.endswith('.xml')]) + 2)
+        self.assertEqual(article_xmls[-3:], ['three.xml', 'one.xml', 'two.xml'])
+
+    def test_main_per_article(self):
+        "one batch file for each article matches the fixtures"
+        for workers in ['1', '2']:
+            return_value = cli.main(
+                self.article_xmls() + ['-c', 'elife', '-o', self.output_dir, '--per-article',
+                                       '--pub-date', self.pub_date, '--no-comment',
+                                       '--workers', workers])
+            self.assertEqual(return_value, 0)
+            for _, crossref_xml_file in self.passes:
+                self.assertEqual(sorted_attributes(
+                    self.read_file_content(os.path.join(self.output_dir, crossref_xml_file))),
+                    self.read_file_content(TEST_DATA_PATH + crossref_xml_file))
+
+    def test_main_archive(self):
+        "one batch file for each article written to a zip archive"
+        archive = os.path.join(self.output_dir, 'deposits.zip')
+        return_value = cli.main(
+            self.article_xmls() + ['-c', 'elife', '--archive', archive, '--per-article',
+                                   '--pub-date', self.pub_date, '--no-comment',
+                                   '--workers', '2', '--progress', '0'])
+        self.assertEqual(return_value, 0)
+        with zipfile.ZipFile(archive) as open_zip:
+            for _, crossref_xml_file in self.passes:
+                self.assertEqual(sorted_attributes(open_zip.read(crossref_xml_file)),
+                                 self.read_file_content(TEST_DATA_PATH + crossref_xml_file))
+        self.assertEqual(cli.main(self.article_xmls() + ['--archive', 'deposits.rar']), 1)
+
+    def test_main_compressed(self):
+        "gzip compressed batch files for each article"
+        return_value = cli.main(
+            self.article_xmls() + ['-c', 'elife', '-o', self.output_dir, '--per-article',
+                                   '--pub-date', self.pub_date, '--no-comment',
+                                   '--compression', 'gzip', '--progress', '0'])
+        self.assertEqual(return_value, 0)
+        for _, crossref_xml_file in self.passes:
+            with gzip.open(os.path.join(self.output_dir, crossref_xml_file + '.gz')) as open_file:
+                self.assertEqual(sorted_attributes(open_file.read()),
+                                 self.read_file_content(TEST_DATA_PATH + crossref_xml_file))
+        self.assertEqual(cli.main(self.article_xmls() + ['--compression', 'gzip',
+                                                         '--compression-level', '12']), 1)
+
+    def test_main_batch(self):
+        "split batches by article count"
+        return_value = cli.main(
+            self.article_xmls() + ['-c', 'elife', '-o', self.output_dir, '--max-articles', '2',
+                                   '--pub-date', self.pub_date, '--progress', '0'])
+        self.assertEqual(return_value, 0)
+        self.assertEqual(sorted(os.listdir(self.output_dir)),
+                         ['elife-crossref-20170717071707-1.xml',
+                          'elife-crossref-20170717071707-2.xml'])
+
+    @unittest.skipIf(validate.etree is None, 'lxml is not installed')
+    def test_main_validate(self):
+        "validate the output files against the Crossref XSD"
+        arguments = self.article_xmls() + ['-c', 'elife', '-o', self.output_dir, '--validate',
+                                           '--progress', '0']
+        self.assertEqual(cli.main(arguments + ['--schema-dir', TEST_DATA_PATH + 'schemas']), 0)
+        # no XSD in the schema directory, so nothing is written
+        output_dir = os.path.join(self.output_dir, 'output')
+        arguments = self.article_xmls() + ['-c', 'elife', '-o', output_dir, '--validate',
+                                           '--progress', '0']
+        self.assertEqual(cli.main(arguments + ['--schema-dir', self.output_dir]), 1)
+        self.assertEqual(os.listdir(output_dir), [])
+
+    def test_main_missing_files(self):
+        self.assertEqual(cli.main([os.path.join(self.output_dir, '*.xml')]), 1)
+        return_value = cli.main(
+            [os.path.join(self.output_dir, 'missing.xml'), '-o', self.output_dir,
+             '--per-article'])
+        self.assertEqual(return_value, 1)
+
+    def test_main_bad_files(self):
+        "files which cannot be parsed are reported and the other articles are still written"
+        bad_xml = os.path.join(self.output_dir, 'bad.xml')
+        with open(bad_xml, 'w') as open_file:
+            open_file.write('<article>')
+        missing_xml = os.path.join(self.output_dir, 'missing.xml')
+        for workers in ['1', '2']:
+            output_dir = os.path.join(self.output_dir, 'output-' + workers)
+            return_value = cli.main(
+                [bad_xml, missing_xml] + self.article_xmls() +
+                ['-c', 'elife', '-o', output_dir, '--pub-date', self.pub_date,
+                 '--progress', '0', '--workers', workers])
+            self.assertEqual(return_value, 1)
+            self.assertEqual(os.listdir(output_dir), ['elife-crossref-20170717071707.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
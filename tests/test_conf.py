@@ -1,4 +1,7 @@
 import unittest
+import os
+import shutil
+import tempfile
 from elifecrossref import conf
 
 class TestConf(unittest.TestCase):
@@ -7,6 +10,40 @@ class TestConf(unittest.TestCase):
         "test loading when no config file is specified for test coverage"
         self.assertIsNotNone(conf.load_config(None))
 
+    def test_cached_config(self):
+        "the section is parsed again only when the config file is modified"
+        directory = tempfile.mkdtemp()
+        try:
+            config_file = os.path.join(directory, 'crossref.cfg')
+            shutil.copy(conf.CONFIG_FILE, config_file)
+            crossref_config = conf.cached_config('elife', config_file)
+            self.assertEqual(crossref_config,
+                             conf.parse_raw_config(conf.raw_config('elife', config_file)))
+            self.assertIs(conf.cached_config('elife', config_file), crossref_config)
+            with open(config_file, 'a') as open_file:
+                open_file.write('\n[new]\nregistrant: new\n')
+            mtime = os.path.getmtime(config_file)
+            os.utime(config_file, (mtime + 10, mtime + 10))
+            self.assertIsNot(conf.cached_config('elife', config_file), crossref_config)
+            self.assertEqual(conf.cached_config('new', config_file).get('registrant'), 'new')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_crossref_config_flags(self):
+        crossref_config = conf.parse_raw_config(conf.raw_config('elife'))
+        self.assertTrue(crossref_config.text_mining_xml)
+        self.assertTrue(crossref_config.text_mining_pdf)
+        self.assertTrue(crossref_config.reference_distribution_opts)
+        self.assertTrue(crossref_config.component_license)
+        crossref_config['text_mining_pdf_pattern'] = ''
+        crossref_config['reference_distribution_opts'] = ''
+        self.assertFalse(crossref_config.text_mining_xml)
+        self.assertFalse(crossref_config.text_mining_pdf)
+        self.assertFalse(crossref_config.reference_distribution_opts)
+        crossref_config = conf.parse_raw_config(conf.raw_config(None))
+        self.assertFalse(crossref_config.text_mining_xml)
+        self.assertFalse(crossref_config.component_license)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,14 +2,38 @@ import unittest
 import time
 import os
 import re
-from elifecrossref import generate
-from elifearticle.article import Article
+import gzip
+import shutil
+import tempfile
+from io import BytesIO
+from elifecrossref import generate, serialize, sinks
 from elifecrossref.conf import raw_config, parse_raw_config
 
 TEST_BASE_PATH = os.path.dirname(os.path.abspath(__file__)) + os.sep
 TEST_DATA_PATH = TEST_BASE_PATH + "test_data" + os.sep
 generate.TMP_DIR = TEST_BASE_PATH + "tmp" + os.sep
 
+# a start tag with attributes, and each of its attributes
+START_TAG_PATTERN = re.compile(r'<([^\s<>!?/]+)((?:\s+[^\s=<>]+="[^"]*")+)(\s*/?>)')
+ATTRIBUTE_PATTERN = re.compile(r'[^\s=<>]+="[^"]*"')
+
+
+def sorted_attributes(xml):
+    """
+    the str or bytes xml with the attributes of each tag sorted by name, as the fixtures
+    were written by minidom before Python 3.8, unchanged where the serializer sorts them
+    """
+    if serialize.SORT_ATTRIBUTES:
+        return xml
+    def sort_tag(match):
+        attributes = sorted(ATTRIBUTE_PATTERN.findall(match.group(2)),
+                            key=lambda attribute: attribute.split('=', 1)[0])
+        return '<%s %s%s' % (match.group(1), ' '.join(attributes), match.group(3))
+    if isinstance(xml, bytes):
+        return START_TAG_PATTERN.sub(sort_tag, xml.decode('utf-8')).encode('utf-8')
+    return START_TAG_PATTERN.sub(sort_tag, xml)
+
+
 class TestGenerate(unittest.TestCase):
 
     def setUp(self):
@@ -30,6 +54,10 @@ class TestGenerate(unittest.TestCase):
         self.passes.append(('cstp77-jats.xml', 'cstp-crossref-77-20170717071707.xml', 'cstp', self.default_pub_date))
         self.passes.append(('bmjopen-4-e003269.xml', 'crossref-bmjopen-2013-003269-20170717071707.xml', 'bmjopen', self.default_pub_date))
         self.passes.append(('up-sta-example.xml', 'crossref-606-20170717071707.xml', None, self.default_pub_date))
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
 
     def read_file_content(self, file_name):
         fp = open(file_name, 'rb')
@@ -46,7 +74,122 @@ class TestGenerate(unittest.TestCase):
                 crossref_config = parse_raw_config(raw_config(config_section))
             crossref_xml = generate.crossref_xml(articles, crossref_config, pub_date, False)
             model_crossref_xml = self.read_file_content(TEST_DATA_PATH + crossref_xml_file)
-            self.assertEqual(crossref_xml, model_crossref_xml.decode('utf-8'))
+            self.assertEqual(sorted_attributes(crossref_xml), model_crossref_xml.decode('utf-8'))
+
+    def test_crossref_xml_to_stream(self):
+        "streaming output from an iterator of articles matches the fixtures"
+        for (article_xml_file, crossref_xml_file, config_section, pub_date) in self.passes:
+            file_path = TEST_DATA_PATH + article_xml_file
+            articles = generate.build_articles_for_crossref([file_path])
+            crossref_config = None
+            if config_section:
+                crossref_config = parse_raw_config(raw_config(config_section))
+            output = BytesIO()
+            generate.crossref_xml_to_stream(iter(articles), output, crossref_config,
+                                            pub_date, False)
+            model_crossref_xml = self.read_file_content(TEST_DATA_PATH + crossref_xml_file)
+            self.assertEqual(sorted_attributes(output.getvalue()), model_crossref_xml)
+
+    def test_crossref_xml_to_stream_no_articles(self):
+        "streaming output with no articles has an empty body like output_xml"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        output = BytesIO()
+        generate.crossref_xml_to_stream(
+            iter([]), output, crossref_config, self.default_pub_date, False)
+        c_xml = generate.CrossrefXML([], crossref_config, self.default_pub_date, False)
+        self.assertEqual(output.getvalue().decode('utf-8'), c_xml.output_xml())
+
+    def test_crossref_xml_to_stream_pretty(self):
+        "pretty streaming output matches pretty output_xml, with and without journals"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file, _, _, _ in self.passes[0:3]])
+        for poa_articles in [articles, []]:
+            c_xml = generate.CrossrefXML(poa_articles, crossref_config, self.default_pub_date,
+                                         False)
+            for indent in ['', '\t']:
+                output = BytesIO()
+                generate.crossref_xml_to_stream(
+                    iter(poa_articles), output, crossref_config, self.default_pub_date, False,
+                    pretty=True, indent=indent)
+                self.assertEqual(output.getvalue().decode('utf-8'),
+                                 c_xml.output_xml(pretty=True, indent=indent))
+
+    def test_build_articles_parallel(self):
+        "parse files in worker processes and generate the same output"
+        article_xmls = [TEST_DATA_PATH + article_xml_file
+                        for (article_xml_file, crossref_xml_file, config_section, pub_date)
+                        in self.passes[0:6]]
+        errors = {}
+        articles = generate.build_articles_for_crossref(
+            article_xmls + [TEST_DATA_PATH + 'not_a_file.xml'],
+            workers=2, chunk_size=2, errors=errors)
+        self.assertEqual(len(articles), len(article_xmls))
+        self.assertEqual(list(errors.keys()), [TEST_DATA_PATH + 'not_a_file.xml'])
+        crossref_config = parse_raw_config(raw_config('elife'))
+        for article_xml, article in zip(article_xmls, articles):
+            expected_articles = generate.build_articles_for_crossref([article_xml])
+            self.assertEqual(
+                generate.crossref_xml([article], crossref_config, self.default_pub_date, False),
+                generate.crossref_xml(
+                    expected_articles, crossref_config, self.default_pub_date, False))
+
+    def test_build_articles_parallel_iterator(self):
+        "an iterator of file names gives the same articles in parallel as in sequence"
+        article_xmls = [TEST_DATA_PATH + article_xml_file
+                        for (article_xml_file, _, _, _) in self.passes[0:3]]
+        articles = generate.build_articles_for_crossref(iter(article_xmls), workers=2)
+        self.assertEqual([article.doi for article in articles],
+                         [article.doi for article in
+                          generate.build_articles_for_crossref(iter(article_xmls))])
+        self.assertEqual(len(articles), 3)
+
+    def test_build_articles_errors(self):
+        "a file which cannot be parsed is left out and its error recorded with or without workers"
+        article_xmls = [TEST_DATA_PATH + 'elife-00666.xml', TEST_DATA_PATH + 'not_a_file.xml']
+        for workers in [None, 2]:
+            errors = {}
+            articles = generate.build_articles_for_crossref(
+                article_xmls, workers=workers, errors=errors)
+            self.assertEqual([article.doi for article in articles], ['10.7554/eLife.00666'])
+            self.assertEqual(list(errors.keys()), [TEST_DATA_PATH + 'not_a_file.xml'])
+        # windows of files are parsed as the articles are used
+        errors = {}
+        articles = generate.parsed_articles(
+            iter(article_xmls * 2), build_parts=generate.BUILD_PARTS, workers=2, errors=errors,
+            window_size=1)
+        self.assertEqual(next(articles).doi, '10.7554/eLife.00666')
+        self.assertEqual(errors, {})
+        self.assertEqual(len(list(articles)), 1)
+        self.assertEqual(list(errors.keys()), [TEST_DATA_PATH + 'not_a_file.xml'])
+
+    def test_crossref_xml_parallel(self):
+        "journals built by worker processes or threads are assembled in order"
+        article_xml_files = ['elife-02020-v1.xml', 'elife-00508-v1.xml', 'elife-15743-v1.xml',
+                             'elife-16988-v1.xml', 'elife_poa_e02725.xml']
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file in article_xml_files])
+        crossref_config = parse_raw_config(raw_config('elife'))
+        expected = generate.crossref_xml(articles, crossref_config, self.default_pub_date, False)
+        for use_threads in [False, True]:
+            crossref_xml = generate.crossref_xml(
+                iter(articles), crossref_config, self.default_pub_date, False,
+                workers=2, use_threads=use_threads)
+            self.assertEqual(crossref_xml, expected)
+
+    def test_crossref_xml_iterator(self):
+        "an iterator of articles gives the same output as a list"
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + 'elife-02020-v1.xml', TEST_DATA_PATH + 'elife-15743-v1.xml'])
+        crossref_config = parse_raw_config(raw_config('elife'))
+        expected = generate.crossref_xml(articles, crossref_config, self.default_pub_date, False)
+        self.assertEqual(expected.count('<journal>'), 2)
+        self.assertEqual(generate.crossref_xml(
+            iter(articles), crossref_config, self.default_pub_date, False), expected)
+        memory_sink = sinks.MemorySink()
+        generate.crossref_xml_to_disk(iter(articles), crossref_config, self.default_pub_date,
+                                      False, sink=memory_sink)
+        self.assertEqual(list(memory_sink.files.values()), [expected.encode('utf-8')])
 
     def test_parse_do_no_pass_pub_date(self):
         """
@@ -107,8 +250,146 @@ class TestGenerate(unittest.TestCase):
             expected_output = fp.read()
         with open(generate.TMP_DIR + crossref_xml_file, 'rb') as fp:
             generated_output = fp.read()
-        self.assertEqual(generated_output, expected_output)
+        self.assertEqual(sorted_attributes(generated_output), expected_output)
+
+    def test_crossref_xml_to_disk_stream(self):
+        "test writing to disk one journal at a time"
+        article_xml_file = 'elife-00666.xml'
+        crossref_xml_file = 'elife-crossref-00666-20170717071707.xml'
+        crossref_config = parse_raw_config(raw_config('elife'))
+        file_path = TEST_DATA_PATH + article_xml_file
+        articles = generate.build_articles_for_crossref([file_path])
+        generate.crossref_xml_to_disk(
+            iter(articles), crossref_config, self.default_pub_date, False, stream=True)
+        with open(TEST_DATA_PATH + crossref_xml_file, 'rb') as fp:
+            expected_output = fp.read()
+        with open(generate.TMP_DIR + crossref_xml_file, 'rb') as fp:
+            generated_output = fp.read()
+        self.assertEqual(sorted_attributes(generated_output), expected_output)
+
+    def test_crossref_xml_to_disk_sink(self):
+        "write the whole and split batches to a sink instead of TMP_DIR"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file, _, _, _ in self.passes[0:2]])
+        sink = sinks.MemorySink()
+        generate.crossref_xml_to_disk(
+            articles, crossref_config, self.default_pub_date, False, sink=sink)
+        c_xml = generate.CrossrefXML(articles, crossref_config, self.default_pub_date, False)
+        self.assertEqual(sink.files, {c_xml.batch_id + '.xml': c_xml.output_xml().encode('utf-8')})
+        sink = sinks.MemorySink()
+        manifest = generate.crossref_xml_to_disk(
+            iter(articles), crossref_config, self.default_pub_date, False, max_articles=1,
+            sink=sink)
+        self.assertEqual(sorted(sink.files), [part['file'] for part in manifest])
+        self.assertEqual([len(sink.files[part['file']]) for part in manifest],
+                         [part['bytes'] for part in manifest])
+
+    def test_crossref_xml_to_disk_compressed(self):
+        "gzip compressed streaming and split batches decompress to the uncompressed output"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file, _, _, _ in self.passes[0:2]])
+        for max_articles in [None, 1]:
+            sink = sinks.MemorySink()
+            generate.crossref_xml_to_disk(
+                iter(articles), crossref_config, self.default_pub_date, False, stream=True,
+                max_articles=max_articles, sink=sink)
+            compressed_sink = sinks.MemorySink()
+            generate.crossref_xml_to_disk(
+                iter(articles), crossref_config, self.default_pub_date, False, stream=True,
+                max_articles=max_articles, sink=compressed_sink, compression='gzip',
+                compression_level=1)
+            self.assertEqual(sorted(compressed_sink.files),
+                             sorted([name + '.gz' for name in sink.files]))
+            for name in sink.files:
+                compressed = compressed_sink.files[name + '.gz']
+                self.assertTrue(len(compressed) < len(sink.files[name]))
+                self.assertEqual(gzip.GzipFile(fileobj=BytesIO(compressed)).read(),
+                                 sink.files[name])
+
+    def test_crossref_xml_to_disk_split(self):
+        "split the batch by article count, each part matches the single article fixture"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        passes = self.passes[0:3]
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file, _, _, _ in passes])
+        manifest = generate.crossref_xml_to_disk(
+            iter(articles), crossref_config, self.default_pub_date, False, max_articles=1,
+            sink=self.directory)
+        self.assertEqual([part['batch_id'] for part in manifest],
+                         ['elife-crossref-20170717071707-1', 'elife-crossref-20170717071707-2',
+                          'elife-crossref-20170717071707-3'])
+        for part, article, (_, crossref_xml_file, _, _) in zip(manifest, articles, passes):
+            self.assertEqual(part['dois'], [article.doi])
+            generated_output = self.read_file_content(part['file'])
+            self.assertEqual(len(generated_output), part['bytes'])
+            batch_id = crossref_xml_file.replace('.xml', '')
+            expected_output = self.read_file_content(TEST_DATA_PATH + crossref_xml_file)
+            self.assertEqual(sorted_attributes(generated_output.replace(
+                part['batch_id'].encode('utf-8'), batch_id.encode('utf-8'))), expected_output)
+
+    def test_crossref_xml_to_disk_split_bytes(self):
+        "split the batch by size, only a part with a single journal can be over max_bytes"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file, _, _, _ in self.passes[0:6]])
+        max_bytes = 60000
+        manifest = generate.crossref_xml_to_disk(
+            iter(articles), crossref_config, self.default_pub_date, False, max_bytes=max_bytes,
+            sink=self.directory)
+        self.assertTrue(len(manifest) > 1)
+        dois = []
+        for part in manifest:
+            self.assertEqual(os.path.getsize(part['file']), part['bytes'])
+            self.assertTrue(part['bytes'] <= max_bytes or len(part['dois']) == 1)
+            dois += part['dois']
+        self.assertEqual(dois, [article.doi for article in articles])
+
+    def test_crossref_xml_to_disk_split_pretty(self):
+        "pretty split batches have the same bytes in the manifest as on disk"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + article_xml_file for article_xml_file, _, _, _ in self.passes[0:3]])
+        manifest = generate.crossref_xml_to_disk(
+            iter(articles), crossref_config, self.default_pub_date, False, max_articles=1,
+            pretty=True, indent='\t', sink=self.directory)
+        for part, article in zip(manifest, articles):
+            c_xml = generate.CrossrefXML([article], crossref_config, self.default_pub_date,
+                                         False)
+            generated_output = self.read_file_content(part['file']).decode('utf-8')
+            self.assertEqual(len(generated_output.encode('utf-8')), part['bytes'])
+            self.assertEqual(generated_output.replace(part['batch_id'], c_xml.batch_id),
+                             c_xml.output_xml(pretty=True, indent='\t'))
+
+    def test_generated_comment(self):
+        "the generated comment uses the injected clock and the configured generator version"
+        crossref_config = parse_raw_config(raw_config('elife'))
+        crossref_config['generator_version'] = 'v1.2.3'
+        generated = time.strptime("2018-01-02 03:04:05", "%Y-%m-%d %H:%M:%S")
+        c_xml = generate.CrossrefXML([], crossref_config, self.default_pub_date, True,
+                                     clock=lambda: generated)
+        self.assertEqual(c_xml.comment.text, 'generated by elife-crossref-xml-generation' +
+                         ' at 2018-01-02 03:04:05 from version v1.2.3')
 
+    def test_generator_version(self):
+        "the config value then the environment variable then the git commit looked up once"
+        original_environ = os.environ.get(generate.GENERATOR_VERSION_VARIABLE)
+        original_last_commits = generate.LAST_COMMITS.copy()
+        try:
+            os.environ[generate.GENERATOR_VERSION_VARIABLE] = 'from-environment'
+            self.assertEqual(generate.generator_version({'generator_version': 'from-config'}),
+                             'from-config')
+            self.assertEqual(generate.generator_version({'generator_version': ''}),
+                             'from-environment')
+            del os.environ[generate.GENERATOR_VERSION_VARIABLE]
+            generate.LAST_COMMITS[os.getcwd()] = 'cached-commit'
+            self.assertEqual(generate.generator_version(), 'cached-commit')
+        finally:
+            if original_environ is not None:
+                os.environ[generate.GENERATOR_VERSION_VARIABLE] = original_environ
+            generate.LAST_COMMITS.clear()
+            generate.LAST_COMMITS.update(original_last_commits)
 
 
 if __name__ == '__main__':
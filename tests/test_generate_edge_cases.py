@@ -1,11 +1,21 @@
 import unittest
+from multiprocessing.pool import ThreadPool
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
 
 from elifearticle.article import Article, Component, Citation, Dataset, Contributor, Affiliation, License
 
-from elifecrossref import generate
+from elifecrossref import generate, serialize
 from elifecrossref.conf import raw_config, parse_raw_config
+from tests.test_generate import sorted_attributes
+
+
+def relation_start_tag(identifier_type, relationship_type):
+    "rel:inter_work_relation start tag with its attributes in the output order of this Python"
+    element = Element('rel:inter_work_relation')
+    element.set('relationship-type', relationship_type)
+    element.set('identifier-type', identifier_type)
+    return serialize.start_tag(element)
 
 
 class TestGenerateComponentList(unittest.TestCase):
@@ -282,7 +292,7 @@ class TestGenerateCrossrefDatasets(unittest.TestCase):
         expected_xml_snippet_5 = '<rel:related_item><rel:inter_work_relation identifier-type="uri" relationship-type="isSupplementedBy">https://elifesciences.org</rel:inter_work_relation></rel:related_item>'
         # generate output
         c_xml = generate.build_crossref_xml([article])
-        crossref_xml_string = c_xml.output_xml()
+        crossref_xml_string = sorted_attributes(c_xml.output_xml())
         self.assertIsNotNone(crossref_xml_string)
         # Test for expected strings in the XML output
         self.assertTrue(expected_xml_snippet_1 in crossref_xml_string)
@@ -310,11 +320,111 @@ class TestGenerateCrossrefDataCitation(unittest.TestCase):
         expected_contains = '<rel:program><rel:related_item><rel:description>An data title</rel:description><rel:inter_work_relation identifier-type="pmid" relationship-type="references">pmid</rel:inter_work_relation></rel:related_item></rel:program>'
         # generate
         c_xml = generate.build_crossref_xml([article])
-        crossref_xml_string = c_xml.output_xml()
+        crossref_xml_string = sorted_attributes(c_xml.output_xml())
         # test assertion
         self.assertTrue(expected_contains in crossref_xml_string)
 
 
+class TestGenerateRelationsProgram(unittest.TestCase):
+
+    def setUp(self):
+        self.articles = []
+        for manuscript in ['00666', '00667', '00668']:
+            article = Article('10.7554/eLife.' + manuscript, 'Test article ' + manuscript)
+            article.manuscript = manuscript
+            citation = Citation()
+            citation.data_title = 'Data for ' + manuscript
+            citation.publication_type = 'data'
+            citation.pmid = manuscript
+            article.ref_list = [citation]
+            self.articles.append(article)
+
+    def test_relations_program_per_article(self):
+        "each article in a batch has its own rel:program with only its own related items"
+        c_xml = generate.build_crossref_xml(self.articles)
+        for article in self.articles:
+            expected_contains = (
+                '<rel:program><rel:related_item><rel:description>Data for ' +
+                article.manuscript + '</rel:description>' +
+                relation_start_tag('pmid', 'references') +
+                article.manuscript + '</rel:inter_work_relation></rel:related_item></rel:program>')
+            self.assertTrue(expected_contains in c_xml.output_xml())
+        self.assertEqual(c_xml.output_xml().count('<rel:program>'), 3)
+
+    def test_journal_fragment_threads(self):
+        "one CrossrefXML object can build journal fragments in several threads at once"
+        c_xml = generate.build_crossref_xml([])
+        expected = [c_xml.journal_fragment(article) for article in self.articles]
+        pool = ThreadPool(3)
+        try:
+            fragments = pool.map(c_xml.journal_fragment, self.articles * 20)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(fragments, expected * 20)
+
+
+class TestArticlePlan(unittest.TestCase):
+
+    def setUp(self):
+        self.article = Article('10.7554/eLife.00666', 'Test article')
+        dataset = Dataset()
+        dataset.uri = 'https://example.org/dataset'
+        self.article.add_dataset(dataset)
+        # no identifier so it is left out
+        self.article.add_dataset(Dataset())
+        data_citation = Citation()
+        data_citation.publication_type = 'data'
+        data_citation.doi = '10.5061/dryad.cv323'
+        data_citation.authors = [{'group-type': 'editor', 'surname': 'Editor'}]
+        web_citation = Citation()
+        web_citation.id = 'bib2'
+        web_citation.publication_type = 'web'
+        web_citation.authors = [{'group-type': 'author', 'surname': 'Author'},
+                                {'group-type': 'editor', 'surname': 'Editor'}]
+        self.article.ref_list = [data_citation, web_citation]
+        self.article.license = License()
+        self.article.license.href = 'https://creativecommons.org/licenses/by/4.0/'
+
+    def test_article_plan(self):
+        crossref_config = parse_raw_config(raw_config('elife'))
+        crossref_config['text_mining_xml_pattern'] = 'https://example.org/{manuscript}.xml'
+        c_xml = generate.CrossrefXML([], crossref_config)
+        article_plan = c_xml.article_plan(self.article)
+        self.assertTrue(article_plan.pub_date is c_xml.pub_date)
+        self.assertTrue(article_plan.has_license)
+        self.assertEqual(article_plan.collections,
+                         {'text-mining': [('application/xml', 'text_mining_xml_pattern')]})
+        self.assertEqual(article_plan.datasets, [self.article.datasets[0]])
+        self.assertEqual(
+            [citation[1:] for citation in article_plan.citations],
+            [('1', {'group-type': 'editor', 'surname': 'Editor'}, True, False),
+             ('bib2', {'group-type': 'author', 'surname': 'Author'}, False, True)])
+        self.assertTrue(article_plan.relations_program)
+
+    def test_set_citation_list_without_plan(self):
+        "the set_ methods make the plan if one is not passed to them"
+        c_xml = generate.CrossrefXML([], parse_raw_config(raw_config('elife')))
+        parent = Element('journal_article')
+        c_xml.set_citation_list(parent, self.article)
+        output = ElementTree.tostring(parent).decode('utf-8')
+        self.assertTrue('<rel:program><rel:related_item>' in output)
+        self.assertTrue('<citation key="bib2"><author>Author</author>' in output)
+
+    def test_do_relations_program_override(self):
+        "the plan uses do_relations_program so a subclass can add the tag"
+        class RelationsCrossrefXML(generate.CrossrefXML):
+            def do_relations_program(self, poa_article):
+                return True
+        article = Article('10.7554/eLife.00666', 'Test article')
+        crossref_config = parse_raw_config(raw_config('elife'))
+        self.assertFalse(generate.CrossrefXML([], crossref_config).article_plan(
+            article).relations_program)
+        c_xml = RelationsCrossrefXML([article], crossref_config)
+        self.assertTrue(c_xml.article_plan(article).relations_program)
+        self.assertTrue('<rel:program/>' in c_xml.output_xml())
+
+
 class TestGenerateAbstract(unittest.TestCase):
 
     def setUp(self):
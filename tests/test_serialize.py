@@ -0,0 +1,120 @@
+# coding=utf-8
+import unittest
+import os
+import time
+from io import BytesIO
+from xml.dom import minidom
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element, SubElement, Comment
+
+from elifecrossref import generate, serialize
+from elifecrossref.conf import raw_config, parse_raw_config
+from tests.test_generate import TEST_DATA_PATH
+
+
+def minidom_reparse(element):
+    "the output of an ElementTree round trip through minidom, for comparison"
+    rough_string = ElementTree.tostring(element, 'utf-8')
+    return minidom.parseString(rough_string).documentElement.toxml()
+
+
+def minidom_output(element, pretty, indent):
+    "the output_xml result produced by minidom before the serializer replaced it"
+    rough_string = ElementTree.tostring(element, 'utf-8')
+    reparsed = minidom.parseString(rough_string)
+    if pretty:
+        return reparsed.toprettyxml(indent, encoding='utf-8').decode('utf-8')
+    return reparsed.toxml(encoding='utf-8').decode('utf-8')
+
+
+class TestSerialize(unittest.TestCase):
+
+    def setUp(self):
+        self.root = Element('root')
+        self.root.set('b', u'"quoted" & <angled>\ttab\nnew line')
+        self.root.set('a', 'first')
+        self.root.append(Comment('a comment & <tags>'))
+        child = SubElement(self.root, 'p')
+        child.text = u'Text with "quotes", > & < and unicode é\r\n'
+        italic = SubElement(child, 'i')
+        italic.text = 'italic'
+        italic.tail = ' tail'
+        SubElement(self.root, 'empty')
+        SubElement(self.root, 'empty_text').text = ''
+
+    def test_element_to_string(self):
+        self.assertEqual(serialize.element_to_string(self.root), minidom_reparse(self.root))
+
+    def test_tostring(self):
+        for pretty in [False, True]:
+            for indent in ['', '\t', '  ']:
+                self.assertEqual(serialize.tostring(self.root, pretty, indent),
+                                 minidom_output(self.root, pretty, indent))
+
+    def test_namespace_declarations(self):
+        "attributes are in the minidom order of the running Python for any attribute order"
+        element = Element('doi_batch')
+        element.set('version', '4.4.0')
+        element.set('xmlns', 'http://www.crossref.org/schema/4.4.0')
+        element.set('xsi:schemaLocation', 'schema location')
+        element.set('xmlns:xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+        element.set('xmlns:fr', 'http://www.crossref.org/fundref.xsd')
+        self.assertEqual(serialize.tostring(element), minidom_output(element, False, ''))
+        if serialize.SORT_ATTRIBUTES:
+            expected = ['version', 'xmlns', 'xmlns:fr', 'xmlns:xsi', 'xsi:schemaLocation']
+        else:
+            expected = ['xmlns', 'xmlns:xsi', 'xmlns:fr', 'version', 'xsi:schemaLocation']
+        self.assertEqual([name for name, _ in serialize.attribute_items(element)], expected)
+
+    def test_tostring_fixtures(self):
+        "pretty and compact output of the fixture articles matches minidom"
+        pub_date = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+        crossref_config = parse_raw_config(raw_config('elife'))
+        article_xml_files = [name for name in sorted(os.listdir(TEST_DATA_PATH))
+                             if name.startswith('elife-0') or name.startswith('elife-1')]
+        for article_xml_file in article_xml_files:
+            articles = generate.build_articles_for_crossref([TEST_DATA_PATH + article_xml_file])
+            c_xml = generate.CrossrefXML(articles, crossref_config, pub_date, True)
+            for pretty, indent in [(False, ''), (True, ''), (True, '\t')]:
+                self.assertEqual(c_xml.output_xml(pretty, indent),
+                                 minidom_output(c_xml.root, pretty, indent))
+                output = BytesIO()
+                byte_count = c_xml.write_xml(output, pretty, indent)
+                self.assertEqual(output.getvalue(),
+                                 c_xml.output_xml(pretty, indent).encode('utf-8'))
+                self.assertEqual(byte_count, len(output.getvalue()))
+
+    def test_write(self):
+        "write outputs the encoded tostring output and returns the number of bytes"
+        for pretty in [False, True]:
+            for indent in ['', '\t']:
+                output = BytesIO()
+                byte_count = serialize.write(self.root, output, pretty, indent)
+                expected = serialize.tostring(self.root, pretty, indent).encode('utf-8')
+                self.assertEqual(output.getvalue(), expected)
+                self.assertEqual(byte_count, len(expected))
+
+    def test_write_parts(self):
+        "the children and grandchildren of the element are written one at a time"
+        writes = []
+
+        class ListFile(object):
+            def write(self, data):
+                writes.append(data)
+
+        byte_count = serialize.write(self.root, ListFile())
+        # declaration, start tag, comment, the start, italic tag, tail and end of p,
+        # the two empty tags and the end tag
+        self.assertEqual(len(writes), 10)
+        self.assertEqual(b''.join(writes), serialize.tostring(self.root).encode('utf-8'))
+        self.assertEqual(byte_count, len(b''.join(writes)))
+
+    def test_start_and_end_tag(self):
+        element = Element('doi_batch')
+        element.set('version', '4.4.0')
+        self.assertEqual(serialize.start_tag(element), '<doi_batch version="4.4.0">')
+        self.assertEqual(serialize.end_tag(element), '</doi_batch>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import gzip
+from io import BytesIO
+from elifecrossref import sinks
+
+
+class TestDirectorySink(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'output')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_write(self):
+        sink = sinks.DirectorySink(self.directory)
+        location = sink.write('batch.xml', b'<doi_batch/>')
+        self.assertEqual(location, os.path.join(self.directory, 'batch.xml'))
+        with open(location, 'rb') as open_file:
+            self.assertEqual(open_file.read(), b'<doi_batch/>')
+        self.assertEqual(os.listdir(self.directory), ['batch.xml'])
+
+    def test_atomic(self):
+        "the file is only in place once it is closed, and not at all if it is aborted"
+        sink = sinks.DirectorySink(self.directory)
+        sink.write('batch.xml', b'old')
+        open_file = sink.open('batch.xml')
+        open_file.write(b'new')
+        with open(sink.location('batch.xml'), 'rb') as existing_file:
+            self.assertEqual(existing_file.read(), b'old')
+        open_file.abort()
+        self.assertEqual(os.listdir(self.directory), ['batch.xml'])
+        with self.assertRaises(ValueError):
+            with sink.open('other.xml') as open_file:
+                open_file.write(b'part')
+                raise ValueError('failed')
+        self.assertEqual(os.listdir(self.directory), ['batch.xml'])
+
+
+class TestArchiveSinks(unittest.TestCase):
+
+    def test_tar(self):
+        output = BytesIO()
+        with sinks.TarSink(output, 'gz') as sink:
+            self.assertEqual(sink.write('one.xml', b'<one/>'), 'one.xml')
+            with self.assertRaises(ValueError):
+                with sink.open('failed.xml'):
+                    raise ValueError('failed')
+            sink.write('two.xml', b'<two/>')
+        with tarfile.open(fileobj=BytesIO(output.getvalue()), mode='r:gz') as tar:
+            self.assertEqual(tar.getnames(), ['one.xml', 'two.xml'])
+            self.assertEqual(tar.extractfile('two.xml').read(), b'<two/>')
+
+    def test_zip(self):
+        output = BytesIO()
+        with sinks.ZipSink(output) as sink:
+            sink.write('one.xml', b'<one/>' * 100)
+            sink.write('two.xml', b'<two/>')
+        with zipfile.ZipFile(BytesIO(output.getvalue())) as archive:
+            self.assertEqual(archive.namelist(), ['one.xml', 'two.xml'])
+            self.assertEqual(archive.read('one.xml'), b'<one/>' * 100)
+
+
+class TestSinks(unittest.TestCase):
+
+    def test_stream(self):
+        output = BytesIO()
+        sink = sinks.StreamSink(output)
+        sink.write('one.xml', b'<one/>')
+        sink.write('two.xml', b'<two/>')
+        self.assertEqual(output.getvalue(), b'<one/><two/>')
+
+    def test_memory(self):
+        sink = sinks.MemorySink()
+        sink.write('one.xml', b'<one/>')
+        open_file = sink.open('two.xml')
+        open_file.write(b'<two/>')
+        open_file.abort()
+        self.assertEqual(sink.files, {'one.xml': b'<one/>'})
+
+    def test_sink_for(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.assertTrue(isinstance(sinks.sink_for(directory), sinks.DirectorySink))
+            self.assertTrue(isinstance(sinks.sink_for('-'), sinks.StreamSink))
+            for name, sink_class in [('out.zip', sinks.ZipSink), ('out.tar', sinks.TarSink),
+                                     ('out.TGZ', sinks.TarSink)]:
+                sink = sinks.sink_for(os.path.join(directory, name))
+                self.assertTrue(isinstance(sink, sink_class))
+                sink.close()
+            memory_sink = sinks.MemorySink()
+            self.assertIs(sinks.sink_for(memory_sink), memory_sink)
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestCompressedSink(unittest.TestCase):
+
+    def test_gzip(self):
+        memory_sink = sinks.MemorySink()
+        sink = sinks.CompressedSink(memory_sink, 'gzip', 9)
+        with sink.open('batch.xml') as open_file:
+            for _ in range(100):
+                open_file.write(b'<doi_batch/>')
+        with sink.open('failed.xml') as open_file:
+            open_file.write(b'<doi_batch/>')
+            open_file.abort()
+        self.assertEqual(sink.location('batch.xml'), 'batch.xml.gz')
+        self.assertEqual(list(memory_sink.files), ['batch.xml.gz'])
+        data = memory_sink.files['batch.xml.gz']
+        self.assertTrue(len(data) < 100)
+        self.assertEqual(gzip.GzipFile(fileobj=BytesIO(data)).read(), b'<doi_batch/>' * 100)
+
+    def test_compression_errors(self):
+        with self.assertRaises(ValueError):
+            sinks.CompressedSink(sinks.MemorySink(), 'lzma')
+        with self.assertRaises(ValueError):
+            sinks.CompressedSink(sinks.MemorySink(), 'gzip', 12)
+
+    @unittest.skipIf(sinks.zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        memory_sink = sinks.MemorySink()
+        sinks.CompressedSink(memory_sink, 'zstd').write('batch.xml', b'<doi_batch/>' * 100)
+        data = memory_sink.files['batch.xml.zst']
+        self.assertEqual(sinks.zstandard.ZstdDecompressor().decompressobj().decompress(data),
+                         b'<doi_batch/>' * 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
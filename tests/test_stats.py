@@ -0,0 +1,60 @@
+import unittest
+import time
+from xml.etree.ElementTree import Element, SubElement
+from elifecrossref import generate, stats
+from elifecrossref.conf import raw_config, parse_raw_config
+from tests.test_generate import TEST_DATA_PATH
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        self.crossref_config = parse_raw_config(raw_config('elife'))
+        self.pub_date = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+
+    def test_count_elements(self):
+        parent = Element('parent')
+        SubElement(parent, 'existing')
+        child = SubElement(parent, 'child')
+        SubElement(child, 'grandchild')
+        self.assertEqual(stats.count_elements(parent, 1, None), 2)
+        self.assertEqual(stats.count_elements(None, 0, child), 2)
+        self.assertEqual(stats.count_elements(None, 0, 'string'), 0)
+
+    def test_stats(self):
+        "stats are recorded for each article and the batch and the output is unchanged"
+        article_xmls = [TEST_DATA_PATH + 'elife-00666.xml', TEST_DATA_PATH + 'elife-02020-v1.xml']
+        articles = generate.build_articles_for_crossref(article_xmls)
+        finished = []
+        section_stats = stats.Stats(callback=lambda doi, article_stats: finished.append(doi))
+        c_xml = generate.build_crossref_xml(
+            articles, self.crossref_config, self.pub_date, False, stats=section_stats)
+        output = c_xml.output_xml()
+        self.assertEqual(output, generate.build_crossref_xml(
+            articles, self.crossref_config, self.pub_date, False).output_xml())
+        self.assertEqual(finished, [article.doi for article in articles])
+        self.assertEqual([doi for doi, article_stats in section_stats.articles], finished)
+
+        batch = section_stats.batch
+        self.assertEqual(batch.get('set_journal', 'calls'), 2)
+        self.assertEqual(batch.get('output_xml', 'calls'), 1)
+        self.assertEqual(batch.get('set_citation_list', 'elements'),
+                         sum([len(list(citation_list.iter()))
+                              for citation_list in c_xml.root.iter('citation_list')]))
+        first_article_stats = section_stats.articles[0][1]
+        self.assertEqual(first_article_stats.get('set_journal', 'calls'), 1)
+        self.assertEqual(
+            first_article_stats.get('set_contributors', 'calls') +
+            section_stats.articles[1][1].get('set_contributors', 'calls'),
+            batch.get('set_contributors', 'calls'))
+        self.assertTrue(batch.get('set_journal', 'seconds') >=
+                        batch.get('set_citation_list', 'seconds'))
+        self.assertEqual(sorted(batch.to_dict()['set_journal']), ['calls', 'elements', 'seconds'])
+
+    def test_not_instrumented(self):
+        "without stats the methods are not replaced"
+        c_xml = generate.CrossrefXML([], self.crossref_config, self.pub_date, False)
+        self.assertFalse('set_journal' in vars(c_xml))
+
+
+if __name__ == '__main__':
+    unittest.main()
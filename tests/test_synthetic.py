@@ -0,0 +1,57 @@
+import unittest
+import os
+import shutil
+import tempfile
+from elifecrossref import generate, synthetic
+from elifecrossref.conf import raw_config, parse_raw_config
+
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_ref_type_counts(self):
+        counts = synthetic.ref_type_counts(14)
+        self.assertEqual(sum(counts.values()), 14)
+        self.assertEqual(counts['journal'], 2)
+        self.assertEqual(counts['clinicaltrial'], 1)
+        self.assertEqual(synthetic.ref_type_counts({'book': 3}), {'book': 3})
+
+    def test_scaled_sizes(self):
+        sizes = synthetic.scaled_sizes(10, refs=5)
+        self.assertEqual(sizes['contributors'], synthetic.DEFAULT_SIZES['contributors'] * 10)
+        self.assertEqual(sizes['ref_authors'], synthetic.DEFAULT_SIZES['ref_authors'])
+        self.assertEqual(sizes['refs'], 5)
+
+    def test_parse_synthetic_article(self):
+        "the article is parsed with the configured number of each part"
+        article_xmls = synthetic.write_corpus(
+            self.directory, 1, contributors=5, affiliations=2, group_authors=1,
+            refs={'journal': 2, 'data': 1, 'software': 1}, datasets=3, funding_awards=2,
+            figures=2, figure_supplements=2, source_data=1, supplementary_files=1, math=2)
+        self.assertEqual(os.path.basename(article_xmls[0]), 'elife-90001-v1.xml')
+        article = generate.build_articles_for_crossref(article_xmls)[0]
+        self.assertEqual(article.doi, '10.7554/eLife.90001')
+        self.assertEqual(len(article.contributors), 6)
+        self.assertEqual(sorted([ref.publication_type for ref in article.ref_list]),
+                         ['data', 'journal', 'journal', 'software'])
+        self.assertEqual(len(article.datasets), 3)
+        self.assertEqual(len(article.funding_awards), 2)
+        # abstract, digest, 2 figures each with 2 supplements and source data, 1 supp file
+        self.assertEqual(len(article.component_list), 11)
+        self.assertTrue('<mml:math' in article.abstract)
+        crossref_config = parse_raw_config(raw_config('elife'))
+        c_xml = generate.build_crossref_xml([article], crossref_config, None, False)
+        self.assertEqual(c_xml.output_xml().count('<citation '), 4)
+
+    def test_main(self):
+        self.assertEqual(synthetic.main([self.directory, '--count', '2', '--refs', '3']), 0)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['elife-90001-v1.xml', 'elife-90002-v1.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
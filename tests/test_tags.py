@@ -0,0 +1,197 @@
+# coding=utf-8
+import unittest
+from xml.dom import minidom
+from xml.etree import ElementTree
+from xml.etree.ElementTree import Element
+from xml.parsers.expat import ExpatError
+
+from elifearticle import utils as eautils
+from elifetools import utils as etoolsutils
+from elifetools import xmlio
+
+from elifecrossref import generate, tags, utils
+
+
+REPARSING_NAMESPACES = (' xmlns:jats="http://www.ncbi.nlm.nih.gov/JATS1"'
+                        ' xmlns:mml="http://www.w3.org/1998/Math/MathML"'
+                        ' xmlns:xlink="http://www.w3.org/1999/xlink" ')
+
+
+def minidom_append(parent, tag_name, xml_string):
+    "how tags were appended by reparsing the string with minidom"
+    tagged_string = ('<' + tag_name + REPARSING_NAMESPACES + '>' +
+                     xml_string + '</' + tag_name + '>')
+    reparsed = minidom.parseString(tagged_string.encode('utf-8'))
+    xmlio.append_minidom_xml_to_elementtree_xml(parent, reparsed)
+
+
+class TestAppendInlineXml(unittest.TestCase):
+
+    def setUp(self):
+        self.passes = [
+            '',
+            'Plain text',
+            u'Unicode é and entities &amp; &lt; &gt; &#x00e9; &#233;\r\nnew line',
+            'A <i>italic</i> and <b>bold <sup>nested</sup></b> tail',
+            '<jats:p>Paragraph <jats:italic>one</jats:italic></jats:p><jats:p>two</jats:p>',
+            ('Math <mml:math alttext="x" display="inline"><mml:mi>x</mml:mi>'
+             '<mml:mspace width="1em"/><mml:mo>&gt;</mml:mo></mml:math> end'),
+            '<ext-link ext-link-type="uri" xlink:href="http://example.org">link</ext-link>',
+            '<m:math xmlns:m="http://www.w3.org/1998/Math/MathML"><m:mi>y</m:mi></m:math>',
+        ]
+
+    def test_append_inline_xml(self):
+        for xml_string in self.passes:
+            expected = Element('root')
+            minidom_append(expected, 'title', xml_string)
+            root = Element('root')
+            element = tags.append_inline_xml(root, 'title', xml_string)
+            self.assertEqual(ElementTree.tostring(root), ElementTree.tostring(expected))
+            self.assertEqual(element.tag, 'title')
+
+    def test_append_inline_xml_attributes(self):
+        root = Element('root')
+        tags.append_inline_xml(root, 'jats:abstract', '<jats:p>Text</jats:p>',
+                               [('abstract-type', 'executive-summary')])
+        self.assertEqual(
+            ElementTree.tostring(root).decode('utf-8'),
+            '<root><jats:abstract abstract-type="executive-summary">' +
+            '<jats:p>Text</jats:p></jats:abstract></root>')
+
+    def test_append_inline_xml_not_well_formed(self):
+        fails = [
+            '<i>unclosed',
+            'unopened</i>',
+            '<i>mismatched</b>',
+            '&nbsp; undefined entity',
+            'bare & ampersand',
+            '<foo:bar>unbound prefix</foo:bar>',
+            '<i a="1" a="2">duplicate attribute</i>',
+            u'control \x01 character',
+            '&#0; invalid character reference',
+        ]
+        for xml_string in fails:
+            self.assertRaises(ExpatError, minidom_append, Element('root'), 'title', xml_string)
+            root = Element('root')
+            self.assertRaises(ExpatError, tags.append_inline_xml, root, 'title', xml_string)
+            self.assertEqual(len(root), 0)
+
+
+def escaped(string):
+    string = etoolsutils.escape_ampersand(string)
+    return etoolsutils.escape_unmatched_angle_brackets(string, utils.allowed_tags())
+
+
+class TestTagRewriter(unittest.TestCase):
+
+    def setUp(self):
+        self.passes = [
+            '',
+            'Plain text & <p>a paragraph</p> with p < 0.05 and > 1',
+            '<p>A <italic>b</italic> <bold>c</bold> <underline>d</underline> H<sub>2</sub>O</p>',
+            '<p>x<sup>2</sup> <sc>sc</sc> <not_allowed>!</not_allowed> <<italic>p</italic>></p>',
+            ('<p><inline-formula><mml:math alttext="x"><mml:mi>x</mml:mi></mml:math>' +
+             '</inline-formula> <ext-link ext-link-type="uri" xlink:href="http://a.org">' +
+             'a</ext-link></p>'),
+            '<p>a <b\n<italic>c</italic> <mml:mi\n> d >\n<</p>',
+            '&amp; &#x00e9; &#233; &nbsp; &lt;',
+        ]
+
+    def test_jats_abstract_rewriter(self):
+        for string in self.passes:
+            expected = escaped(string)
+            for tag_name in tags.JATS_ABSTRACT_TAGS:
+                expected = eautils.replace_tags(expected, tag_name, 'jats:' + tag_name)
+            expected = eautils.remove_tag('inline-formula', expected)
+            expected = eautils.remove_tag('ext-link', expected)
+            self.assertEqual(tags.rewriter('jats_abstract').rewrite(string), expected)
+
+    def test_abstract_rewriter(self):
+        c_xml = generate.CrossrefXML([], {}, add_comment=False)
+        for string in self.passes:
+            expected = c_xml.clean_tags(
+                escaped(string), do_not_clean=['<p>', '</p>', '<mml:', '</mml:'])
+            expected = eautils.replace_tags(expected, 'p', 'jats:p')
+            self.assertEqual(tags.rewriter('abstract').rewrite(string), expected)
+
+    def test_face_markup_rewriter(self):
+        for string in self.passes:
+            expected = escaped(string)
+            for from_tag, to_tag in tags.FACE_MARKUP_TAGS:
+                expected = eautils.replace_tags(expected, from_tag, to_tag)
+            self.assertEqual(tags.rewriter('face_markup').rewrite(string), expected)
+
+    def test_rewriter_compiled_once(self):
+        self.assertIs(tags.rewriter('abstract'), tags.rewriter('abstract'))
+
+
+class TestTagCleaner(unittest.TestCase):
+
+    def setUp(self):
+        self.passes = [
+            ('A <sc>STRANGE</sc> <italic>subtitle</italic>, <not_allowed>!</not_allowed>', [],
+             'A STRANGE subtitle, <not_allowed>!</not_allowed>'),
+            ('<p>x <inline-formula><mml:math><mml:mi>y</mml:mi></mml:math></inline-formula></p>',
+             ['<p>', '</p>', '<mml:', '</mml:'],
+             '<p>x <mml:math><mml:mi>y</mml:mi></mml:math></p>'),
+            ('<ext-link ext-link-type="uri" xlink:href="http://a.org">a</ext-link>', [], 'a'),
+            ('...polarization, <<italic>p</italic>>, and its variance...', [],
+             '...polarization, <p>, and its variance...'),
+            ('<it<p>alic>joined</italic>', ['<italic>'], '<italic>joined'),
+        ]
+
+    def test_clean_tags(self):
+        for string, do_not_clean, expected in self.passes:
+            self.assertEqual(tags.clean_tags(string, do_not_clean), expected)
+            self.assertEqual(tags.clean_tags_by_tag(string, do_not_clean), expected)
+
+    def test_cleaner_cache(self):
+        tag_cleaner = tags.TagCleaner(cache_size=1)
+        self.assertEqual(tag_cleaner.clean('<italic>ENCODE</italic>'), 'ENCODE')
+        self.assertEqual(tag_cleaner.clean('<italic>ENCODE</italic>'), 'ENCODE')
+        self.assertEqual(tag_cleaner.clean('<bold>other</bold>'), 'other')
+        self.assertEqual(tag_cleaner.cache.hits, 1)
+        self.assertEqual(tag_cleaner.cache.misses, 2)
+        self.assertEqual(len(tag_cleaner.cache), 1)
+
+    def test_cleaner_keyed_by_do_not_clean(self):
+        self.assertIs(tags.cleaner(['<p>', '</p>']), tags.cleaner(['</p>', '<p>']))
+        self.assertIsNot(tags.cleaner(['<p>']), tags.cleaner([]))
+
+
+class TestInlineElementCache(unittest.TestCase):
+
+    def test_append(self):
+        inline_elements = tags.InlineElementCache(maxsize=1)
+        parent = Element('citation')
+        for string in ['An <i>article</i>', 'An <i>article</i>', 'Plain']:
+            inline_elements.append(parent, 'title', string, 'mode', lambda value: value)
+        self.assertEqual([child.tag for child in parent], ['title', 'title', 'title'])
+        self.assertEqual(parent[0][0].text, 'article')
+        self.assertEqual(parent[2].text, 'Plain')
+        self.assertEqual(inline_elements.hits, 1)
+        self.assertEqual(inline_elements.misses, 2)
+        self.assertEqual(len(inline_elements), 1)
+
+    def test_append_copies(self):
+        "each appended element is a copy which can be changed without changing the cache"
+        inline_elements = tags.InlineElementCache()
+        parent = Element('citation')
+        first = inline_elements.append(parent, 'title', 'An <i>article</i>', 'mode', str)
+        first[0].text = 'changed'
+        second = inline_elements.append(parent, 'title', 'An <i>article</i>', 'mode', str)
+        self.assertIsNot(first, second)
+        self.assertEqual(second[0].text, 'article')
+
+    def test_append_keyed_by_mode(self):
+        inline_elements = tags.InlineElementCache()
+        parent = Element('citation')
+        inline_elements.append(parent, 'title', '<i>x</i>', 'inline', str)
+        inline_elements.append(parent, 'title', '<i>x</i>', 'clean', lambda value: 'x')
+        self.assertEqual(len(parent[0]), 1)
+        self.assertEqual(len(parent[1]), 0)
+        self.assertEqual(parent[1].text, 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
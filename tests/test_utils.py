@@ -11,5 +11,26 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(utils.clean_string('-normal_'), '-normal_')
         self.assertEqual(utils.clean_string('/abnormal.'), 'abnormal')
 
+    def test_peek(self):
+        first_items, items = utils.peek(iter([1, 2, 3]), 2)
+        self.assertEqual(first_items, [1, 2])
+        self.assertEqual(list(items), [1, 2, 3])
+        first_items, items = utils.peek([], 2)
+        self.assertEqual(first_items, [])
+        self.assertEqual(list(items), [])
+
+    def test_lru_cache(self):
+        cache = utils.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        # b is now the least recently used
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 1, 2))
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from elifecrossref import generate, validate
+from elifecrossref.conf import cached_config
+from tests.test_generate import TEST_DATA_PATH
+
+SCHEMA_DIR = TEST_DATA_PATH + 'schemas'
+
+
+@unittest.skipIf(validate.etree is None, 'lxml is not installed')
+class TestValidate(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pub_date = time.strptime("2017-07-17 07:17:07", "%Y-%m-%d %H:%M:%S")
+        self.crossref_xml = TEST_DATA_PATH + 'elife-crossref-00666-20170717071707.xml'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_schema(self):
+        "the schema is compiled once for each version"
+        schema = validate.schema('4.4.0', SCHEMA_DIR)
+        self.assertTrue(validate.schema('4.4.0', SCHEMA_DIR) is schema)
+        with self.assertRaises(IOError) as context:
+            validate.schema('4.3.5', SCHEMA_DIR)
+        self.assertTrue(validate.SCHEMA_URL in str(context.exception))
+        self.assertTrue('schema_dir' in str(context.exception))
+
+    def test_schema_dir(self):
+        self.assertEqual(validate.schema_dir(), validate.SCHEMA_DIR)
+        self.assertEqual(validate.schema_dir({'schema_dir': SCHEMA_DIR}), SCHEMA_DIR)
+
+    def test_validate_file(self):
+        self.assertEqual(validate.schema_version(self.crossref_xml), '4.4.0')
+        self.assertEqual(validate.validate_file(self.crossref_xml, directory=SCHEMA_DIR), [])
+        # remove the head tag
+        with open(self.crossref_xml, 'rb') as open_file:
+            content = open_file.read()
+        invalid_xml = os.path.join(self.directory, 'invalid.xml')
+        with open(invalid_xml, 'wb') as open_file:
+            open_file.write(content[0:content.index(b'<head>')] +
+                            content[content.index(b'</head>') + len(b'</head>'):])
+        errors = validate.validate_file(invalid_xml, directory=SCHEMA_DIR)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue('body' in errors[0])
+        # messages logged by parsing other XML are not reported
+        validator = validate.Validator('4.4.0', SCHEMA_DIR)
+        validator.feed(content[0:content.index(b'<head>')])
+        with self.assertRaises(validate.etree.XMLSyntaxError):
+            validate.etree.fromstring(b'<article>')
+        validator.feed(content[content.index(b'</head>') + len(b'</head>'):])
+        self.assertEqual(validator.close(), errors)
+
+    def test_validating_writer(self):
+        "validate a batch as it is written"
+        articles = generate.build_articles_for_crossref(
+            [TEST_DATA_PATH + 'elife-00666.xml', TEST_DATA_PATH + 'elife-15743-v1.xml'])
+        crossref_config = cached_config('elife')
+        c_xml = generate.CrossrefXML(articles, crossref_config, self.pub_date, False,
+                                     build=False)
+        output = BytesIO()
+        writer = validate.ValidatingWriter(output, '4.4.0', SCHEMA_DIR)
+        c_xml.write_batch(articles, writer)
+        self.assertEqual(writer.close(), [])
+        self.assertEqual(output.getvalue(), generate.crossref_xml(
+            articles, crossref_config, self.pub_date, False).encode('utf-8'))
+        # not well-formed
+        writer = validate.ValidatingWriter(BytesIO(), '4.4.0', SCHEMA_DIR)
+        writer.write(b'<doi_batch xmlns="http://www.crossref.org/schema/4.4.0"><head>')
+        self.assertTrue(writer.close())
+
+    def test_validate_crossref_xml(self):
+        articles = generate.build_articles_for_crossref([TEST_DATA_PATH + 'elife-00666.xml'])
+        c_xml = generate.CrossrefXML(articles, cached_config('elife'), self.pub_date, False)
+        self.assertEqual(validate.validate_crossref_xml(c_xml, SCHEMA_DIR), [])
+
+
+if __name__ == '__main__':
+    unittest.main()